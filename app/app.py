@@ -1,12 +1,19 @@
 import os
-from flask import Flask, render_template, request, jsonify
+import json
+import threading
+from flask import Flask, render_template, request, jsonify, send_file, stream_with_context
 from dotenv import load_dotenv
-from utils.email_connector import EmailConnector
+from utils.connection_pool import get_connection_pool
 from utils.email_parser import EmailParser
+from utils.parse_cache import get_parse_cache
+from utils.vendor_extractors import get_vendor_registry
+from utils.metrics import metrics, metrics_enabled_from_env
+from utils.job_queue import get_job_manager, JobQueueFull
 from controllers.email_controller import EmailController
 
 # Load environment variables
 load_dotenv()
+metrics.enabled = metrics_enabled_from_env()
 
 app = Flask(__name__)
 
@@ -17,15 +24,17 @@ def index():
 @app.route('/connect', methods=['POST'])
 def connect():
     data = request.json
-    email_connector = EmailConnector(
-        server=data.get('server') or os.getenv('EMAIL_SERVER'),
-        port=data.get('port') or os.getenv('EMAIL_PORT'),
-        email=data.get('email') or os.getenv('EMAIL_USER'),
-        password=data.get('password') or os.getenv('EMAIL_PASSWORD')
-    )
+    pool = get_connection_pool()
     
     try:
-        connection_status = email_connector.connect()
+        # Log in through the pool so the session stays warm for later requests
+        with pool.connection(
+            server=data.get('server') or os.getenv('EMAIL_SERVER'),
+            port=data.get('port') or os.getenv('EMAIL_PORT'),
+            email=data.get('email') or os.getenv('EMAIL_USER'),
+            password=data.get('password') or os.getenv('EMAIL_PASSWORD')
+        ) as email_connector:
+            connection_status = f"Successfully connected to {email_connector.email}"
         return jsonify({'status': 'success', 'message': connection_status})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -39,24 +48,145 @@ def fetch_emails():
         emails = controller.fetch_emails(
             folder=data.get('folder', 'INBOX'),
             limit=data.get('limit', 10),
-            criteria=data.get('criteria', 'ALL')
+            criteria=data.get('criteria', 'ALL'),
+            batch_size=data.get('batch_size'),
+            partial=data.get('partial', False)
         )
         return jsonify({'status': 'success', 'emails': emails})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/sync-emails', methods=['POST'])
+def sync_emails():
+    data = request.json
+    controller = EmailController()
+    
+    try:
+        emails, checkpoint = controller.sync_emails(
+            folder=data.get('folder', 'INBOX'),
+            limit=data.get('limit'),
+            batch_size=data.get('batch_size', 50)
+        )
+        return jsonify({'status': 'success', 'emails': emails, 'checkpoint': checkpoint})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/pipeline', methods=['POST'])
+def run_pipeline():
+    data = request.json
+    controller = EmailController()
+    
+    try:
+        result = controller.run_pipeline(
+            folder=data.get('folder', 'INBOX'),
+            criteria=data.get('criteria', 'ALL'),
+            limit=data.get('limit'),
+            format_type=data.get('format', 'jsonl'),
+            batch_size=data.get('batch_size', 50),
+            workers=data.get('workers'),
+            partial=data.get('partial', False),
+            index=data.get('index', False)
+        )
+        return jsonify({'status': 'success', **result})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @app.route('/parse-email', methods=['POST'])
 def parse_email():
     data = request.json
     email_content = data.get('email_content', '')
     
     try:
-        parser = EmailParser()
-        parsed_data = parser.parse(email_content)
+        parser = EmailParser(cache=get_parse_cache())
+        parsed_data = parser.parse(email_content, sender=data.get('sender'), headers=data.get('headers'))
         return jsonify({'status': 'success', 'parsed_data': parsed_data})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+_batch_parser = None
+_batch_parser_lock = threading.Lock()
+
+def _get_batch_parser():
+    """
+    Parser shared by every /parse-batch request
+    """
+    global _batch_parser
+    
+    with _batch_parser_lock:
+        if _batch_parser is None:
+            _batch_parser = EmailParser(cache=get_parse_cache())
+        return _batch_parser
+
+def _parse_batch_line(parser, line_number, line):
+    try:
+        item = json.loads(line)
+        if isinstance(item, str):
+            item = {'email_content': item}
+        
+        # Emails straight from /fetch-emails carry 'body' and 'from'
+        email_content = item.get('email_content', item.get('body'))
+        if not isinstance(email_content, str):
+            raise Exception("Missing email_content")
+        
+        parsed_data = parser.parse(
+            email_content,
+            sender=item.get('sender', item.get('from')),
+            headers=item.get('headers')
+        )
+        return {'line': line_number, 'id': item.get('id'), 'status': 'success', 'parsed_data': parsed_data}
+    except Exception as e:
+        return {'line': line_number, 'status': 'error', 'message': str(e)}
+
+@app.route('/parse-batch', methods=['POST'])
+def parse_batch():
+    """
+    Parse newline-delimited JSON emails, streaming one NDJSON result per line
+    
+    Each line is an object with email_content (or body) and optional id,
+    sender (or from) and headers, or a bare JSON string. Lines are read and
+    answered one at a time, so memory does not grow with the batch.
+    """
+    parser = _get_batch_parser()
+    max_line = int(os.getenv('PARSE_BATCH_MAX_LINE_BYTES', 10 * 1024 * 1024))
+    stream = request.stream
+    
+    def generate():
+        line_number = 0
+        while True:
+            line = stream.readline(max_line + 1)
+            if not line:
+                break
+            line_number += 1
+            
+            if len(line) > max_line and not line.endswith(b'\n'):
+                # Skip the rest of the oversized line without holding it
+                while line and not line.endswith(b'\n'):
+                    line = stream.readline(max_line)
+                result = {'line': line_number, 'status': 'error', 'message': f"Line exceeds {max_line} bytes"}
+            elif not line.strip():
+                continue
+            else:
+                result = _parse_batch_line(parser, line_number, line)
+            
+            yield json.dumps(result) + '\n'
+    
+    return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/parse-cache/stats', methods=['GET'])
+def parse_cache_stats():
+    cache = get_parse_cache()
+    return jsonify({'status': 'success', 'enabled': cache is not None, 'stats': cache.stats() if cache else {}})
+
+@app.route('/vendor-routes/stats', methods=['GET'])
+def vendor_route_stats():
+    return jsonify({'status': 'success', 'stats': get_vendor_registry().stats()})
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    if not metrics.enabled:
+        return jsonify({'status': 'error', 'message': 'Metrics are disabled'}), 404
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/export', methods=['POST'])
 def export_data():
     data = request.json
@@ -71,5 +201,152 @@ def export_data():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/index', methods=['POST'])
+def index_results():
+    data = request.json
+    controller = EmailController()
+    
+    try:
+        indexed = controller.index_results(data.get('parsed_data', []), data.get('source', ''))
+        return jsonify({'status': 'success', 'indexed': indexed})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/search', methods=['GET'])
+def search():
+    try:
+        limit = int(request.args.get('limit', 50))
+        offset = int(request.args.get('offset', 0))
+        if limit < 0 or offset < 0:
+            raise ValueError("must not be negative")
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f"Invalid limit or offset: {e}"}), 400
+    
+    controller = EmailController()
+    
+    try:
+        results = controller.search_results(
+            query=request.args.get('q'),
+            order_number=request.args.get('order_number'),
+            tracking_number=request.args.get('tracking_number'),
+            vendor=request.args.get('vendor'),
+            date_from=request.args.get('date_from'),
+            date_to=request.args.get('date_to'),
+            source=request.args.get('source'),
+            limit=min(limit, 1000),
+            offset=offset,
+            relevance=request.args.get('relevance', 'false').lower() in ('1', 'true', 'yes')
+        )
+        return jsonify({'status': 'success', 'results': results})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/statistics', methods=['GET'])
+def running_statistics():
+    controller = EmailController()
+    
+    try:
+        statistics = controller.get_running_statistics(request.args.get('name', 'default'))
+        return jsonify({'status': 'success', 'statistics': statistics})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/statistics', methods=['POST'])
+def update_statistics():
+    data = request.json
+    controller = EmailController()
+    
+    try:
+        statistics = controller.update_statistics(data.get('parsed_data', []), data.get('name', 'default'))
+        return jsonify({'status': 'success', 'statistics': statistics})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+def _run_fetch_job(controller, data, job):
+    emails = controller.fetch_emails(
+        folder=data.get('folder', 'INBOX'),
+        limit=data.get('limit', 10),
+        criteria=data.get('criteria', 'ALL'),
+        batch_size=data.get('batch_size'),
+        partial=data.get('partial', False),
+        progress=job.report
+    )
+    return {'emails': emails}
+
+def _run_pipeline_job(controller, data, job):
+    return controller.run_pipeline(
+        folder=data.get('folder', 'INBOX'),
+        criteria=data.get('criteria', 'ALL'),
+        limit=data.get('limit'),
+        format_type=data.get('format', 'jsonl'),
+        batch_size=data.get('batch_size', 50),
+        workers=data.get('workers'),
+        partial=data.get('partial', False),
+        progress=job.report,
+        index=data.get('index', False)
+    )
+
+def _run_export_job(controller, data, job):
+    export_path = controller.export_data(data.get('parsed_data', []), data.get('format', 'csv'), progress=job.report)
+    return {'export_path': export_path}
+
+JOB_TYPES = {
+    'fetch': _run_fetch_job,
+    'pipeline': _run_pipeline_job,
+    'export': _run_export_job
+}
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    data = request.json or {}
+    job_type = data.get('type')
+    
+    if job_type not in JOB_TYPES:
+        return jsonify({'status': 'error', 'message': f"Unknown job type: {job_type}"}), 400
+    
+    run = JOB_TYPES[job_type]
+    try:
+        job = get_job_manager().submit(job_type, lambda job: run(EmailController(), data, job))
+    except JobQueueFull as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 429
+    
+    return jsonify({'status': 'success', 'job_id': job.id}), 202
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify({'status': 'success', 'jobs': [job.to_dict() for job in get_job_manager().list()]})
+
+@app.route('/jobs/stats', methods=['GET'])
+def job_stats():
+    return jsonify({'status': 'success', 'stats': get_job_manager().stats()})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    return jsonify({'status': 'success', 'job': job.to_dict()})
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    if job.status != 'succeeded':
+        return jsonify({'status': 'error', 'message': f"Job is {job.status}", 'job': job.to_dict()}), 409
+    
+    # Export-producing jobs are downloaded as the file itself
+    export_path = job.result.get('export_path')
+    if export_path:
+        return send_file(export_path, as_attachment=True)
+    return jsonify({'status': 'success', **job.result})
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = get_job_manager().cancel(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    return jsonify({'status': 'success', 'job': job.to_dict()})
+
 if __name__ == '__main__':
     app.run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,242 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+APP_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+if APP_DIRECTORY not in sys.path:
+    sys.path.insert(0, APP_DIRECTORY)
+
+from controllers.email_controller import EmailController
+from utils.metrics import metrics, metrics_enabled_from_env
+
+# Must stay out of sys.modules until a command needs them
+HEAVY_MODULES = ('flask', 'pandas', 'numpy', 'pyarrow', 'openpyxl', 'bs4')
+
+STARTUP_PROBE = (
+    "import sys, json, time\n"
+    "start = time.perf_counter()\n"
+    "import cli\n"
+    "elapsed = time.perf_counter() - start\n"
+    "print(json.dumps({'import_ms': elapsed * 1000, 'modules': sorted(sys.modules)}))\n"
+)
+
+def read_jsonl(path):
+    """
+    Yield one object per non-empty line of path, or of stdin for '-'
+    """
+    f = sys.stdin if path == '-' else open(path)
+    try:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def write_jsonl(records, path):
+    """
+    Write records one JSON object per line to path, or to stdout for '-'
+    
+    Returns the number of records written.
+    """
+    f = sys.stdout if path == '-' else open(path, 'w')
+    written = 0
+    try:
+        for record in records:
+            f.write(json.dumps(record, default=str))
+            f.write('\n')
+            written += 1
+    finally:
+        if f is sys.stdout:
+            f.flush()
+        else:
+            f.close()
+    return written
+
+def fetch(args, controller):
+    emails = controller.fetch_emails(args.folder, args.limit, args.criteria, args.batch_size, args.partial)
+    return f"Fetched {write_jsonl(emails, args.output)} emails"
+
+def parse(args, controller):
+    if args.archive:
+        from utils.archive_source import ArchiveSource
+        emails = ArchiveSource(args.archive).iter_emails(args.limit)
+    else:
+        emails = read_jsonl(args.input)
+    
+    results = controller.stream_emails(emails, workers=args.workers, chunk_size=args.chunk_size)
+    return f"Parsed {write_jsonl(results, args.output)} emails"
+
+def export(args, controller):
+    file_path = controller.export_data(list(read_jsonl(args.input)), args.format)
+    return f"Exported to {file_path}"
+
+def sync(args, controller):
+    emails, checkpoint = controller.sync_emails(args.folder, args.limit, args.batch_size)
+    written = write_jsonl(emails, args.output)
+    return f"Synced {written} new emails (uidvalidity {checkpoint['uidvalidity']}, last uid {checkpoint['last_uid']})"
+
+def watch(args, controller):
+    output = sys.stdout if args.output == '-' else open(args.output, 'a')
+    
+    def write(parsed_data):
+        output.write(json.dumps(parsed_data, default=str))
+        output.write('\n')
+        output.flush()
+    
+    settings = {}
+    if args.idle_interval is not None:
+        settings['idle_interval'] = args.idle_interval
+    if args.poll_interval is not None:
+        settings['poll_interval'] = args.poll_interval
+    
+    watcher = controller.create_watcher(write, args.folder, args.workers, args.batch_size, **settings)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    
+    stats = watcher.stats()
+    return f"Watched {stats['folder']} ({stats['mode']}): {stats['fetched']} emails, {stats['reconnects']} reconnects"
+
+def ingest(args, controller):
+    from utils.account_scheduler import load_accounts
+    
+    output = sys.stdout if args.output == '-' else open(args.output, 'a')
+    
+    def write(name, results):
+        for parsed_data in results:
+            parsed_data['account'] = name
+            output.write(json.dumps(parsed_data, default=str))
+            output.write('\n')
+        output.flush()
+    
+    settings = {}
+    for option in ('workers', 'per_server', 'task_timeout'):
+        if getattr(args, option) is not None:
+            settings[option] = getattr(args, option)
+    
+    try:
+        stats = controller.ingest_accounts(load_accounts(args.accounts), write, args.slice_size, args.batch_size, **settings)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    
+    for name, account_stats in stats['accounts'].items():
+        print(f"{name}: {account_stats['status']}, {account_stats['emails']} emails, "
+              f"{account_stats['errors']} errors{' (' + account_stats['last_error'] + ')' if account_stats['last_error'] else ''}",
+              file=sys.stderr)
+    return f"Ingested {stats['emails']} emails in {stats['elapsed_seconds']:.1f} s, {len(stats['failed'])} accounts failed"
+
+def check_startup(args):
+    """
+    Import the CLI in a fresh interpreter and fail on heavy modules or a slow start
+    """
+    result = subprocess.run(
+        [sys.executable, '-c', STARTUP_PROBE], cwd=APP_DIRECTORY, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr, file=sys.stderr)
+        return 1
+    
+    probe = json.loads(result.stdout)
+    loaded = [name for name in HEAVY_MODULES if name in probe['modules']]
+    print(f"Startup import: {probe['import_ms']:.1f} ms (budget {args.budget_ms} ms)", file=sys.stderr)
+    
+    if loaded:
+        print(f"Heavy modules loaded at startup: {', '.join(loaded)}", file=sys.stderr)
+    if loaded or probe['import_ms'] > args.budget_ms:
+        return 1
+    return 0
+
+COMMANDS = {
+    'fetch': fetch,
+    'parse': parse,
+    'export': export,
+    'sync': sync,
+    'watch': watch,
+    'ingest': ingest
+}
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Fetch, parse and export emails without the web interface")
+    parser.add_argument('--export-directory', help="where export files are written (default: ./exports)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    fetch_parser = commands.add_parser('fetch', help="fetch emails from the account in the environment as JSONL")
+    fetch_parser.add_argument('--folder', default='INBOX')
+    fetch_parser.add_argument('--limit', type=int, default=10)
+    fetch_parser.add_argument('--criteria', default='ALL')
+    fetch_parser.add_argument('--batch-size', type=int)
+    fetch_parser.add_argument('--partial', action='store_true', help="fetch the text parts only")
+    fetch_parser.add_argument('--output', '-o', default='-')
+    
+    parse_parser = commands.add_parser('parse', help="parse fetched emails (JSONL) or a local archive")
+    parse_parser.add_argument('input', nargs='?', default='-', help="JSONL from fetch, '-' for stdin")
+    parse_parser.add_argument('--archive', help="mbox file, Maildir or directory of .eml files instead of input")
+    parse_parser.add_argument('--limit', type=int, help="only the newest messages of --archive (default: all)")
+    parse_parser.add_argument('--workers', type=int)
+    parse_parser.add_argument('--chunk-size', type=int, default=50)
+    parse_parser.add_argument('--output', '-o', default='-')
+    
+    export_parser = commands.add_parser('export', help="export parse results (JSONL) to a file")
+    export_parser.add_argument('input', nargs='?', default='-', help="JSONL from parse, '-' for stdin")
+    export_parser.add_argument('--format', default='csv')
+    
+    sync_parser = commands.add_parser('sync', help="fetch emails that arrived since the last sync as JSONL")
+    sync_parser.add_argument('--folder', default='INBOX')
+    sync_parser.add_argument('--limit', type=int)
+    sync_parser.add_argument('--batch-size', type=int, default=50)
+    sync_parser.add_argument('--output', '-o', default='-')
+    
+    watch_parser = commands.add_parser('watch', help="parse new mail as it arrives (IMAP IDLE, else polling) until interrupted")
+    watch_parser.add_argument('--folder', default='INBOX')
+    watch_parser.add_argument('--workers', type=int)
+    watch_parser.add_argument('--batch-size', type=int, default=50)
+    watch_parser.add_argument('--idle-interval', type=float, help="seconds before IDLE is re-issued")
+    watch_parser.add_argument('--poll-interval', type=float, help="seconds between polls without IDLE")
+    watch_parser.add_argument('--output', '-o', default='-', help="JSONL results are appended here")
+    
+    ingest_parser = commands.add_parser('ingest', help="fetch and parse new mail from many accounts in worker processes")
+    ingest_parser.add_argument('accounts', help="JSON file with a list of {server, port, email, password, name, folder}")
+    ingest_parser.add_argument('--workers', type=int)
+    ingest_parser.add_argument('--per-server', type=int, help="most connections to one IMAP server at a time")
+    ingest_parser.add_argument('--task-timeout', type=float, help="seconds before a slice's process is killed")
+    ingest_parser.add_argument('--slice-size', type=int, default=200, help="new messages per account per turn")
+    ingest_parser.add_argument('--batch-size', type=int, default=50)
+    ingest_parser.add_argument('--output', '-o', default='-', help="JSONL results, with an 'account' key, are appended here")
+    
+    startup_parser = commands.add_parser('check-startup', help="fail if startup imports heavy modules or is slow")
+    startup_parser.add_argument('--budget-ms', type=float, default=250.0)
+    
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    
+    if args.command == 'check-startup':
+        return check_startup(args)
+    
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+    metrics.enabled = metrics_enabled_from_env()
+    
+    try:
+        controller = EmailController(export_directory=args.export_directory)
+        print(COMMANDS[args.command](args, controller), file=sys.stderr)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,15 +1,35 @@
 import os
 import json
-import pandas as pd
+import functools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from utils.email_connector import EmailConnector
 from utils.email_parser import EmailParser
+from utils.connection_pool import get_connection_pool
+from utils.parse_cache import get_parse_cache
+from utils.sync_state import SyncStateStore
+from utils.mailbox_watcher import MailboxWatcher, watcher_settings_from_env
+from utils.account_scheduler import AccountScheduler, AccountState, scheduler_settings_from_env
+from models.parsed_email import ParsedEmail, ParsedBatch
+from utils.result_index import ResultIndex
+from utils.metrics import metrics
+
+# Watcher wake-ups with fewer new emails are parsed in-process even with workers
+WATCH_PARALLEL_MIN = 20
+
+# asyncio, the exporters and the pandas-backed statistics are imported where
+# they are used, so fetching and parsing (and the CLI) start without them
 
 class EmailController:
-    def __init__(self):
+    def __init__(self, pool=None, export_directory=None):
         self.connector = None
-        self.parser = EmailParser()
-        self.export_directory = os.path.join(os.getcwd(), 'exports')
+        self.pool = pool or get_connection_pool()
+        self.sync_store = None
+        self.statistics_store = None
+        self.result_index = None
+        self.parser = EmailParser(cache=get_parse_cache())
+        self.export_directory = export_directory or os.path.join(os.getcwd(), 'exports')
         
         # Create exports directory if it doesn't exist
         if not os.path.exists(self.export_directory):
@@ -30,26 +50,193 @@ class EmailController:
             return self.connector.disconnect()
         return "Not connected"
     
-    def fetch_emails(self, folder="INBOX", limit=10, criteria="ALL"):
+    def fetch_emails(self, folder="INBOX", limit=10, criteria="ALL", batch_size=None, partial=False, progress=None):
         """
         Fetch emails from specified folder
+        
+        progress(fetched, total) is called after every FETCH chunk.
+        """
+        return self._with_connector(
+            lambda connector: connector.fetch_emails(
+                folder, limit, criteria, batch_size=batch_size, partial=partial, progress=progress
+            ),
+            retry=True
+        )
+    
+    def sync_emails(self, folder="INBOX", limit=None, batch_size=50):
+        """
+        Fetch only emails that arrived since the last sync of this folder
+        
+        The checkpoint (UIDVALIDITY and highest UID seen) is stored per
+        account/folder; a changed UIDVALIDITY triggers a full resync.
+        """
+        store = self._get_sync_store()
+        
+        def sync(connector):
+            account = f"{connector.email}@{connector.server}"
+            checkpoint = store.get(account, folder)
+            emails, new_checkpoint = connector.fetch_new_emails(folder, checkpoint, limit, batch_size)
+            store.save(account, folder, new_checkpoint)
+            return emails, new_checkpoint
+        
+        # Safe to repeat: the checkpoint is only saved once the fetch is done
+        return self._with_connector(sync, retry=True)
+    
+    def create_watcher(self, sink, folder="INBOX", workers=None, batch_size=50, **settings):
+        """
+        Watcher that parses new mail in folder as it arrives and passes each
+        result to sink(parsed_data)
+        
+        It uses its own session for the account of connect() or the
+        environment variables, and shares the sync checkpoints, so mail a
+        sync already returned is not delivered again. settings override the
+        WATCH_* intervals. Call run() on it (it blocks) and stop() to end.
+        
+        With workers > 1 one process pool serves every wake-up and is shut
+        down when run() returns; wake-ups with fewer than WATCH_PARALLEL_MIN
+        emails are parsed in-process, which is cheaper than a round trip.
+        """
+        if self.connector:
+            account = (self.connector.server, self.connector.port, self.connector.email, self.connector.password)
+        else:
+            account = (os.getenv('EMAIL_SERVER'), os.getenv('EMAIL_PORT'), os.getenv('EMAIL_USER'), os.getenv('EMAIL_PASSWORD'))
+        
+        if not all(account):
+            raise Exception("Connection failed: No active connection and missing environment variables")
+        
+        pool = []
+        
+        def handle(emails):
+            if not workers or workers <= 1 or len(emails) < WATCH_PARALLEL_MIN:
+                results = self.stream_emails(emails)
+            else:
+                if not pool:
+                    pool.append(ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self.parser,)))
+                # One chunk per worker, since a wake-up is at most batch_size emails
+                chunk_size = -(-len(emails) // workers)
+                results = self.stream_emails(emails, workers, chunk_size, window=len(emails), executor=pool[0])
+            
+            for parsed_data in results:
+                sink(parsed_data)
+        
+        def shutdown():
+            if pool:
+                pool.pop().shutdown()
+        
+        options = watcher_settings_from_env()
+        options.update(settings)
+        return MailboxWatcher(
+            EmailConnector(*account), handle, folder, store=self._get_sync_store(), batch_size=batch_size,
+            on_exit=shutdown, **options
+        )
+    
+    def ingest_accounts(self, accounts, sink, slice_size=200, batch_size=50, **settings):
+        """
+        Fetch and parse new mail from many accounts in worker processes
+        
+        accounts are dicts with server, port, email, password and optionally
+        name and folder. Each account is worked through slice_size new
+        messages at a time, round-robin, and sink(name, results) receives
+        every slice's parse results. Positions are the sync checkpoints, so
+        a rerun only picks up new mail. settings override the INGEST_*
+        worker, per-server and timeout limits. Returns per-account stats.
+        """
+        store = self._get_sync_store()
+        states = []
+        for account in accounts:
+            state = AccountState(account)
+            state.checkpoint = store.get(_account_key(account), state.folder)
+            states.append(state)
+        
+        def save_checkpoint(state):
+            store.save(_account_key(state.account), state.folder, state.checkpoint)
+        
+        options = scheduler_settings_from_env()
+        options.update(settings)
+        scheduler = AccountScheduler(
+            functools.partial(_ingest_slice, self.parser, slice_size, batch_size), sink,
+            on_checkpoint=save_checkpoint, **options
+        )
+        return scheduler.run(states)
+    
+    async def fetch_emails_async(self, folder="INBOX", limit=10, criteria="ALL", account=None,
+                                 sessions=4, batch_size=50, partial=False):
+        """
+        Fetch emails without blocking the event loop
+        
+        account is a dict with server/port/email/password (defaults to the
+        environment variables). The UID range is split across several
+        concurrent sessions to the same mailbox.
         """
-        if not self.connector or not self.connector.connection:
-            # Try to connect using environment variables
+        account = account or {
+            'server': os.getenv('EMAIL_SERVER'),
+            'port': os.getenv('EMAIL_PORT'),
+            'email': os.getenv('EMAIL_USER'),
+            'password': os.getenv('EMAIL_PASSWORD')
+        }
+        
+        if not all(account.get(key) for key in ('server', 'port', 'email', 'password')):
+            raise Exception("Connection failed: missing account settings")
+        
+        from utils.async_email_connector import AsyncEmailConnector
+        
+        connector = AsyncEmailConnector(
+            account['server'], account['port'], account['email'], account['password'], sessions=sessions
+        )
+        
+        try:
+            await connector.connect()
+            return await connector.fetch_emails(folder, limit, criteria, batch_size, partial)
+        finally:
             try:
-                server = os.getenv('EMAIL_SERVER')
-                port = os.getenv('EMAIL_PORT')
-                email = os.getenv('EMAIL_USER')
-                password = os.getenv('EMAIL_PASSWORD')
-                
-                if server and port and email and password:
-                    self.connect(server, port, email, password)
-                else:
-                    raise Exception("No active connection and missing environment variables")
-            except Exception as e:
-                raise Exception(f"Connection failed: {str(e)}")
+                await connector.disconnect()
+            except Exception:
+                pass
+    
+    async def fetch_many_async(self, accounts, folder="INBOX", limit=10, criteria="ALL", sessions=4, batch_size=50):
+        """
+        Fetch from several mailboxes at once; one failing account does not stop the others
+        """
+        import asyncio
+        
+        results = await asyncio.gather(
+            *(self.fetch_emails_async(folder, limit, criteria, account, sessions, batch_size) for account in accounts),
+            return_exceptions=True
+        )
+        
+        return [
+            {'account': account.get('email'), 'status': 'error', 'message': str(result)}
+            if isinstance(result, Exception)
+            else {'account': account.get('email'), 'status': 'success', 'emails': result}
+            for account, result in zip(accounts, results)
+        ]
+    
+    def _get_sync_store(self):
+        if self.sync_store is None:
+            path = os.getenv('SYNC_STATE_PATH') or os.path.join(os.getcwd(), 'data', 'sync_state.db')
+            self.sync_store = SyncStateStore(path)
+        return self.sync_store
+    
+    def _with_connector(self, operation, retry=False):
+        """
+        Run operation(connector) on the connection from connect(), or on a
+        pooled connection for the account in the environment variables
+        
+        retry reruns the operation once on a new pooled session if the
+        first one dropped; only pass it for operations safe to repeat.
+        """
+        if self.connector and self.connector.connection:
+            return operation(self.connector)
+        
+        server = os.getenv('EMAIL_SERVER')
+        port = os.getenv('EMAIL_PORT')
+        email = os.getenv('EMAIL_USER')
+        password = os.getenv('EMAIL_PASSWORD')
         
-        return self.connector.fetch_emails(folder, limit, criteria)
+        if not (server and port and email and password):
+            raise Exception("Connection failed: No active connection and missing environment variables")
+        
+        return self.pool.run(server, port, email, password, operation, retry=retry)
     
     def parse_email(self, email_content):
         """
@@ -57,145 +244,291 @@ class EmailController:
         """
         return self.parser.parse(email_content)
     
-    def batch_process(self, emails):
+    def batch_process(self, emails, workers=None, chunk_size=50, as_models=False, packed=False):
         """
         Process multiple emails
+        
+        With workers > 1 the emails are parsed in a pool of worker processes,
+        chunk_size emails per task, and results keep the input order. An email
+        that fails to parse gets an 'error' entry instead of aborting the batch.
+        
+        Results are dicts, ParsedEmail records with as_models, or a single
+        ParsedBatch with item columns packed into arrays with packed.
         """
-        results = []
+        if not workers or workers <= 1:
+            return self._collect_results((_process_email(self.parser, email) for email in emails), as_models, packed)
         
-        for email in emails:
-            parsed_data = self.parser.parse(email['body'])
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self.parser,)) as executor:
+            return self._collect_results(
+                executor.map(_process_in_worker, emails, chunksize=chunk_size), as_models, packed
+            )
+    
+    def _collect_results(self, results, as_models, packed):
+        # Results are converted as they arrive so the dicts never pile up
+        if packed:
+            return ParsedBatch.from_dicts(results)
+        if as_models:
+            return [ParsedEmail.from_dict(parsed_data) for parsed_data in results]
+        return list(results)
+    
+    def stream_emails(self, emails, workers=None, chunk_size=50, window=200, executor=None):
+        """
+        Parse an iterable of emails lazily, yielding results in input order
+        
+        With workers > 1, chunks of chunk_size emails are parsed in worker
+        processes with at most window emails in flight. The source is only
+        advanced as results are consumed, so a slow sink slows down fetching
+        instead of buffering. A long-lived executor set up with _init_worker
+        can be passed in to avoid starting a pool per call; it is left running.
+        """
+        if not workers or workers <= 1:
+            for email in emails:
+                yield _process_email(self.parser, email)
+            return
+        
+        if executor is not None:
+            yield from _stream_chunks(executor, emails, chunk_size, window)
+            return
+        
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self.parser,)) as executor:
+            yield from _stream_chunks(executor, emails, chunk_size, window)
+    
+    def run_pipeline(self, folder="INBOX", criteria="ALL", limit=None, format_type='jsonl',
+                     batch_size=50, workers=None, window=200, partial=False, progress=None, index=False):
+        """
+        Stream emails from the server through the parser into an export file
+        
+        Messages are fetched batch_size at a time and written as soon as they
+        are parsed, so memory is bounded by the fetch batch and the in-flight
+        window rather than by the mailbox size. progress(processed) is called
+        after every written email. With index, results are also added to the
+        search index, batch_size at a time.
+        """
+        from utils.exporters import get_exporter_class
+        
+        exporter_class = get_exporter_class(format_type)
+        
+        def pipeline(connector):
+            emails = connector.iter_emails(folder, limit, criteria, batch_size, partial=partial)
+            source = f"{connector.email}@{connector.server}/{folder}"
+            pending = []
+            processed = 0
+            errors = 0
             
-            # Add metadata
-            parsed_data['email_id'] = email['id']
-            parsed_data['email_subject'] = email['subject']
-            parsed_data['email_from'] = email['from']
-            parsed_data['email_date'] = email['date']
+            exporter = exporter_class(self._export_path(exporter_class.extension))
+            try:
+                for parsed_data in self.stream_emails(emails, workers, batch_size, window):
+                    with metrics.timer('export_write'):
+                        exporter.write(parsed_data)
+                    processed += 1
+                    if 'error' in parsed_data:
+                        errors += 1
+                    if index:
+                        pending.append(parsed_data)
+                        if len(pending) >= batch_size:
+                            self.index_results(pending, source)
+                            pending = []
+                    if progress:
+                        progress(processed)
+                
+                if pending:
+                    self.index_results(pending, source)
+            finally:
+                with metrics.timer('export_finish'):
+                    exporter.close()
             
-            results.append(parsed_data)
+            metrics.inc('export_rows_total', processed, "Rows written to export files", format=format_type)
+            metrics.inc('parse_errors_total', errors, "Emails that failed to parse")
+            return {'export_path': exporter.path, 'processed': processed, 'errors': errors}
         
-        return results
+        return self._with_connector(pipeline)
+    
+    def _export_path(self, extension):
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        return os.path.join(self.export_directory, f"email_data_{timestamp}.{extension}")
     
-    def export_data(self, data, format_type='csv'):
+    def export_data(self, data, format_type='csv', progress=None):
         """
         Export parsed data to a file
+        
+        csv, excel/xlsx, jsonl and parquet are written row by row through the
+        streaming exporters; the column set is discovered up front.
+        progress(written, total) is called after every row.
         """
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"email_data_{timestamp}"
+        if isinstance(data, ParsedBatch):
+            data = list(data.to_dicts())
+        elif isinstance(data, ParsedEmail):
+            data = data.to_dict()
+        elif isinstance(data, list) and any(isinstance(item, ParsedEmail) for item in data):
+            data = [item.to_dict() if isinstance(item, ParsedEmail) else item for item in data]
         
         if format_type == 'json':
-            file_path = os.path.join(self.export_directory, f"{filename}.json")
-            with open(file_path, 'w') as f:
+            file_path = self._export_path('json')
+            with metrics.timer('export_write'), open(file_path, 'w') as f:
                 json.dump(data, f, indent=4)
             return file_path
         
-        elif format_type == 'csv':
-            file_path = os.path.join(self.export_directory, f"{filename}.csv")
-            
-            # Convert to DataFrame for CSV export
-            # If data is a list of dictionaries, convert directly
-            if isinstance(data, list) and all(isinstance(item, dict) for item in data):
-                # Flatten nested dictionaries for CSV format
-                flattened_data = []
-                
-                for item in data:
-                    flat_item = {}
-                    
-                    for key, value in item.items():
-                        if isinstance(value, dict):
-                            for subkey, subvalue in value.items():
-                                flat_item[f"{key}_{subkey}"] = subvalue
-                        elif isinstance(value, list) and key == 'items':
-                            # Special handling for item lists
-                            for i, subitem in enumerate(value):
-                                for subkey, subvalue in subitem.items():
-                                    flat_item[f"item{i+1}_{subkey}"] = subvalue
-                        else:
-                            flat_item[key] = value
-                    
-                    flattened_data.append(flat_item)
-                
-                df = pd.DataFrame(flattened_data)
-            else:
-                # If it's a single dictionary, convert to a single-row DataFrame
-                df = pd.DataFrame([data])
-            
-            df.to_csv(file_path, index=False)
-            return file_path
+        from utils.exporters import get_exporter_class, discover_columns
         
-        elif format_type == 'excel':
-            file_path = os.path.join(self.export_directory, f"{filename}.xlsx")
-            
-            # Similar logic as CSV but for Excel
-            if isinstance(data, list) and all(isinstance(item, dict) for item in data):
-                flattened_data = []
-                
-                for item in data:
-                    flat_item = {}
-                    
-                    for key, value in item.items():
-                        if isinstance(value, dict):
-                            for subkey, subvalue in value.items():
-                                flat_item[f"{key}_{subkey}"] = subvalue
-                        elif isinstance(value, list) and key == 'items':
-                            for i, subitem in enumerate(value):
-                                for subkey, subvalue in subitem.items():
-                                    flat_item[f"item{i+1}_{subkey}"] = subvalue
-                        else:
-                            flat_item[key] = value
-                    
-                    flattened_data.append(flat_item)
-                
-                df = pd.DataFrame(flattened_data)
-            else:
-                df = pd.DataFrame([data])
-            
-            df.to_excel(file_path, index=False)
-            return file_path
+        exporter_class = get_exporter_class(format_type)
         
+        # A single dictionary is exported as a single row
+        if isinstance(data, list) and all(isinstance(item, dict) for item in data):
+            records = data
         else:
-            raise ValueError(f"Unsupported format: {format_type}")
+            records = [data]
+        
+        exporter = exporter_class(self._export_path(exporter_class.extension), columns=discover_columns(records))
+        try:
+            for written, record in enumerate(records, 1):
+                with metrics.timer('export_write'):
+                    exporter.write(record)
+                if progress:
+                    progress(written, len(records))
+        finally:
+            with metrics.timer('export_finish'):
+                exporter.close()
+        
+        metrics.inc('export_rows_total', len(records), "Rows written to export files", format=format_type)
+        return exporter.path
+    
+    def index_results(self, parsed_results, source=''):
+        """
+        Add parse results to the local search index
+        
+        Results are keyed by source (e.g. account/folder) and email id;
+        indexing the same email again replaces the stored result.
+        """
+        if isinstance(parsed_results, ParsedBatch):
+            parsed_results = parsed_results.to_dicts()
+        elif isinstance(parsed_results, dict):
+            parsed_results = [parsed_results]
+        
+        records = (item.to_dict() if isinstance(item, ParsedEmail) else item for item in parsed_results)
+        with metrics.timer('index_write'):
+            return self._get_result_index().add_many(records, source)
+    
+    def search_results(self, **filters):
+        """
+        Query the search index; see ResultIndex.search for the filters
+        """
+        with metrics.timer('index_search'):
+            return self._get_result_index().search(**filters)
+    
+    def _get_result_index(self):
+        if self.result_index is None:
+            path = os.getenv('RESULT_INDEX_PATH') or os.path.join(os.getcwd(), 'data', 'results.db')
+            self.result_index = ResultIndex(path)
+        return self.result_index
     
     def get_email_statistics(self, emails):
         """
         Generate statistics from processed emails
+        
+        Besides the sender/vendor counts and average order total, the result
+        has order total percentiles, per-sender and per-vendor totals,
+        currencies and per-day buckets, computed column-wise. Amount figures
+        are never added across currencies: the top-level ones cover the
+        main currency and by_currency has them for each currency.
+        """
+        from utils.email_statistics import compute_statistics
+        
+        return compute_statistics(emails)
+    
+    def update_statistics(self, emails, name='default'):
+        """
+        Merge processed emails into the stored running statistics and return them
+        
+        Only the new batch is scanned; history lives on as mergeable
+        aggregates, so percentiles here are estimates.
         """
-        if not emails:
-            return {}
-        
-        total_emails = len(emails)
-        
-        # Count emails by sender
-        senders = {}
-        for email in emails:
-            sender = email.get('email_from', '')
-            if sender:
-                senders[sender] = senders.get(sender, 0) + 1
-        
-        # Find most common vendor
-        vendors = {}
-        for email in emails:
-            vendor = email.get('vendor_name', '')
-            if vendor:
-                vendors[vendor] = vendors.get(vendor, 0) + 1
-        
-        # Calculate average order total
-        order_totals = []
-        for email in emails:
-            total = email.get('total_amount', '')
-            if total:
-                try:
-                    # Clean up amount string and convert to float
-                    cleaned_total = total.replace('$', '').replace(',', '')
-                    order_totals.append(float(cleaned_total))
-                except ValueError:
-                    pass
-        
-        avg_order_total = sum(order_totals) / len(order_totals) if order_totals else 0
-        
-        return {
-            'total_emails': total_emails,
-            'sender_distribution': senders,
-            'top_vendors': vendors,
-            'average_order_total': avg_order_total
-        } 
\ No newline at end of file
+        return self._get_statistics_store().update(emails, name).summary()
+    
+    def get_running_statistics(self, name='default'):
+        """
+        Stored running statistics without adding anything
+        """
+        return self._get_statistics_store().get(name).summary()
+    
+    def _get_statistics_store(self):
+        if self.statistics_store is None:
+            path = os.getenv('STATISTICS_PATH') or os.path.join(os.getcwd(), 'data', 'statistics.db')
+            from utils.email_statistics import StatisticsStore
+            
+            self.statistics_store = StatisticsStore(path)
+        return self.statistics_store
+
+def _stream_chunks(executor, emails, chunk_size, window):
+    """
+    Parse emails in executor chunk_size at a time, at most window in flight
+    """
+    max_in_flight = max(1, window // chunk_size)
+    pending = deque()
+    chunk = []
+    
+    for email in emails:
+        chunk.append(email)
+        if len(chunk) < chunk_size:
+            continue
+        
+        pending.append(executor.submit(_process_chunk_in_worker, chunk))
+        chunk = []
+        
+        if len(pending) >= max_in_flight:
+            yield from pending.popleft().result()
+    
+    if chunk:
+        pending.append(executor.submit(_process_chunk_in_worker, chunk))
+    
+    while pending:
+        yield from pending.popleft().result()
+
+# Parser used by batch_process worker processes, set once per process
+_worker_parser = None
+
+def _init_worker(parser):
+    global _worker_parser
+    _worker_parser = parser
+
+def _process_in_worker(email):
+    return _process_email(_worker_parser, email)
+
+def _process_chunk_in_worker(emails):
+    return [_process_email(_worker_parser, email) for email in emails]
+
+def _account_key(account):
+    # Same key sync_emails uses for the account's checkpoints
+    return f"{account['email']}@{account['server']}"
+
+def _ingest_slice(parser, slice_size, batch_size, account, checkpoint):
+    """
+    One scheduler slice: fetch up to slice_size new messages and parse them
+    """
+    connector = EmailConnector(account['server'], account['port'], account['email'], account['password'])
+    connector.connect()
+    try:
+        emails, checkpoint = connector.fetch_new_emails(account.get('folder', 'INBOX'), checkpoint, slice_size, batch_size)
+    finally:
+        try:
+            connector.disconnect()
+        except Exception:
+            pass
+    
+    return [_process_email(parser, email) for email in emails], checkpoint, len(emails) < slice_size
+
+def _process_email(parser, email):
+    """
+    Parse one fetched email and add its metadata
+    """
+    try:
+        parsed_data = parser.parse(email['body'], sender=email.get('from'), headers=email.get('headers'))
+    except Exception as e:
+        parsed_data = {'error': str(e)}
+    
+    # Add metadata
+    parsed_data['email_id'] = email.get('id')
+    parsed_data['email_subject'] = email.get('subject')
+    parsed_data['email_from'] = email.get('from')
+    parsed_data['email_date'] = email.get('date')
+    
+    return parsed_data
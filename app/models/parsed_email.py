@@ -0,0 +1,190 @@
+import re
+import math
+from array import array
+from utils.amounts import parse_amount
+
+EMAIL_FIELDS = (
+    'email_id', 'email_subject', 'email_from', 'email_date',
+    'order_number', 'order_date', 'total_amount', 'shipping_address',
+    'tracking_number', 'vendor_name', 'error'
+)
+
+def parse_quantity(value):
+    if value is None or isinstance(value, int):
+        return value
+    match = re.search(r'\d+', str(value))
+    return int(match.group(0)) if match else None
+
+class LineItem:
+    """
+    One order line with prices already converted to floats
+    """
+    __slots__ = ('name', 'quantity', 'unit_price', 'total_price')
+    
+    def __init__(self, name, quantity=None, unit_price=None, total_price=None):
+        self.name = name
+        self.quantity = quantity
+        self.unit_price = unit_price
+        self.total_price = total_price
+    
+    @classmethod
+    def from_dict(cls, item):
+        return cls(
+            item.get('name'),
+            parse_quantity(item.get('quantity')),
+            parse_amount(item.get('unit_price'))[0],
+            parse_amount(item.get('total_price'))[0]
+        )
+    
+    def to_dict(self):
+        # Same keys the parser produces: absent values are left out
+        item = {'name': self.name}
+        if self.quantity is not None:
+            item['quantity'] = self.quantity
+        if self.unit_price is not None:
+            item['unit_price'] = self.unit_price
+        if self.total_price is not None:
+            item['total_price'] = self.total_price
+        return item
+
+class ParsedEmail:
+    """
+    Parse result of one email with typed fields
+    
+    total_amount is a float and currency the code found next to it, if any;
+    an amount that does not parse keeps its original string in
+    total_amount_text. Fields from custom or vendor patterns that have no
+    slot are kept in extra. items is a list of LineItem, or None when
+    packed in a ParsedBatch.
+    """
+    __slots__ = EMAIL_FIELDS + ('currency', 'total_amount_text', 'items', 'extra')
+    
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+    
+    @classmethod
+    def from_dict(cls, parsed_data):
+        parsed_email = cls.__new__(cls)
+        extra = None
+        
+        for name in EMAIL_FIELDS:
+            setattr(parsed_email, name, parsed_data.get(name))
+        total_amount = parsed_data.get('total_amount')
+        parsed_email.total_amount, currency = parse_amount(total_amount)
+        # A float total_amount (from to_dict) carries its currency alongside
+        parsed_email.currency = currency or parsed_data.get('currency')
+        parsed_email.total_amount_text = total_amount if parsed_email.total_amount is None else None
+        
+        items = parsed_data.get('items')
+        parsed_email.items = [LineItem.from_dict(item) for item in items] if items else None
+        
+        for key, value in parsed_data.items():
+            if key not in EMAIL_FIELDS and key not in ('currency', 'items'):
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        parsed_email.extra = extra
+        
+        return parsed_email
+    
+    def to_dict(self):
+        """
+        Dict in the shape batch_process returns, with numeric amounts
+        
+        Reads back through from_dict to an equal record: the currency is
+        included and an unparseable total_amount stays the original string.
+        """
+        parsed_data = {}
+        for name in EMAIL_FIELDS:
+            value = getattr(self, name)
+            # Metadata keys are always present; extracted fields only when found
+            if value is not None or name.startswith('email_'):
+                parsed_data[name] = value
+        
+        if self.total_amount is None and self.total_amount_text is not None:
+            parsed_data['total_amount'] = self.total_amount_text
+        if self.currency is not None:
+            parsed_data['currency'] = self.currency
+        if self.items:
+            parsed_data['items'] = [item.to_dict() for item in self.items]
+        if self.extra:
+            parsed_data.update(self.extra)
+        
+        return parsed_data
+
+class ParsedBatch:
+    """
+    Many ParsedEmail records with their line items packed into columns
+    
+    Item fields live in typed arrays (NaN for a missing price, -1 for a
+    missing quantity) indexed through per-email offsets, instead of one
+    LineItem object per line.
+    """
+    __slots__ = ('emails', 'item_offsets', 'item_names', 'item_quantity', 'item_unit_price', 'item_total_price')
+    
+    def __init__(self):
+        self.emails = []
+        self.item_offsets = array('q', [0])
+        self.item_names = []
+        self.item_quantity = array('q')
+        self.item_unit_price = array('d')
+        self.item_total_price = array('d')
+    
+    @classmethod
+    def from_dicts(cls, records):
+        batch = cls()
+        for parsed_data in records:
+            batch.append(parsed_data)
+        return batch
+    
+    def append(self, parsed_email):
+        """
+        Add a ParsedEmail or a parse result dict
+        """
+        if isinstance(parsed_email, dict):
+            parsed_email = ParsedEmail.from_dict(parsed_email)
+        
+        for item in parsed_email.items or ():
+            self.item_names.append(item.name)
+            self.item_quantity.append(-1 if item.quantity is None else item.quantity)
+            self.item_unit_price.append(math.nan if item.unit_price is None else item.unit_price)
+            self.item_total_price.append(math.nan if item.total_price is None else item.total_price)
+        
+        parsed_email.items = None
+        self.emails.append(parsed_email)
+        self.item_offsets.append(len(self.item_names))
+    
+    def items(self, index):
+        """
+        LineItem objects of the email at index
+        """
+        return [
+            LineItem(
+                self.item_names[position],
+                None if self.item_quantity[position] < 0 else self.item_quantity[position],
+                None if math.isnan(self.item_unit_price[position]) else self.item_unit_price[position],
+                None if math.isnan(self.item_total_price[position]) else self.item_total_price[position]
+            )
+            for position in range(self.item_offsets[index], self.item_offsets[index + 1])
+        ]
+    
+    def to_dict(self, index):
+        parsed_data = self.emails[index].to_dict()
+        items = self.items(index)
+        if items:
+            parsed_data['items'] = [item.to_dict() for item in items]
+        return parsed_data
+    
+    def to_dicts(self):
+        """
+        Yield every email as a dict, items included
+        """
+        for index in range(len(self.emails)):
+            yield self.to_dict(index)
+    
+    def __len__(self):
+        return len(self.emails)
+    
+    def __iter__(self):
+        return iter(self.emails)
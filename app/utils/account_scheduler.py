@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
+from utils.metrics import metrics
+
+ACCOUNT_KEYS = ('server', 'port', 'email', 'password')
+
+class AccountState:
+    """
+    Scheduling state and running totals of one account
+    """
+    def __init__(self, account, checkpoint=None):
+        missing = [key for key in ACCOUNT_KEYS if not account.get(key)]
+        if missing:
+            raise Exception(f"Account {account.get('name') or account.get('email')} is missing {', '.join(missing)}")
+        
+        self.account = account
+        self.folder = account.get('folder', 'INBOX')
+        self.name = account.get('name') or f"{account['email']}@{account['server']}/{self.folder}"
+        self.server = str(account['server']).lower()
+        self.checkpoint = checkpoint
+        self.process = None
+        self.status = 'pending'
+        self.ready_at = 0.0
+        self.emails = 0
+        self.slices = 0
+        self.errors = 0
+        self.failures_in_row = 0
+        self.busy_seconds = 0.0
+        self.last_error = None
+    
+    def to_dict(self):
+        return {
+            'status': self.status,
+            'emails': self.emails,
+            'slices': self.slices,
+            'errors': self.errors,
+            'busy_seconds': self.busy_seconds,
+            'emails_per_second': self.emails / self.busy_seconds if self.busy_seconds else 0.0,
+            'last_uid': self.checkpoint['last_uid'] if self.checkpoint else None,
+            'last_error': self.last_error
+        }
+
+class AccountScheduler:
+    """
+    Runs per-account work in worker processes, one slice at a time
+    
+    task(account, checkpoint) runs in a fresh process and returns
+    (results, new_checkpoint, done); a slice should cover a bounded amount
+    of mail so accounts take turns. Accounts are served round-robin, at
+    most workers slices run at once and at most per_server of them against
+    the same IMAP server. A slice that raises, crashes its process or runs
+    longer than task_timeout is counted as an error and retried after a
+    backoff; after max_failures in a row the account is marked failed.
+    Either way the other accounts carry on.
+    
+    sink(name, results) and on_checkpoint(state) run in the calling process,
+    in that order, so a checkpoint is only saved once its results are out.
+    """
+    def __init__(self, task, sink, workers=4, per_server=2, task_timeout=600, max_failures=3,
+                 backoff=5.0, on_checkpoint=None):
+        self.task = task
+        self.sink = sink
+        self.workers = max(1, workers)
+        self.per_server = max(1, per_server)
+        self.task_timeout = task_timeout
+        self.max_failures = max_failures
+        self.backoff = backoff
+        self.on_checkpoint = on_checkpoint
+    
+    def run(self, states):
+        """
+        Work through every account until each is done or failed
+        
+        Returns per-account stats and totals.
+        """
+        started = time.monotonic()
+        queue = deque(states)
+        running = {}
+        per_server = {}
+        
+        while queue or running:
+            while len(running) < self.workers:
+                state = self._next_ready(queue, per_server)
+                if state is None:
+                    break
+                connection = self._start(state)
+                running[connection] = (state, time.monotonic())
+                per_server[state.server] = per_server.get(state.server, 0) + 1
+            
+            if not running:
+                # Everything left is backing off
+                time.sleep(max(0.0, min(state.ready_at for state in queue) - time.monotonic()))
+                continue
+            
+            for connection in wait(list(running), timeout=self._wait_timeout(running, queue)):
+                state, slice_started = running.pop(connection)
+                self._finish(state, connection, slice_started, queue)
+                per_server[state.server] -= 1
+            
+            now = time.monotonic()
+            for connection, (state, slice_started) in list(running.items()):
+                if now - slice_started > self.task_timeout:
+                    del running[connection]
+                    per_server[state.server] -= 1
+                    self._kill(state, connection, f"Timed out after {self.task_timeout} s", slice_started, queue)
+        
+        elapsed = time.monotonic() - started
+        emails = sum(state.emails for state in states)
+        return {
+            'accounts': {state.name: state.to_dict() for state in states},
+            'emails': emails,
+            'elapsed_seconds': elapsed,
+            'emails_per_second': emails / elapsed if elapsed else 0.0,
+            'failed': [state.name for state in states if state.status == 'failed']
+        }
+    
+    def _next_ready(self, queue, per_server):
+        """
+        First account in round-robin order that is not backing off and whose
+        server has a free connection; it leaves the queue until its slice ends
+        """
+        now = time.monotonic()
+        for _ in range(len(queue)):
+            state = queue.popleft()
+            if state.ready_at <= now and per_server.get(state.server, 0) < self.per_server:
+                return state
+            queue.append(state)
+        return None
+    
+    def _start(self, state):
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(
+            target=_run_slice, args=(self.task, state.account, state.checkpoint, sender),
+            name=f"ingest-{state.name}", daemon=True
+        )
+        process.start()
+        sender.close()
+        
+        state.status = 'running'
+        state.process = process
+        return receiver
+    
+    def _finish(self, state, connection, slice_started, queue):
+        try:
+            outcome = connection.recv()
+        except EOFError:
+            # The process died without reporting back
+            state.process.join(1)
+            outcome = ('error', f"Worker exited with code {state.process.exitcode}")
+        finally:
+            connection.close()
+        
+        state.process.join()
+        state.busy_seconds += time.monotonic() - slice_started
+        
+        if outcome[0] == 'error':
+            self._failed(state, outcome[1], queue)
+            return
+        
+        _, results, checkpoint, done = outcome
+        try:
+            if results:
+                self.sink(state.name, results)
+            state.checkpoint = checkpoint
+            if self.on_checkpoint is not None:
+                self.on_checkpoint(state)
+        except Exception as e:
+            self._failed(state, f"Sink failed: {e}", queue)
+            return
+        
+        state.emails += len(results)
+        state.slices += 1
+        state.failures_in_row = 0
+        metrics.inc('ingest_emails_total', len(results), "Emails ingested by the account scheduler")
+        
+        if done:
+            state.status = 'done'
+        else:
+            state.status = 'pending'
+            queue.append(state)
+    
+    def _kill(self, state, connection, error, slice_started, queue):
+        state.process.terminate()
+        state.process.join(5)
+        if state.process.is_alive():
+            state.process.kill()
+            state.process.join()
+        connection.close()
+        
+        state.busy_seconds += time.monotonic() - slice_started
+        self._failed(state, error, queue)
+    
+    def _failed(self, state, error, queue):
+        state.errors += 1
+        state.failures_in_row += 1
+        state.last_error = error
+        metrics.inc('ingest_errors_total', 1, "Account slices that failed, crashed or timed out")
+        
+        if state.failures_in_row >= self.max_failures:
+            state.status = 'failed'
+            return
+        
+        state.status = 'pending'
+        state.ready_at = time.monotonic() + self.backoff * 2 ** (state.failures_in_row - 1)
+        queue.append(state)
+    
+    def _wait_timeout(self, running, queue):
+        now = time.monotonic()
+        deadlines = [slice_started + self.task_timeout for _, slice_started in running.values()]
+        deadlines.extend(state.ready_at for state in queue if state.ready_at > now)
+        return max(0.0, min(deadlines) - now)
+
+def _run_slice(task, account, checkpoint, connection):
+    """
+    Worker process body: run one slice and send its outcome back
+    """
+    try:
+        results, checkpoint, done = task(account, checkpoint)
+        connection.send(('ok', results, checkpoint, done))
+    except Exception as e:
+        connection.send(('error', str(e)))
+    finally:
+        connection.close()
+
+def load_accounts(path):
+    """
+    Read account configs from a JSON file holding a list of objects with
+    server, port, email, password and optionally name and folder
+    """
+    with open(path) as f:
+        return json.load(f)
+
+def scheduler_settings_from_env():
+    """
+    workers, per_server, task_timeout and max_failures from INGEST_* variables
+    """
+    return {
+        'workers': int(os.getenv('INGEST_WORKERS', 4)),
+        'per_server': int(os.getenv('INGEST_PER_SERVER_LIMIT', 2)),
+        'task_timeout': float(os.getenv('INGEST_TASK_TIMEOUT', 600)),
+        'max_failures': int(os.getenv('INGEST_MAX_FAILURES', 3))
+    }
@@ -0,0 +1,39 @@
+import re
+
+# Patterns are kept as strings too, for the column-wise pandas version
+CURRENCY_PATTERN = r'\$|€|£|USD|EUR|GBP'
+AMOUNT_JUNK_PATTERN = r'[^\d,.\-]'
+# A comma followed by one or two final digits is a decimal separator
+DECIMAL_COMMA_PATTERN = r',\d{1,2}$'
+
+CURRENCY_RE = re.compile(CURRENCY_PATTERN)
+AMOUNT_JUNK_RE = re.compile(AMOUNT_JUNK_PATTERN)
+DECIMAL_COMMA_RE = re.compile(DECIMAL_COMMA_PATTERN)
+
+CURRENCY_CODES = {'$': 'USD', '€': 'EUR', '£': 'GBP'}
+
+def parse_amount(value):
+    """
+    Parse an amount like '1,234.56', '€1.234,56' or '12,50' into (float, currency)
+    
+    Either part is None when it cannot be determined.
+    """
+    if value is None or value == '':
+        return None, None
+    if isinstance(value, (int, float)):
+        return float(value), None
+    
+    text = str(value)
+    currency = CURRENCY_RE.search(text)
+    currency = CURRENCY_CODES.get(currency.group(0), currency.group(0)) if currency else None
+    
+    digits = AMOUNT_JUNK_RE.sub('', text)
+    if DECIMAL_COMMA_RE.search(digits):
+        digits = digits.replace('.', '').replace(',', '.')
+    else:
+        digits = digits.replace(',', '')
+    
+    try:
+        return float(digits), currency
+    except ValueError:
+        return None, currency
@@ -0,0 +1,146 @@
+import os
+import re
+import mmap
+from utils.email_message import build_email_data
+from utils.vendor_extractors import fingerprint_header_names
+
+# An mbox message starts at a line beginning with "From "
+MBOX_BOUNDARY_RE = re.compile(rb'^From ', re.MULTILINE)
+# mboxrd quoting: one '>' is added to body lines that start with >*From
+MBOX_QUOTED_FROM_RE = re.compile(rb'^>(>*From )', re.MULTILINE)
+
+class ArchiveSource:
+    """
+    Read emails from local archives instead of an IMAP server
+    
+    path may be an mbox file, a single .eml file, a Maildir (a directory
+    with cur/ and new/) or a directory tree of .eml files. mbox files are
+    memory-mapped and only the message boundaries are indexed up front;
+    each message is copied out of the map when it is yielded. Email dicts
+    are built by build_email_data, as in EmailConnector, with ids numbered
+    from 1 in archive order.
+    """
+    def __init__(self, path, kind=None):
+        self.path = path
+        self.kind = kind or self._detect_kind(path)
+        
+        if self.kind not in ('mbox', 'maildir', 'eml'):
+            raise Exception(f"Unsupported archive type: {self.kind}")
+    
+    def fetch_emails(self, limit=None):
+        """
+        Read emails from the archive
+        
+        As in EmailConnector.fetch_emails, limit keeps the newest (last)
+        messages.
+        """
+        return list(self.iter_emails(limit))
+    
+    def iter_emails(self, limit=None):
+        """
+        Yield email dicts one message at a time
+        """
+        header_names = fingerprint_header_names()
+        
+        if self.kind == 'mbox':
+            yield from self._iter_mbox(limit, header_names)
+            return
+        
+        paths = self._message_files()
+        first = max(0, len(paths) - limit) if limit else 0
+        
+        for index in range(first, len(paths)):
+            with open(paths[index], 'rb') as f:
+                raw_email = f.read()
+            yield build_email_data(str(index + 1), raw_email, header_names)
+    
+    def count(self):
+        """
+        Number of messages in the archive
+        """
+        if self.kind == 'mbox':
+            with open(self.path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return 0
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return len(self._mbox_offsets(mapped))
+        return len(self._message_files())
+    
+    def _iter_mbox(self, limit, header_names):
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                # Messages are read front to back, so let the kernel read ahead
+                if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                
+                offsets = self._mbox_offsets(mapped)
+                first = max(0, len(offsets) - limit) if limit else 0
+                
+                for index in range(first, len(offsets)):
+                    start = offsets[index]
+                    end = offsets[index + 1] if index + 1 < len(offsets) else len(mapped)
+                    yield build_email_data(str(index + 1), self._mbox_message(mapped, start, end), header_names)
+    
+    def _mbox_offsets(self, mapped):
+        """
+        Start offsets of every "From " separator line
+        """
+        return [match.start() for match in MBOX_BOUNDARY_RE.finditer(mapped)]
+    
+    def _mbox_message(self, mapped, start, end):
+        """
+        Raw message between two separators, without the "From " line
+        """
+        body_start = mapped.find(b'\n', start, end)
+        if body_start == -1:
+            return b''
+        
+        raw_email = mapped[body_start + 1:end]
+        
+        # The separator is preceded by a blank line that belongs to the mbox format
+        if raw_email.endswith(b'\r\n'):
+            raw_email = raw_email[:-2]
+        elif raw_email.endswith(b'\n'):
+            raw_email = raw_email[:-1]
+        
+        return MBOX_QUOTED_FROM_RE.sub(rb'\1', raw_email)
+    
+    def _message_files(self):
+        """
+        Message file paths in a stable order
+        """
+        if self.kind == 'eml' and os.path.isfile(self.path):
+            return [self.path]
+        
+        if self.kind == 'maildir':
+            paths = []
+            for subdirectory in ('cur', 'new'):
+                directory = os.path.join(self.path, subdirectory)
+                if os.path.isdir(directory):
+                    paths.extend(
+                        os.path.join(directory, name) for name in os.listdir(directory)
+                        if not name.startswith('.')
+                    )
+            # Maildir file names start with the delivery time
+            return sorted(paths, key=os.path.basename)
+        
+        paths = []
+        for directory, subdirectories, names in os.walk(self.path):
+            subdirectories.sort()
+            paths.extend(os.path.join(directory, name) for name in sorted(names) if name.lower().endswith('.eml'))
+        return paths
+    
+    def _detect_kind(self, path):
+        if os.path.isdir(path):
+            if os.path.isdir(os.path.join(path, 'cur')) or os.path.isdir(os.path.join(path, 'new')):
+                return 'maildir'
+            return 'eml'
+        
+        if not os.path.exists(path):
+            raise Exception(f"Archive not found: {path}")
+        if path.lower().endswith('.eml'):
+            return 'eml'
+        return 'mbox'
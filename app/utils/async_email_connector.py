@@ -0,0 +1,101 @@
+import asyncio
+import functools
+from utils.email_connector import EmailConnector
+
+class AsyncEmailConnector:
+    """
+    asyncio counterpart of EmailConnector
+    
+    imaplib is blocking, so each IMAP session runs its commands in an
+    executor thread while the event loop stays free. fetch_emails splits the
+    matching UIDs into contiguous ranges and fetches them over several
+    sessions to the same account at once; results come back in UID order.
+    """
+    def __init__(self, server, port, email, password, sessions=4, executor=None):
+        self.server = server
+        self.port = int(port)
+        self.email = email
+        self.password = password
+        self.executor = executor
+        self.connectors = [EmailConnector(server, port, email, password) for _ in range(max(1, sessions))]
+    
+    async def connect(self):
+        """
+        Open and authenticate every session concurrently
+        """
+        await asyncio.gather(*(self._run(connector.connect) for connector in self.connectors))
+        return f"Successfully connected to {self.email} ({len(self.connectors)} sessions)"
+    
+    async def disconnect(self):
+        """
+        Log out every open session
+        """
+        results = await asyncio.gather(
+            *(self._run(connector.disconnect) for connector in self.connectors if connector.connection),
+            return_exceptions=True
+        )
+        for connector in self.connectors:
+            connector.connection = None
+        
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            raise Exception(f"Disconnect failed: {str(errors[0])}")
+        return "Successfully disconnected"
+    
+    async def get_folders(self):
+        """
+        Get list of available folders
+        """
+        return await self._run(self.connectors[0].get_folders)
+    
+    async def fetch_emails(self, folder="INBOX", limit=10, criteria="ALL", batch_size=50, partial=False):
+        """
+        Fetch emails from specified folder over all sessions concurrently
+        
+        Email ids are UIDs. limit keeps the newest messages, as in
+        EmailConnector.fetch_emails.
+        """
+        primary = self.connectors[0]
+        if not primary.connection:
+            raise Exception("Not connected to server")
+        
+        uids = await self._run(primary._search, folder, criteria, True)
+        
+        if limit and len(uids) > limit:
+            uids = uids[-limit:]
+        
+        partitions = self._partition(uids, len(self.connectors))
+        results = await asyncio.gather(*(
+            self._run(self._fetch_partition, connector, folder, part, batch_size, partial)
+            for connector, part in zip(self.connectors, partitions)
+        ))
+        
+        return [email for part in results for email in part]
+    
+    def _fetch_partition(self, connector, folder, uids, batch_size, partial):
+        """
+        Fetch one contiguous UID range on one session (runs in a thread)
+        """
+        connector.connection.select(folder)
+        fetch_chunk = connector._fetch_partial if partial else connector._fetch_batched
+        return fetch_chunk(uids, batch_size, use_uid=True)
+    
+    def _partition(self, uids, count):
+        """
+        Split uids into at most count contiguous, non-empty slices
+        """
+        size, remainder = divmod(len(uids), count)
+        partitions = []
+        start = 0
+        
+        for index in range(count):
+            end = start + size + (1 if index < remainder else 0)
+            if end > start:
+                partitions.append(uids[start:end])
+            start = end
+        
+        return partitions
+    
+    async def _run(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(function, *args))
@@ -0,0 +1,204 @@
+import os
+import imaplib
+import threading
+import time
+from contextlib import contextmanager
+from utils.email_connector import EmailConnector
+
+# Errors that mean the session itself is gone rather than the command failing
+CONNECTION_ERRORS = (imaplib.IMAP4.abort, OSError)
+
+class ConnectionPool:
+    def __init__(self, max_size=4, idle_timeout=300, health_check_interval=30, checkout_timeout=30):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+        
+        self._condition = threading.Condition()
+        self._idle = {}
+        self._in_use = {}
+    
+    def acquire(self, server, port, email, password):
+        """
+        Check out an authenticated connector, reusing an idle session when possible
+        """
+        key = self._key(server, port, email)
+        deadline = time.monotonic() + self.checkout_timeout
+        connector = None
+        
+        with self._condition:
+            while True:
+                stale = self._evict_expired()
+                idle = self._idle.get(key)
+                
+                if idle:
+                    connector, last_used = idle.pop()
+                    break
+                
+                if len(self._idle.get(key, [])) + self._in_use.get(key, 0) < self.max_size:
+                    break
+                
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._close_all(stale)
+                    raise Exception(f"Timed out waiting for a pooled connection to {server}")
+                self._condition.wait(remaining)
+            
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+        
+        self._close_all(stale)
+        
+        try:
+            if connector is not None and not self._is_reusable(connector, password, last_used):
+                self._close(connector)
+                connector = None
+            
+            if connector is None:
+                connector = EmailConnector(server, port, email, password)
+                connector.connect()
+        except Exception:
+            self._checkin(key, None)
+            raise
+        
+        return connector
+    
+    def release(self, connector, discard=False):
+        """
+        Return a connector to the pool, or close it if it is no longer usable
+        """
+        key = self._key(connector.server, connector.port, connector.email)
+        
+        if discard or not connector.connection:
+            self._close(connector)
+            self._checkin(key, None)
+        else:
+            self._checkin(key, connector)
+    
+    @contextmanager
+    def connection(self, server, port, email, password):
+        """
+        Context manager around acquire/release; sessions that raised are discarded
+        """
+        connector = self.acquire(server, port, email, password)
+        
+        try:
+            yield connector
+        except Exception:
+            self.release(connector, discard=True)
+            raise
+        else:
+            self.release(connector)
+    
+    def run(self, server, port, email, password, operation, retry=False):
+        """
+        Run operation(connector) on a pooled session
+        
+        With retry, an operation whose session dropped is run once more on a
+        new one. Only pass it for operations that are safe to repeat from
+        the start (reads); anything that writes or exports would do its
+        work twice.
+        """
+        try:
+            with self.connection(server, port, email, password) as connector:
+                return operation(connector)
+        except CONNECTION_ERRORS:
+            if not retry:
+                raise
+            with self.connection(server, port, email, password) as connector:
+                return operation(connector)
+    
+    def close_all(self):
+        """
+        Log out every idle session
+        """
+        with self._condition:
+            idle = [connector for entries in self._idle.values() for connector, _ in entries]
+            self._idle = {}
+        
+        self._close_all(idle)
+    
+    def stats(self):
+        """
+        Idle and checked-out session counts per server/user
+        """
+        with self._condition:
+            keys = set(self._idle) | set(self._in_use)
+            return {
+                f"{email}@{server}:{port}": {
+                    'idle': len(self._idle.get((server, port, email), [])),
+                    'in_use': self._in_use.get((server, port, email), 0)
+                }
+                for server, port, email in keys
+            }
+    
+    def _key(self, server, port, email):
+        return (server, int(port), email)
+    
+    def _is_reusable(self, connector, password, last_used):
+        """
+        Decide whether an idle session can be handed out again
+        """
+        if connector.password != password:
+            return False
+        
+        # Only pay for a NOOP round trip when the session has been idle a while
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        
+        return connector.check_connection()
+    
+    def _checkin(self, key, connector):
+        with self._condition:
+            self._in_use[key] = max(self._in_use.get(key, 0) - 1, 0)
+            
+            if connector is not None:
+                self._idle.setdefault(key, []).append((connector, time.monotonic()))
+            
+            self._condition.notify()
+    
+    def _evict_expired(self):
+        """
+        Drop idle sessions past idle_timeout; caller holds the lock and closes them
+        """
+        now = time.monotonic()
+        expired = []
+        
+        for key, entries in self._idle.items():
+            fresh = []
+            for connector, last_used in entries:
+                if now - last_used > self.idle_timeout:
+                    expired.append(connector)
+                else:
+                    fresh.append((connector, last_used))
+            self._idle[key] = fresh
+        
+        return expired
+    
+    def _close_all(self, connectors):
+        for connector in connectors:
+            self._close(connector)
+    
+    def _close(self, connector):
+        try:
+            connector.disconnect()
+        except Exception:
+            pass
+        connector.connection = None
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+def get_connection_pool():
+    """
+    Process-wide connection pool, configured from environment variables
+    """
+    global _shared_pool
+    
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = ConnectionPool(
+                max_size=int(os.getenv('EMAIL_POOL_MAX_SIZE', 4)),
+                idle_timeout=float(os.getenv('EMAIL_POOL_IDLE_TIMEOUT', 300))
+            )
+        return _shared_pool
@@ -1,9 +1,25 @@
 import imaplib
 import email
-from email.header import decode_header
+import time
+import select
+import ssl
+import base64
+import quopri
 import re
 import os
 from datetime import datetime
+from utils.imap_response import parse_fetch_response, parse_bodystructure
+from utils.email_message import build_email_data, decode_body, decode_email_header, routing_headers
+from utils.metrics import metrics
+from utils.vendor_extractors import fingerprint_header_names
+
+# Message number / UID at the head of an untagged FETCH response
+SEQUENCE_RE = re.compile(rb'^(\d+) \(')
+UID_RE = re.compile(rb'UID (\d+)')
+
+
+# How long to wait for the server to end an IDLE after DONE
+IDLE_DONE_TIMEOUT = 30
 
 class EmailConnector:
     def __init__(self, server, port, email, password):
@@ -18,8 +34,9 @@ class EmailConnector:
         Connect to the email server using IMAP
         """
         try:
-            self.connection = imaplib.IMAP4_SSL(self.server, self.port)
-            self.connection.login(self.email, self.password)
+            with metrics.timer('imap_connect'):
+                self.connection = imaplib.IMAP4_SSL(self.server, self.port)
+                self.connection.login(self.email, self.password)
             return f"Successfully connected to {self.email}"
         except Exception as e:
             raise Exception(f"Connection failed: {str(e)}")
@@ -36,6 +53,81 @@ class EmailConnector:
                 raise Exception(f"Disconnect failed: {str(e)}")
         return "No active connection"
     
+    def check_connection(self):
+        """
+        Check that the session is still usable with a NOOP round trip
+        """
+        if not self.connection:
+            return False
+        
+        try:
+            response, _ = self.connection.noop()
+            return response == 'OK'
+        except Exception:
+            return False
+    
+    def supports_idle(self):
+        """
+        Whether the server advertised the IDLE extension (RFC 2177)
+        """
+        return 'IDLE' in getattr(self.connection, 'capabilities', ())
+    
+    def idle(self, timeout, stop=None):
+        """
+        Wait in IDLE on the selected folder until the server reports new mail
+        
+        Returns True on an EXISTS notification, False once timeout seconds
+        pass or the stop event is set. imaplib has no IDLE command before
+        Python 3.14, so the command is sent by hand and its responses read
+        through imaplib's own reader, which also sees mail reported to an
+        earlier command or already read ahead into its buffer. The session
+        is back in normal command state when this returns.
+        """
+        if not self.connection:
+            raise Exception("Not connected to server")
+        
+        connection = self.connection
+        
+        # Untagged data may arrive at any time; take in what is already here
+        while _input_buffered(connection):
+            _read_response(connection)
+        if _take_new_mail(connection):
+            return True
+        
+        tag = connection._new_tag()
+        try:
+            connection.send(tag + b' IDLE\r\n')
+            
+            # The continuation comes at once; DONE is only valid after it
+            done_deadline = time.monotonic() + IDLE_DONE_TIMEOUT
+            while True:
+                if not _wait_for_input(connection, done_deadline):
+                    raise imaplib.IMAP4.abort("No response to IDLE")
+                if _read_response(connection) is None:
+                    break
+                _check_idle_failed(connection, tag)
+            
+            deadline = time.monotonic() + timeout
+            new_mail = _take_new_mail(connection)
+            while not new_mail and _wait_for_input(connection, deadline, stop):
+                _read_response(connection)
+                _check_idle_failed(connection, tag)
+                new_mail = _take_new_mail(connection)
+            
+            connection.send(b'DONE\r\n')
+            done_deadline = time.monotonic() + IDLE_DONE_TIMEOUT
+            while connection.tagged_commands[tag] is None:
+                if not _wait_for_input(connection, done_deadline):
+                    raise imaplib.IMAP4.abort("No response to IDLE DONE")
+                _read_response(connection)
+            
+            response, data = connection.tagged_commands[tag]
+            if response != 'OK':
+                raise Exception(f"IDLE failed: {response} {data}")
+            return _take_new_mail(connection) or new_mail
+        finally:
+            connection.tagged_commands.pop(tag, None)
+    
     def get_folders(self):
         """
         Get list of available folders
@@ -53,99 +145,457 @@ class EmailConnector:
         
         return folders
     
-    def fetch_emails(self, folder="INBOX", limit=10, criteria="ALL"):
+    def fetch_emails(self, folder="INBOX", limit=10, criteria="ALL", batch_size=None, use_uid=False, partial=False,
+                     progress=None):
         """
         Fetch emails from specified folder
+        
+        With batch_size set, messages are requested in chunks of up to
+        batch_size ids per FETCH command instead of one round trip per email.
+        Larger chunks mean fewer round trips but more raw messages held in
+        memory at once. use_uid searches and fetches by UID instead of
+        message sequence number.
+        
+        partial fetches BODYSTRUCTURE and headers first, then only the text
+        part that would be used as the body, so attachments are never
+        downloaded. Each email then also reports 'skipped_parts' and
+        'bytes_saved'.
+        
+        progress(fetched, total) is called after every FETCH chunk (every
+        message without batch_size); an exception it raises stops the fetch.
         """
         if not self.connection:
             raise Exception("Not connected to server")
         
-        self.connection.select(folder)
-        response, messages = self.connection.search(None, criteria)
-        
-        email_ids = messages[0].split()
+        email_ids = self._search(folder, criteria, use_uid)
         
         # Get the last 'limit' number of emails
         if len(email_ids) > limit:
             email_ids = email_ids[-limit:]
         
+        if partial:
+            return self._fetch_partial(email_ids, batch_size or 50, use_uid, progress)
+        
+        if batch_size:
+            return self._fetch_batched(email_ids, batch_size, use_uid, progress)
+        
         emails = []
+        header_names = fingerprint_header_names()
         
         for email_id in email_ids:
-            response, msg_data = self.connection.fetch(email_id, '(RFC822)')
+            response, msg_data = self._fetch(email_id, '(RFC822)', use_uid)
             raw_email = msg_data[0][1]
             
-            # Parse the raw email
-            msg = email.message_from_bytes(raw_email)
+            emails.append(build_email_data(email_id.decode(), raw_email, header_names))
+            if progress:
+                progress(len(emails), len(email_ids))
+        
+        return emails
+    
+    def iter_emails(self, folder="INBOX", limit=None, criteria="ALL", batch_size=50, use_uid=False, partial=False):
+        """
+        Yield emails from specified folder one FETCH chunk at a time
+        
+        Only batch_size raw messages are held at once, so memory stays flat
+        however large the folder is. limit keeps the newest messages.
+        """
+        if not self.connection:
+            raise Exception("Not connected to server")
+        
+        email_ids = self._search(folder, criteria, use_uid)
+        
+        if limit and len(email_ids) > limit:
+            email_ids = email_ids[-limit:]
+        
+        fetch_chunk = self._fetch_partial if partial else self._fetch_batched
+        
+        for start in range(0, len(email_ids), batch_size):
+            yield from fetch_chunk(email_ids[start:start + batch_size], batch_size, use_uid)
+    
+    def fetch_new_emails(self, folder="INBOX", checkpoint=None, limit=None, batch_size=50):
+        """
+        Fetch only messages that arrived after a sync checkpoint
+        
+        checkpoint is a dict with 'uidvalidity' and 'last_uid' as returned by a
+        previous call (or None for a first sync). If the folder's UIDVALIDITY
+        changed, every message is fetched again. Messages come oldest first and
+        limit caps how many are fetched per call, so repeated calls page
+        through a backlog. Returns (emails, new_checkpoint); email ids are UIDs.
+        """
+        if not self.connection:
+            raise Exception("Not connected to server")
+        
+        uidvalidity, uidnext = self.select_with_uid_state(folder)
+        
+        if checkpoint and checkpoint.get('uidvalidity') == uidvalidity:
+            last_uid = checkpoint.get('last_uid', 0)
+        else:
+            last_uid = 0
+        
+        # UIDNEXT tells us there is nothing new without running a SEARCH
+        if uidnext is not None and uidnext <= last_uid + 1:
+            return [], {'uidvalidity': uidvalidity, 'last_uid': last_uid}
+        
+        response, messages = self.connection.uid('SEARCH', None, f'UID {last_uid + 1}:*')
+        
+        # "n:*" always matches the newest message, even when its UID is below n
+        uids = [uid for uid in messages[0].split() if int(uid) > last_uid]
+        
+        if limit and len(uids) > limit:
+            uids = uids[:limit]
+        
+        emails = self._fetch_batched(uids, batch_size, use_uid=True)
+        
+        if uids:
+            last_uid = int(uids[-1])
+        
+        return emails, {'uidvalidity': uidvalidity, 'last_uid': last_uid}
+    
+    def select_with_uid_state(self, folder):
+        """
+        Select a folder and return its (UIDVALIDITY, UIDNEXT)
+        """
+        response, data = self._select(folder)
+        if response != 'OK':
+            raise Exception(f"Could not select folder {folder}: {data}")
+        
+        # SELECT normally reports both as response codes; fall back to STATUS if not
+        uidvalidity = self.connection.response('UIDVALIDITY')[1][0]
+        uidnext = self.connection.response('UIDNEXT')[1][0]
+        
+        if uidvalidity is None or uidnext is None:
+            response, data = self.connection.status(folder, '(UIDVALIDITY UIDNEXT)')
+            if response == 'OK':
+                status = data[0].decode()
+                uidvalidity_match = re.search(r'UIDVALIDITY (\d+)', status)
+                uidnext_match = re.search(r'UIDNEXT (\d+)', status)
+                uidvalidity = uidvalidity or (uidvalidity_match and uidvalidity_match.group(1))
+                uidnext = uidnext or (uidnext_match and uidnext_match.group(1))
+        
+        if uidvalidity is None:
+            raise Exception(f"Server did not report UIDVALIDITY for {folder}")
+        
+        return int(uidvalidity), int(uidnext) if uidnext is not None else None
+    
+    def _select(self, folder):
+        response, data = self.connection.select(folder)
+        # imaplib keeps the EXISTS of a SELECT, which is the mailbox size;
+        # drop it so idle() only sees EXISTS that arrive later, as new mail
+        getattr(self.connection, 'untagged_responses', {}).pop('EXISTS', None)
+        return response, data
+    
+    def _search(self, folder, criteria, use_uid=False):
+        """
+        Select a folder and return the ids matching criteria
+        """
+        with metrics.timer('imap_search'):
+            self._select(folder)
+            if use_uid:
+                response, messages = self.connection.uid('SEARCH', None, criteria)
+            else:
+                response, messages = self.connection.search(None, criteria)
+        
+        return messages[0].split()
+    
+    def _fetch(self, message_set, message_parts, use_uid=False):
+        """
+        Issue a FETCH command by sequence number or UID
+        """
+        with metrics.timer('imap_fetch'):
+            if use_uid:
+                response, msg_data = self.connection.uid('FETCH', message_set, message_parts)
+            else:
+                response, msg_data = self.connection.fetch(message_set, message_parts)
+        
+        if metrics.enabled:
+            received = sum(len(part[1]) for part in msg_data if isinstance(part, tuple))
+            metrics.inc('imap_fetch_bytes_total', received, "Message bytes received in FETCH responses")
+            metrics.inc('imap_fetch_commands_total', 1, "FETCH commands issued")
+        
+        return response, msg_data
+    
+    def _fetch_batched(self, email_ids, batch_size, use_uid=False, progress=None):
+        """
+        Fetch messages in chunks, one FETCH command per chunk
+        """
+        emails = []
+        header_names = fingerprint_header_names()
+        
+        for start in range(0, len(email_ids), batch_size):
+            chunk = email_ids[start:start + batch_size]
+            response, msg_data = self._fetch(self._build_message_set(chunk), '(RFC822)', use_uid)
             
-            subject = self._decode_email_header(msg['Subject'])
-            from_address = self._decode_email_header(msg['From'])
-            date = msg['Date']
+            if response != 'OK':
+                raise Exception(f"Fetch failed: {response}")
             
-            # Get email body
-            body = ""
+            raw_emails = self._demultiplex_fetch(msg_data, use_uid)
             
-            if msg.is_multipart():
-                for part in msg.walk():
-                    content_type = part.get_content_type()
-                    content_disposition = str(part.get("Content-Disposition"))
-                    
-                    # Skip attachments
-                    if "attachment" in content_disposition:
-                        continue
-                    
-                    # Get text content
-                    if content_type == "text/plain" or content_type == "text/html":
-                        try:
-                            body = part.get_payload(decode=True).decode('utf-8')
-                        except:
-                            try:
-                                body = part.get_payload(decode=True).decode('latin-1')
-                            except:
-                                body = "Could not decode email body"
-                        break
-            else:
-                # If email is not multipart
-                try:
-                    body = msg.get_payload(decode=True).decode('utf-8')
-                except:
-                    try:
-                        body = msg.get_payload(decode=True).decode('latin-1')
-                    except:
-                        body = "Could not decode email body"
-            
-            email_data = {
-                'id': email_id.decode(),
-                'subject': subject,
-                'from': from_address,
-                'date': date,
-                'body': body
-            }
-            
-            emails.append(email_data)
+            # Keep the SEARCH order; messages expunged in between are skipped
+            for email_id in chunk:
+                raw_email = raw_emails.get(email_id.decode())
+                if raw_email is not None:
+                    emails.append(build_email_data(email_id.decode(), raw_email, header_names))
+            
+            if progress:
+                progress(len(emails), len(email_ids))
         
         return emails
     
-    def _decode_email_header(self, header):
+    def _fetch_partial(self, email_ids, batch_size, use_uid=False, progress=None):
+        """
+        Fetch headers and a single text part per message, guided by BODYSTRUCTURE
+        """
+        emails = []
+        id_item = 'UID' if use_uid else None
+        # Looked up once per call: it takes the vendor registry's lock
+        header_names = fingerprint_header_names()
+        header_fields = _partial_header_fields(header_names)
+        
+        for start in range(0, len(email_ids), batch_size):
+            chunk = email_ids[start:start + batch_size]
+            message_set = self._build_message_set(chunk)
+            
+            response, msg_data = self._fetch(message_set, f"(UID BODYSTRUCTURE {header_fields})", use_uid)
+            if response != 'OK':
+                raise Exception(f"Fetch failed: {response}")
+            
+            structures = {}
+            for number, attributes in parse_fetch_response(msg_data):
+                key = str(attributes.get(id_item)) if id_item else str(number)
+                structures[key] = attributes
+            
+            # Choose the body part of each message and group ids by section,
+            # so each distinct section costs one FETCH for the whole chunk
+            selections = {}
+            sections = {}
+            for email_id in chunk:
+                attributes = structures.get(email_id.decode())
+                if attributes is None:
+                    continue
+                
+                body_part, skipped = self._select_body_part(attributes.get('BODYSTRUCTURE'))
+                selections[email_id.decode()] = (attributes, body_part, skipped)
+                if body_part:
+                    sections.setdefault(body_part['section'], []).append(email_id)
+            
+            payloads = {}
+            for section, section_ids in sections.items():
+                response, msg_data = self._fetch(
+                    self._build_message_set(section_ids), f"(UID BODY.PEEK[{section}])", use_uid
+                )
+                if response != 'OK':
+                    raise Exception(f"Fetch failed: {response}")
+                
+                for number, attributes in parse_fetch_response(msg_data):
+                    key = str(attributes.get(id_item)) if id_item else str(number)
+                    payloads[key] = self._find_body_item(attributes, section)
+            
+            for email_id in chunk:
+                selection = selections.get(email_id.decode())
+                if selection is not None:
+                    attributes, body_part, skipped = selection
+                    emails.append(self._build_partial_email_data(
+                        email_id.decode(), attributes, body_part, skipped, payloads.get(email_id.decode()), header_names
+                    ))
+            
+            if progress:
+                progress(len(emails), len(email_ids))
+        
+        return emails
+    
+    def _select_body_part(self, bodystructure):
+        """
+        Pick the part fetch_emails would use as the body and list the rest as skipped
+        """
+        if not isinstance(bodystructure, list):
+            return None, []
+        
+        parts = parse_bodystructure(bodystructure)
+        body_part = None
+        for part in parts:
+            is_text = part['content_type'] in ('text/plain', 'text/html')
+            if part['size'] is not None and is_text and part['disposition'] != 'attachment':
+                body_part = part
+                break
+        
+        # A skipped message/rfc822 counts for all its nested parts; it is only
+        # broken up when the body itself lies inside it
+        skipped = []
+        for part in parts:
+            # Multipart containers carry no bytes of their own
+            if part['size'] is None or part is body_part:
+                continue
+            if any(_within(part['section'], outer['section']) for outer in skipped):
+                continue
+            if body_part is not None and _within(body_part['section'], part['section']):
+                continue
+            skipped.append({
+                'section': part['section'],
+                'content_type': part['content_type'],
+                'size': part['size']
+            })
+        
+        return body_part, skipped
+    
+    def _find_body_item(self, attributes, section):
+        """
+        Find the BODY[section] value in a FETCH response
         """
-        Decode email headers
+        key = f"BODY[{section}]"
+        if key in attributes:
+            return attributes[key]
+        
+        for name, value in attributes.items():
+            if name.startswith(key):
+                return value
+        return None
+    
+    def _build_partial_email_data(self, email_id, attributes, body_part, skipped, payload, header_names=None):
         """
-        if header is None:
-            return ""
+        Build an email dict from a header fetch plus one decoded body section
+        """
+        with metrics.timer('mime_decode'):
+            header = next((value for name, value in attributes.items() if name.startswith('BODY[HEADER')), None)
+            msg = email.message_from_bytes(header if isinstance(header, bytes) else b'')
             
-        decoded_header = decode_header(header)
-        header_parts = []
+            body = ""
+            if body_part and payload is not None:
+                if isinstance(payload, str):
+                    payload = payload.encode('utf-8')
+                body = decode_body(self._decode_transfer_encoding(payload, body_part['encoding']))
+        
+        return {
+            'id': email_id,
+            'subject': decode_email_header(msg['Subject']),
+            'from': decode_email_header(msg['From']),
+            'date': msg['Date'],
+            'headers': routing_headers(msg, header_names),
+            'body': body,
+            'skipped_parts': skipped,
+            'bytes_saved': sum(part['size'] or 0 for part in skipped)
+        }
+    
+    def _decode_transfer_encoding(self, payload, encoding):
+        """
+        Undo the Content-Transfer-Encoding of a fetched body section
+        """
+        if encoding == 'base64':
+            try:
+                return base64.b64decode(payload)
+            except ValueError:
+                return payload
+        if encoding == 'quoted-printable':
+            return quopri.decodestring(payload)
+        return payload
+    
+    def _build_message_set(self, email_ids):
+        """
+        Build a compact IMAP message set, collapsing consecutive ids into ranges
+        """
+        ranges = []
         
-        for part, encoding in decoded_header:
-            if isinstance(part, bytes):
-                try:
-                    if encoding:
-                        header_parts.append(part.decode(encoding))
-                    else:
-                        header_parts.append(part.decode('utf-8'))
-                except:
-                    header_parts.append(part.decode('latin-1'))
+        for email_id in email_ids:
+            number = int(email_id)
+            if ranges and number == ranges[-1][1] + 1:
+                ranges[-1][1] = number
             else:
-                header_parts.append(part)
-                
-        return " ".join(header_parts) 
\ No newline at end of file
+                ranges.append([number, number])
+        
+        return ','.join(f"{low}:{high}" if low != high else str(low) for low, high in ranges)
+    
+    def _demultiplex_fetch(self, msg_data, use_uid=False):
+        """
+        Split a multi-message FETCH response into raw messages keyed by id
+        """
+        raw_emails = {}
+        
+        for index, part in enumerate(msg_data):
+            if not isinstance(part, tuple):
+                continue
+            
+            header = part[0]
+            if use_uid:
+                match = UID_RE.search(header)
+                # Some servers send the UID after the message literal
+                if not match and index + 1 < len(msg_data) and isinstance(msg_data[index + 1], bytes):
+                    match = UID_RE.search(msg_data[index + 1])
+            else:
+                match = SEQUENCE_RE.match(header)
+            
+            if match:
+                raw_emails[match.group(1).decode()] = part[1]
+        
+        return raw_emails
+
+def _partial_header_fields(header_names):
+    names = ' '.join(name.upper() for name in header_names)
+    return f"BODY.PEEK[HEADER.FIELDS (SUBJECT FROM DATE {names})]"
+
+def _within(section, outer):
+    """
+    Whether BODYSTRUCTURE section lies inside section outer (e.g. 3.1 in 3)
+    """
+    return section.startswith(outer + '.')
+
+def _input_buffered(connection):
+    """
+    Whether a read on the connection would return at once, without blocking
+    
+    A non-blocking peek returns what imaplib's buffer already holds, or
+    pulls in what the socket has.
+    """
+    sock = connection.sock
+    timeout = sock.gettimeout()
+    sock.settimeout(0.0)
+    try:
+        return bool(connection.file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        sock.settimeout(timeout)
+
+def _wait_for_input(connection, deadline, stop=None):
+    """
+    Wait until a response can be read; False once deadline (a monotonic
+    time) passes or stop is set
+    """
+    while True:
+        if stop is not None and stop.is_set():
+            return False
+        if _input_buffered(connection):
+            return True
+        
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        # Short waits so a stop request is noticed promptly; readable with
+        # nothing to peek means EOF (or part of a TLS record), which the read reports
+        readable, _, _ = select.select([connection.sock], [], [], min(remaining, 1.0))
+        if readable:
+            return True
+
+def _read_response(connection):
+    """
+    Read one response through imaplib: tagged results land in
+    tagged_commands, untagged ones in untagged_responses. Returns None for
+    a continuation.
+    """
+    response = connection._get_response()
+    if 'BYE' in connection.untagged_responses:
+        bye = connection.untagged_responses.pop('BYE')
+        raise imaplib.IMAP4.abort(f"Server closed the connection: {bye[-1].decode(errors='replace')}")
+    return response
+
+def _take_new_mail(connection):
+    """
+    Whether an EXISTS notification came in, consuming the mailbox updates
+    collected so far so later commands do not mistake them for their own
+    """
+    for name in ('RECENT', 'FETCH', 'EXPUNGE'):
+        connection.untagged_responses.pop(name, None)
+    return connection.untagged_responses.pop('EXISTS', None) is not None
+
+def _check_idle_failed(connection, tag):
+    result = connection.tagged_commands.get(tag)
+    if result is not None:
+        raise Exception(f"IDLE failed: {result[0]} {result[1]}")
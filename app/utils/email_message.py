@@ -0,0 +1,101 @@
+import email
+from email.header import decode_header
+from utils.metrics import metrics
+from utils.vendor_extractors import fingerprint_header_names
+
+def build_email_data(email_id, raw_email, header_names=None):
+    """
+    Build an email dict from a raw RFC822 message
+    
+    Shared by every email source (IMAP, archives) so they all yield the same
+    dicts. header_names are the routing headers to keep (see routing_headers).
+    """
+    with metrics.timer('mime_decode'):
+        # Parse the raw email
+        msg = email.message_from_bytes(raw_email)
+        
+        subject = decode_email_header(msg['Subject'])
+        from_address = decode_email_header(msg['From'])
+        date = msg['Date']
+        
+        # Get email body
+        body = ""
+        
+        if msg.is_multipart():
+            for part in msg.walk():
+                content_type = part.get_content_type()
+                content_disposition = str(part.get("Content-Disposition"))
+                
+                # Skip attachments
+                if "attachment" in content_disposition:
+                    continue
+                
+                # Get text content
+                if content_type == "text/plain" or content_type == "text/html":
+                    body = decode_body(part.get_payload(decode=True))
+                    break
+        else:
+            # If email is not multipart
+            body = decode_body(msg.get_payload(decode=True))
+    
+    return {
+        'id': email_id,
+        'subject': subject,
+        'from': from_address,
+        'date': date,
+        'headers': routing_headers(msg, header_names),
+        'body': body
+    }
+
+def decode_body(payload):
+    """
+    Decode a body payload as UTF-8, falling back to Latin-1
+    """
+    try:
+        return payload.decode('utf-8')
+    except:
+        try:
+            return payload.decode('latin-1')
+        except:
+            return "Could not decode email body"
+
+def decode_email_header(header):
+    """
+    Decode email headers
+    """
+    if header is None:
+        return ""
+    
+    decoded_header = decode_header(header)
+    header_parts = []
+    
+    for part, encoding in decoded_header:
+        if isinstance(part, bytes):
+            try:
+                if encoding:
+                    header_parts.append(part.decode(encoding))
+                else:
+                    header_parts.append(part.decode('utf-8'))
+            except:
+                header_parts.append(part.decode('latin-1'))
+        else:
+            header_parts.append(part)
+    
+    return " ".join(header_parts)
+
+def routing_headers(msg, header_names=None):
+    """
+    The fingerprint headers present in msg, for vendor routing
+    
+    header_names defaults to fingerprint_header_names(), which locks the
+    shared registry; sources building many dicts look it up once and pass it.
+    """
+    if header_names is None:
+        header_names = fingerprint_header_names()
+    
+    headers = {}
+    for name in header_names:
+        value = msg[name]
+        if value is not None:
+            headers[name] = str(value)
+    return headers
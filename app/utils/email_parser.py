@@ -1,82 +1,358 @@
+import os
 import re
-from bs4 import BeautifulSoup
 import json
+import time
+import hashlib
+from utils.pattern_engine import PatternEngine
+from utils.html_backends import ScannedTable, get_html_backend
+from utils.metrics import metrics
+from utils.vendor_extractors import get_vendor_registry
+
+# Bump when a code change alters parse results, so cached results are not reused
+PARSER_VERSION = '2'
+
+DEFAULT_PATTERNS = {
+    'order_number': r'Order\s*(?:Number|#)[:\s]*([A-Za-z0-9\-]+)',
+    'order_date': r'Order\s*Date[:\s]*([A-Za-z0-9,\s]+)',
+    'total_amount': r'(?:Order\s*Total|Total)[:\s]*[$€£]?([0-9,.]+)',
+    'shipping_address': r'(?:Shipping|Delivery)\s*Address[:\s]*(.*?)(?=\n\n|\n[A-Z]|\Z)',
+    'tracking_number': r'(?:Tracking\s*(?:Number|#)|Track\s*Your\s*Package)[:\s]*([A-Za-z0-9]+)',
+    'vendor_name': r'(?:From|Vendor|Seller)[:\s]*([A-Za-z0-9\s,.]+)(?=\n|<)',
+    'email_from': r'From:[:\s]*([A-Za-z0-9\s,.@<>]+)'
+}
+
+# Words every match of the default patterns starts with
+DEFAULT_PATTERN_ANCHORS = {
+    'order_number': ('order',),
+    'order_date': ('order',),
+    'total_amount': ('order', 'total'),
+    'shipping_address': ('shipping', 'delivery'),
+    'tracking_number': ('track',),
+    'vendor_name': ('from', 'vendor', 'seller'),
+    'email_from': ('from',)
+}
+
+# Line items in plain text; the bounded variant caps every repeat so one
+# attempt cannot scan far past where it started
+ITEM_PATTERN = re.compile(r'(\d+)\s*x\s*([^,\n]+)[\s,]*(?:\$|EUR|£)?([0-9,.]+)')
+ITEM_QUANTITY_DIGITS = 9
+ITEM_GAP_CHARS = 20
+ITEM_NAME_CHARS = 200
+ITEM_PRICE_CHARS = 30
+BOUNDED_ITEM_PATTERN = re.compile(
+    rf'(\d{{1,{ITEM_QUANTITY_DIGITS}}})\s{{0,{ITEM_GAP_CHARS}}}x\s{{0,{ITEM_GAP_CHARS}}}([^,\n]{{1,{ITEM_NAME_CHARS}}})'
+    rf'[\s,]{{0,{ITEM_GAP_CHARS}}}(?:\$|EUR|£)?([0-9,.]{{1,{ITEM_PRICE_CHARS}}})'
+)
+# Longest possible match: the upper bound of every part, 'x' and 'EUR' included
+BOUNDED_ITEM_MATCH_MAX = (
+    ITEM_QUANTITY_DIGITS + 3 * ITEM_GAP_CHARS + len('x') + ITEM_NAME_CHARS + len('EUR') + ITEM_PRICE_CHARS
+)
+ITEM_SCAN_CHUNK = 65536
+
+class ExtractionLimits:
+    """
+    Bounds on the work spent extracting from one email
+    
+    Content beyond max_input_chars is dropped before parsing. Anchored
+    rules only match within field_window characters of an anchor hit.
+    Once time_budget seconds have gone into pattern and item extraction,
+    the remaining rules are skipped. At most max_items text items are
+    collected. Results that were cut short carry an 'extraction_limits'
+    entry saying how.
+    """
+    __slots__ = ('max_input_chars', 'field_window', 'time_budget', 'max_items')
+    
+    def __init__(self, max_input_chars=1000000, field_window=2000, time_budget=0.5, max_items=500):
+        self.max_input_chars = max_input_chars
+        self.field_window = field_window
+        self.time_budget = time_budget
+        self.max_items = max_items
+    
+    @property
+    def digest(self):
+        # The budget is left out: it decides whether a result is cut short, not what it is
+        return f"{self.max_input_chars}-{self.field_window}-{self.max_items}"
+
+def extraction_limits_from_env():
+    """
+    ExtractionLimits when EXTRACTION_BOUNDED is set to 1, true or yes, else None
+    """
+    if os.getenv('EXTRACTION_BOUNDED', 'false').strip().lower() not in ('1', 'true', 'yes'):
+        return None
+    
+    return ExtractionLimits(
+        max_input_chars=int(os.getenv('EXTRACTION_MAX_INPUT_CHARS', 1000000)),
+        field_window=int(os.getenv('EXTRACTION_FIELD_WINDOW', 2000)),
+        time_budget=float(os.getenv('EXTRACTION_TIME_BUDGET_MS', 500)) / 1000,
+        max_items=int(os.getenv('EXTRACTION_MAX_ITEMS', 500))
+    )
+
+class _ExtractionReport:
+    """
+    Deadline and cut-short bookkeeping for one bounded parse
+    """
+    __slots__ = ('limits', 'deadline', 'truncated', 'over_budget')
+    
+    def __init__(self, limits):
+        self.limits = limits
+        self.deadline = time.perf_counter() + limits.time_budget
+        self.truncated = {}
+        self.over_budget = []
+    
+    def cap(self, stage, text):
+        if len(text) <= self.limits.max_input_chars:
+            return text
+        
+        self.truncated[stage] = len(text)
+        metrics.inc('extraction_truncated_total', 1, "Inputs cut to the size cap", stage=stage)
+        return text[:self.limits.max_input_chars]
+    
+    def exceeded(self, names):
+        for name in names:
+            self.over_budget.append(name)
+            metrics.inc('extraction_over_budget_total', 1, "Rules skipped or cut short by the time budget", rule=name)
+    
+    def to_dict(self):
+        report = {}
+        if self.truncated:
+            report['truncated'] = {stage: {'chars': chars, 'kept': self.limits.max_input_chars}
+                                   for stage, chars in self.truncated.items()}
+        if self.over_budget:
+            report['over_budget'] = self.over_budget
+        return report
 
 class EmailParser:
-    def __init__(self):
-        self.patterns = {
-            'order_number': r'Order\s*(?:Number|#)[:\s]*([A-Za-z0-9\-]+)',
-            'order_date': r'Order\s*Date[:\s]*([A-Za-z0-9,\s]+)',
-            'total_amount': r'(?:Order\s*Total|Total)[:\s]*[$€£]?([0-9,.]+)',
-            'shipping_address': r'(?:Shipping|Delivery)\s*Address[:\s]*(.*?)(?=\n\n|\n[A-Z]|\Z)',
-            'tracking_number': r'(?:Tracking\s*(?:Number|#)|Track\s*Your\s*Package)[:\s]*([A-Za-z0-9]+)',
-            'vendor_name': r'(?:From|Vendor|Seller)[:\s]*([A-Za-z0-9\s,.]+)(?=\n|<)',
-            'email_from': r'From:[:\s]*([A-Za-z0-9\s,.@<>]+)'
+    def __init__(self, html_backend=None, cache=None, vendor_registry=None, limits=None):
+        self.patterns = dict(DEFAULT_PATTERNS)
+        self.html_backend = get_html_backend(html_backend)
+        self.cache = cache
+        self.vendor_registry = vendor_registry if vendor_registry is not None else get_vendor_registry()
+        self.limits = limits if limits is not None else extraction_limits_from_env()
+        
+        # Anchors are kept with the pattern they were declared for, so a
+        # pattern replaced directly in self.patterns is searched unanchored
+        self.pattern_anchors = {
+            name: (DEFAULT_PATTERNS[name], anchors) for name, anchors in DEFAULT_PATTERN_ANCHORS.items()
         }
+        self._engine = None
+        self._engine_source = None
+        self._rules_digest = None
+    
+    def register_pattern(self, name, pattern, anchors=None):
+        """
+        Add or replace an extraction rule
+        
+        anchors are the words every match starts with (e.g. ('invoice',)); the
+        rule is then only tried where they occur instead of over the whole text.
+        """
+        self.patterns[name] = pattern
+        if anchors:
+            self.pattern_anchors[name] = (pattern, tuple(anchors))
+        else:
+            self.pattern_anchors.pop(name, None)
+    
+    @property
+    def version(self):
+        """
+        Identifies the code, rule set, HTML backend and limits behind parse results
+        """
+        self._get_pattern_engine()
+        return self._version_for(self._rules_digest)
+    
+    def _version_for(self, rules_digest):
+        version = f"{PARSER_VERSION}:{self.html_backend.name}:{rules_digest}"
+        if self.limits is not None:
+            version = f"{version}:bounded:{self.limits.digest}"
+        return version
     
-    def parse(self, email_content):
+    def parse(self, email_content, sender=None, headers=None):
         """
         Parse email content and extract structured data
+        
+        sender (the From header) and headers route emails from known vendors
+        to their extractor; everything else goes through the generic rules.
+        With a cache, results are looked up by a hash of the content and the
+        parser version before parsing. With limits, the result of an email
+        that was truncated or ran over its time budget has an
+        'extraction_limits' entry describing what was cut.
         """
+        extractor = self._route(sender, headers)
+        
+        if self.cache is None:
+            return self._parse_content(email_content, extractor)
+        
+        version = self.version
+        if extractor is not None:
+            version = f"{version}:{extractor.name}:{extractor.digest}"
+        key = self.cache.make_key(email_content, version)
+        
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        
+        parsed_data = self._parse_content(email_content, extractor)
+        # A run cut short by the time budget may do better next time
+        if 'over_budget' not in parsed_data.get('extraction_limits', ()):
+            self.cache.put(key, version, parsed_data)
+        return parsed_data
+    
+    def _route(self, sender, headers):
+        if not self.vendor_registry or not self.vendor_registry.extractors or not (sender or headers):
+            return None
+        
+        extractor = self.vendor_registry.route(sender, headers)
+        metrics.inc('vendor_routes_total', 1, "Emails by extractor route",
+                    route=extractor.name if extractor is not None else 'generic')
+        return extractor
+    
+    def _parse_content(self, email_content, extractor=None):
+        report = None
+        if self.limits is not None:
+            report = _ExtractionReport(self.limits)
+            email_content = report.cap('content', email_content)
+        
         # Try to determine if the content is HTML
-        if re.search(r'<html.*?>|<body.*?>', email_content, re.IGNORECASE):
-            return self.parse_html(email_content)
+        is_html = re.search(r'<html.*?>|<body.*?>', email_content, re.IGNORECASE) is not None
+        parsed_data = None
+        
+        if extractor is not None:
+            parsed_data = self._parse_with_vendor(extractor, email_content, is_html, report)
+            if not parsed_data and extractor.fallback:
+                self.vendor_registry.record_fallback(extractor.name)
+                parsed_data = None
+        
+        if parsed_data is None:
+            if is_html:
+                metrics.inc('emails_parsed_total', 1, "Emails parsed, excluding cache hits", format='html')
+                parsed_data = self.parse_html(email_content, report)
+            else:
+                metrics.inc('emails_parsed_total', 1, "Emails parsed, excluding cache hits", format='text')
+                parsed_data = self.parse_text(email_content, report)
+        
+        if report is not None and (report.truncated or report.over_budget):
+            parsed_data['extraction_limits'] = report.to_dict()
+        return parsed_data
+    
+    def _parse_with_vendor(self, extractor, email_content, is_html, report=None):
+        """
+        Parse with a vendor's own rules instead of the generic ones
+        """
+        metrics.inc('emails_parsed_total', 1, "Emails parsed, excluding cache hits", format='vendor')
+        tables = ()
+        
+        if is_html:
+            with metrics.timer('html_parse'):
+                scan = self.html_backend.scan(email_content)
+                text_content = scan.text
+            tables = scan.tables
         else:
-            return self.parse_text(email_content)
+            text_content = email_content
+        
+        extracted_data = self._extract_patterns(text_content, report, extractor.engine)
+        
+        items = []
+        strategy = extractor.items
+        if strategy == 'auto':
+            strategy = 'table' if is_html else 'text'
+        
+        if strategy == 'table':
+            items = self._extract_items_from_tables(tables)
+        elif strategy == 'text':
+            with metrics.timer('text_item_extraction'):
+                items = self._extract_items_from_text(text_content, report)
+        
+        if items:
+            extracted_data['items'] = items
+        
+        return extracted_data
     
-    def parse_html(self, html_content):
+    def parse_html(self, html_content, report=None):
         """
         Parse HTML email content
         """
-        # Convert HTML to plain text first
-        soup = BeautifulSoup(html_content, 'html.parser')
-        text_content = soup.get_text(' ', strip=True)
+        # One pass over the document yields both the text and the tables
+        with metrics.timer('html_parse'):
+            scan = self.html_backend.scan(html_content)
+            text_content = scan.text
         
         # Extract basic information using patterns
-        extracted_data = self._extract_patterns(text_content)
+        extracted_data = self._extract_patterns(text_content, report)
         
         # Try to extract tables from HTML for items
-        tables = soup.find_all('table')
-        items = []
-        
-        for table in tables:
-            if self._is_likely_items_table(table):
-                items = self._extract_items_from_table(table)
-                if items:
-                    break
+        items = self._extract_items_from_tables(scan.tables)
         
         if items:
             extracted_data['items'] = items
         
         return extracted_data
     
-    def parse_text(self, text_content):
+    def parse_text(self, text_content, report=None):
         """
         Parse plain text email content
         """
         # Extract data using patterns
-        extracted_data = self._extract_patterns(text_content)
+        extracted_data = self._extract_patterns(text_content, report)
         
         # Try to extract items from text using pattern recognition
-        items = self._extract_items_from_text(text_content)
+        with metrics.timer('text_item_extraction'):
+            items = self._extract_items_from_text(text_content, report)
         
         if items:
             extracted_data['items'] = items
-            
+        
         return extracted_data
     
-    def _extract_patterns(self, text):
+    def _extract_patterns(self, text, report=None, engine=None):
         """
         Extract structured data using regex patterns
+        
+        With a report, anchored rules are windowed and rules past the
+        deadline are skipped and recorded.
+        """
+        engine = engine or self._get_pattern_engine()
+        
+        with metrics.timer('pattern_extraction'):
+            if report is None:
+                return engine.extract(text)
+            
+            extracted_data, over_budget = engine.extract_bounded(text, report.limits.field_window, report.deadline)
+            report.exceeded(over_budget)
+            return extracted_data
+    
+    def _get_pattern_engine(self):
+        """
+        Compile self.patterns once, rebuilding only when the rule set changes
         """
-        extracted_data = {}
+        source = (tuple(self.patterns.items()), tuple(self.pattern_anchors.items()))
         
-        for key, pattern in self.patterns.items():
-            match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-            if match:
-                extracted_data[key] = match.group(1).strip()
+        if self._engine is None or source != self._engine_source:
+            # The cache is shared with parsers that may still use the previous
+            # rule set; keys include the digest, so its results are never
+            # served for the new one and nothing needs purging here
+            engine = PatternEngine(re.IGNORECASE | re.DOTALL)
+            for name, pattern in self.patterns.items():
+                declared = self.pattern_anchors.get(name)
+                anchors = declared[1] if declared and declared[0] == pattern else None
+                engine.register(name, pattern, anchors)
+            
+            self._engine = engine
+            self._engine_source = source
+            self._rules_digest = hashlib.sha1(repr(source).encode('utf-8')).hexdigest()[:16]
         
-        return extracted_data
+        return self._engine
+    
+    def _extract_items_from_tables(self, tables):
+        """
+        Items from the first table that looks like an order and yields any
+        """
+        with metrics.timer('table_extraction'):
+            for table in tables:
+                if self._is_likely_items_table(table):
+                    items = self._extract_items_from_table(table)
+                    if items:
+                        return items
+        
+        return []
     
     def _is_likely_items_table(self, table):
         """
@@ -94,16 +370,25 @@ class EmailParser:
         """
         Extract items from an HTML table
         """
+        if isinstance(table, ScannedTable):
+            rows = table.rows
+        else:
+            rows = [[cell.get_text() for cell in row.find_all(['th', 'td'])] for row in table.find_all('tr')]
+        
+        return self._extract_items_from_rows(rows)
+    
+    def _extract_items_from_rows(self, rows):
+        """
+        Extract items from table rows given as lists of cell texts
+        """
         items = []
-        rows = table.find_all('tr')
         
         # Skip header row
         if len(rows) < 2:
             return []
         
         # Try to determine the column indices
-        header_cells = rows[0].find_all(['th', 'td'])
-        header_text = [cell.get_text().strip().lower() for cell in header_cells]
+        header_text = [cell.strip().lower() for cell in rows[0]]
         
         # Map column indices
         column_map = {}
@@ -122,30 +407,29 @@ class EmailParser:
             return []
         
         # Extract items from rows
-        for row in rows[1:]:
-            cells = row.find_all(['td', 'th'])
+        for cells in rows[1:]:
             if len(cells) < max(column_map.values()) + 1:
                 continue
-                
+            
             item = {}
             
             if 'name' in column_map:
-                item['name'] = cells[column_map['name']].get_text().strip()
-                
+                item['name'] = cells[column_map['name']].strip()
+            
             if 'quantity' in column_map:
-                qty_text = cells[column_map['quantity']].get_text().strip()
+                qty_text = cells[column_map['quantity']].strip()
                 qty_match = re.search(r'(\d+)', qty_text)
                 if qty_match:
                     item['quantity'] = int(qty_match.group(1))
             
             if 'price' in column_map:
-                price_text = cells[column_map['price']].get_text().strip()
+                price_text = cells[column_map['price']].strip()
                 price_match = re.search(r'[\$€£]?([0-9,.]+)', price_text)
                 if price_match:
                     item['unit_price'] = price_match.group(1)
             
             if 'total' in column_map:
-                total_text = cells[column_map['total']].get_text().strip()
+                total_text = cells[column_map['total']].strip()
                 total_match = re.search(r'[\$€£]?([0-9,.]+)', total_text)
                 if total_match:
                     item['total_price'] = total_match.group(1)
@@ -156,7 +440,7 @@ class EmailParser:
         
         return items
     
-    def _extract_items_from_text(self, text):
+    def _extract_items_from_text(self, text, report=None):
         """
         Extract items from plain text
         """
@@ -164,9 +448,10 @@ class EmailParser:
         
         # Look for item patterns in text
         # This is a simplified approach and may need customization based on email formats
-        item_pattern = r'(\d+)\s*x\s*([^,\n]+)[\s,]*(?:\$|EUR|£)?([0-9,.]+)'
-        
-        matches = re.finditer(item_pattern, text)
+        if report is None:
+            matches = ITEM_PATTERN.finditer(text)
+        else:
+            matches = self._bounded_item_matches(text, report)
         
         for match in matches:
             quantity = int(match.group(1))
@@ -181,4 +466,31 @@ class EmailParser:
             
             items.append(item)
         
-        return items 
\ No newline at end of file
+        return items 
+    
+    def _bounded_item_matches(self, text, report):
+        """
+        Same matches as BOUNDED_ITEM_PATTERN.finditer, searched a chunk at a
+        time so the deadline and the item cap are checked between chunks
+        """
+        position = 0
+        found = 0
+        
+        while position < len(text):
+            if time.perf_counter() > report.deadline:
+                report.exceeded(['items'])
+                return
+            
+            chunk_end = min(len(text), position + ITEM_SCAN_CHUNK)
+            # A match starting inside the chunk is never longer than BOUNDED_ITEM_MATCH_MAX
+            match = BOUNDED_ITEM_PATTERN.search(text, position, chunk_end + BOUNDED_ITEM_MATCH_MAX)
+            
+            if match is None or match.start() >= chunk_end:
+                position = chunk_end
+                continue
+            
+            yield match
+            found += 1
+            if found >= report.limits.max_items:
+                return
+            position = max(match.end(), match.start() + 1)
@@ -0,0 +1,429 @@
+import os
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+import numpy as np
+import pandas as pd
+from models.parsed_email import ParsedEmail, ParsedBatch
+from utils.amounts import CURRENCY_CODES, CURRENCY_PATTERN, AMOUNT_JUNK_PATTERN, DECIMAL_COMMA_PATTERN
+
+# Log-spaced bucket edges (100 per decade) for mergeable percentile estimates
+AMOUNT_BUCKETS = np.geomspace(0.01, 1e9, 1101)
+
+PERCENTILES = (50, 90, 99)
+
+# Amount aggregates of values that name no currency
+NO_CURRENCY = 'unknown'
+
+def normalize_amounts(values):
+    """
+    Parse amount strings column-wise into floats and currency codes
+    
+    Handles currency symbols and codes, thousands separators and decimal
+    commas ('1,234.56', '€1.234,56', '£12', '12,50 EUR'). Unparseable values
+    become NaN; the currency is None where the string names none.
+    """
+    text = pd.Series(list(values), dtype=object)
+    text = text.where(text.notna() & (text != ''), None).astype('string')
+    
+    # Most values are bare numbers, so only look for a currency where there is more
+    currencies = np.full(len(text), None, dtype=object)
+    decorated = text.str.contains(r'[^\d,.]', regex=True).fillna(False).astype(bool)
+    if decorated.any():
+        found = text[decorated].str.extract(f'({CURRENCY_PATTERN})', expand=False).replace(CURRENCY_CODES)
+        # Filled as an array: assigning None through a Series turns it into NaN
+        currencies[decorated.to_numpy()] = found.to_numpy(dtype=object, na_value=None)
+    currencies = pd.Series(currencies, index=text.index, dtype=object)
+    
+    digits = text.str.replace(AMOUNT_JUNK_PATTERN, '', regex=True)
+    
+    # Same rules as parse_amount, applied to the whole column
+    decimal_comma = digits.str.contains(DECIMAL_COMMA_PATTERN, regex=True).fillna(False).astype(bool)
+    plain = digits.str.replace(',', '', regex=False)
+    if decimal_comma.any():
+        european = digits.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+        plain = european.where(decimal_comma, plain)
+    digits = plain
+    
+    try:
+        amounts = digits.astype('float64')
+    except (ValueError, TypeError):
+        # Some value is not a number; only then pay for per-value coercion
+        amounts = pd.to_numeric(digits, errors='coerce').astype(float)
+    return amounts, currencies
+
+def statistics_frame(emails):
+    """
+    One row per processed email with the columns the statistics need
+    """
+    if isinstance(emails, ParsedBatch) or (emails and isinstance(emails[0], ParsedEmail)):
+        return _model_frame(emails)
+    
+    frame = pd.DataFrame.from_records(
+        emails, columns=['email_from', 'vendor_name', 'total_amount', 'email_date']
+    ) if emails else pd.DataFrame(columns=['email_from', 'vendor_name', 'total_amount', 'email_date'])
+    
+    amounts, currencies = normalize_amounts(frame['total_amount'])
+    
+    return pd.DataFrame({
+        'sender': _blank_to_none(frame['email_from']),
+        'vendor': _blank_to_none(frame['vendor_name']),
+        'amount': amounts.to_numpy(),
+        'currency': currencies.to_numpy(),
+        'day': _days(frame['email_date'])
+    })
+
+def _model_frame(emails):
+    # Amounts and currencies were converted when the records were built
+    frame = pd.DataFrame.from_records(
+        [(email.email_from, email.vendor_name, email.total_amount, email.currency, email.email_date) for email in emails],
+        columns=['email_from', 'vendor_name', 'amount', 'currency', 'email_date']
+    )
+    
+    return pd.DataFrame({
+        'sender': _blank_to_none(frame['email_from']),
+        'vendor': _blank_to_none(frame['vendor_name']),
+        'amount': frame['amount'].astype(float).to_numpy(),
+        'currency': frame['currency'].astype(object).to_numpy(),
+        'day': _days(frame['email_date'])
+    })
+
+def _blank_to_none(column):
+    column = column.astype(object)
+    return column.where(column.notna() & (column != ''), None)
+
+def _days(dates):
+    """
+    UTC midnight of RFC 2822 Date headers, NaT if unparseable
+    """
+    dates = dates.astype(object).where(dates.notna(), None)
+    parsed = pd.to_datetime(dates, format='%a, %d %b %Y %H:%M:%S %z', errors='coerce', utc=True)
+    
+    # Headers without a weekday or with a trailing "(UTC)" comment take the slow path
+    missing = parsed.isna() & dates.notna()
+    if missing.any():
+        parsed[missing] = pd.to_datetime(
+            dates[missing].map(_parse_date_header), errors='coerce', utc=True
+        )
+    
+    # Formatting waits until grouping has reduced the rows to distinct days
+    return parsed.dt.tz_convert(None).dt.floor('D').to_numpy()
+
+def _parse_date_header(value):
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+class RunningStatistics:
+    """
+    Aggregates over processed emails that merge without rescanning history
+    
+    Everything kept is a count or a sum, so aggregates of separate batches
+    add up to the aggregates of the combined data. Amount aggregates are
+    kept per currency (NO_CURRENCY for amounts that name none) and never
+    added across currencies. Percentiles come from a log-bucketed histogram
+    of order totals (within about 2.3%).
+    """
+    def __init__(self):
+        self.total_emails = 0
+        self.senders = {}
+        self.vendors = {}
+        self.currencies = {}
+        self.daily_emails = {}
+        # Keyed by currency, then by sender, vendor or day
+        self.sender_totals = {}
+        self.vendor_totals = {}
+        self.daily_totals = {}
+        self.amount_totals = {}
+        self.histograms = {}
+    
+    @classmethod
+    def from_emails(cls, emails):
+        statistics = cls()
+        statistics.update(emails)
+        return statistics
+    
+    def update(self, emails):
+        """
+        Add a batch of processed emails
+        """
+        self.update_frame(statistics_frame(emails))
+        return self
+    
+    def update_frame(self, frame):
+        self.total_emails += len(frame)
+        
+        _add_counts(self.senders, frame.groupby('sender', sort=False).size())
+        _add_counts(self.vendors, frame.groupby('vendor', sort=False).size())
+        _add_counts(self.currencies, frame.groupby('currency', sort=False).size())
+        _add_counts(self.daily_emails, _by_day(frame.groupby('day', sort=False).size()))
+        
+        priced = frame[frame['amount'].notna()]
+        for currency, group in priced.groupby(_currency_keys(priced), sort=False):
+            _add_totals(self.sender_totals.setdefault(currency, {}),
+                        group.groupby('sender', sort=False)['amount'].agg(['size', 'sum']))
+            _add_totals(self.vendor_totals.setdefault(currency, {}),
+                        group.groupby('vendor', sort=False)['amount'].agg(['size', 'sum']))
+            _add_totals(self.daily_totals.setdefault(currency, {}),
+                        _by_day(group.groupby('day', sort=False)['amount'].agg(['size', 'sum'])))
+            
+            values = group['amount'].to_numpy()
+            _add_totals(self.amount_totals, [(currency, len(values), float(values.sum()))])
+            histogram = self.histograms.setdefault(currency, _empty_histogram())
+            histogram += np.bincount(
+                np.searchsorted(AMOUNT_BUCKETS, values, side='right'), minlength=len(histogram)
+            )
+    
+    def merge(self, other):
+        """
+        Fold another RunningStatistics into this one
+        """
+        self.total_emails += other.total_emails
+        for mine, theirs in ((self.senders, other.senders), (self.vendors, other.vendors),
+                             (self.currencies, other.currencies), (self.daily_emails, other.daily_emails)):
+            _add_counts(mine, theirs)
+        
+        for mine, theirs in ((self.sender_totals, other.sender_totals), (self.vendor_totals, other.vendor_totals),
+                             (self.daily_totals, other.daily_totals)):
+            for currency, totals in theirs.items():
+                _add_totals(mine.setdefault(currency, {}), [(key, count, total) for key, (count, total) in totals.items()])
+        
+        _add_totals(self.amount_totals, [(key, count, total) for key, (count, total) in other.amount_totals.items()])
+        for currency, histogram in other.histograms.items():
+            self.histograms.setdefault(currency, _empty_histogram())
+            self.histograms[currency] += histogram
+        return self
+    
+    def main_currency(self):
+        """
+        Currency with the most priced orders, None if nothing had an amount
+        """
+        if not self.amount_totals:
+            return None
+        return max(sorted(self.amount_totals), key=lambda currency: self.amount_totals[currency][0])
+    
+    def summary(self, exact_amounts=None):
+        """
+        Statistics in the get_email_statistics format
+        
+        The top-level amount figures (average, percentiles, per-sender,
+        per-vendor and daily totals) cover the main currency only, named in
+        'currency'; by_currency has the same figures for every currency.
+        exact_amounts, a {currency: amounts} dict, gives exact percentiles
+        instead of the histogram estimate.
+        """
+        if not self.total_emails:
+            return {}
+        
+        by_currency = {
+            currency: self._currency_summary(currency, (exact_amounts or {}).get(currency))
+            for currency in sorted(self.amount_totals)
+        }
+        currency = self.main_currency()
+        main = by_currency.get(currency) or self._currency_summary(None)
+        
+        return {
+            'total_emails': self.total_emails,
+            'sender_distribution': dict(self.senders),
+            'top_vendors': dict(self.vendors),
+            'currency': currency,
+            'average_order_total': main['average_order_total'],
+            'order_total_percentiles': main['order_total_percentiles'],
+            'totals_by_sender': main['totals_by_sender'],
+            'totals_by_vendor': main['totals_by_vendor'],
+            'currencies': dict(self.currencies),
+            'daily': {
+                day: {'emails': count, 'total': main['daily'].get(day, {}).get('total', 0.0)}
+                for day, count in sorted(self.daily_emails.items())
+            },
+            'by_currency': by_currency
+        }
+    
+    def _currency_summary(self, currency, exact_amounts=None):
+        count, total = self.amount_totals.get(currency, (0, 0.0))
+        
+        if exact_amounts is not None and len(exact_amounts):
+            percentiles = dict(zip(
+                (f'p{p}' for p in PERCENTILES), (float(v) for v in np.percentile(exact_amounts, PERCENTILES))
+            ))
+        else:
+            percentiles = {f'p{p}': self._estimate_percentile(currency, p) for p in PERCENTILES}
+        
+        return {
+            'orders': count,
+            'average_order_total': total / count if count else 0,
+            'order_total_percentiles': percentiles,
+            'totals_by_sender': _totals_summary(self.sender_totals.get(currency, {})),
+            'totals_by_vendor': _totals_summary(self.vendor_totals.get(currency, {})),
+            'daily': {
+                day: {'orders': orders, 'total': day_total}
+                for day, (orders, day_total) in sorted(self.daily_totals.get(currency, {}).items())
+            }
+        }
+    
+    def _estimate_percentile(self, currency, percent):
+        count = self.amount_totals.get(currency, (0, 0.0))[0]
+        if not count:
+            return 0.0
+        
+        rank = max(1, int(np.ceil(percent / 100 * count)))
+        index = int(np.searchsorted(np.cumsum(self.histograms[currency]), rank))
+        
+        if index == 0:
+            return 0.0
+        if index >= len(AMOUNT_BUCKETS):
+            return float(AMOUNT_BUCKETS[-1])
+        return float(np.sqrt(AMOUNT_BUCKETS[index - 1] * AMOUNT_BUCKETS[index]))
+    
+    def to_dict(self):
+        return {
+            'total_emails': self.total_emails,
+            'senders': self.senders,
+            'vendors': self.vendors,
+            'currencies': self.currencies,
+            'daily_emails': self.daily_emails,
+            'sender_totals': self.sender_totals,
+            'vendor_totals': self.vendor_totals,
+            'daily_totals': self.daily_totals,
+            'amount_totals': self.amount_totals,
+            # Sparse, since nearly all buckets are empty
+            'histograms': {
+                currency: {str(index): int(count) for index, count in enumerate(histogram) if count}
+                for currency, histogram in self.histograms.items()
+            }
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        statistics = cls()
+        statistics.total_emails = data['total_emails']
+        statistics.senders = dict(data['senders'])
+        statistics.vendors = dict(data['vendors'])
+        statistics.currencies = dict(data['currencies'])
+        statistics.daily_emails = dict(data['daily_emails'])
+        for name in ('sender_totals', 'vendor_totals', 'daily_totals'):
+            setattr(statistics, name, {
+                currency: {key: tuple(value) for key, value in totals.items()}
+                for currency, totals in data[name].items()
+            })
+        statistics.amount_totals = {key: tuple(value) for key, value in data['amount_totals'].items()}
+        for currency, buckets in data['histograms'].items():
+            histogram = statistics.histograms[currency] = _empty_histogram()
+            for index, count in buckets.items():
+                histogram[int(index)] = count
+        return statistics
+
+def _currency_keys(frame):
+    currencies = frame['currency'].astype(object)
+    return currencies.where(currencies.notna(), NO_CURRENCY)
+
+def _by_day(grouped):
+    grouped.index = pd.DatetimeIndex(grouped.index).strftime('%Y-%m-%d')
+    return grouped
+
+def _empty_histogram():
+    return np.zeros(len(AMOUNT_BUCKETS) + 1, dtype=np.int64)
+
+def _add_counts(target, counts):
+    for key, count in counts.items():
+        target[key] = target.get(key, 0) + int(count)
+
+def _add_totals(target, rows):
+    if isinstance(rows, pd.DataFrame):
+        rows = zip(rows.index, rows.iloc[:, 0], rows.iloc[:, 1])
+    for key, count, total in rows:
+        current = target.get(key, (0, 0.0))
+        target[key] = (current[0] + int(count), current[1] + float(total))
+
+def _totals_summary(totals):
+    return {
+        key: {'orders': count, 'total': total, 'average': total / count if count else 0.0}
+        for key, (count, total) in totals.items()
+    }
+
+def compute_statistics(emails):
+    """
+    Statistics for one list of processed emails, with exact percentiles
+    """
+    frame = statistics_frame(emails)
+    statistics = RunningStatistics()
+    statistics.update_frame(frame)
+    
+    priced = frame[frame['amount'].notna()]
+    exact_amounts = {
+        currency: amounts.to_numpy() for currency, amounts in priced['amount'].groupby(_currency_keys(priced))
+    }
+    return statistics.summary(exact_amounts=exact_amounts)
+
+class StatisticsStore:
+    """
+    Running aggregates persisted in SQLite under a name (e.g. per account)
+    """
+    def __init__(self, path):
+        self.path = path
+        
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        
+        with self._connect() as db:
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS statistics (
+                    name TEXT PRIMARY KEY,
+                    aggregates TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+                """
+            )
+    
+    def get(self, name='default'):
+        """
+        Stored RunningStatistics, empty if nothing was stored yet
+        """
+        with self._connect() as db:
+            row = db.execute("SELECT aggregates FROM statistics WHERE name = ?", (name,)).fetchone()
+        
+        if row is None:
+            return RunningStatistics()
+        return RunningStatistics.from_dict(json.loads(row[0]))
+    
+    def update(self, emails, name='default'):
+        """
+        Merge a batch of processed emails into the stored aggregates
+        """
+        batch = RunningStatistics.from_emails(emails)
+        
+        with self._connect() as db:
+            # Take the write lock before reading so concurrent updates serialise
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT aggregates FROM statistics WHERE name = ?", (name,)).fetchone()
+            statistics = RunningStatistics.from_dict(json.loads(row[0])) if row else RunningStatistics()
+            statistics.merge(batch)
+            db.execute(
+                "INSERT OR REPLACE INTO statistics VALUES (?, ?, ?)",
+                (name, json.dumps(statistics.to_dict()), datetime.now().isoformat())
+            )
+        
+        return statistics
+    
+    def reset(self, name='default'):
+        with self._connect() as db:
+            db.execute("DELETE FROM statistics WHERE name = ?", (name,))
+    
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield db
+            if db.in_transaction:
+                db.execute("COMMIT")
+        except Exception:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
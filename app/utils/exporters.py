@@ -0,0 +1,272 @@
+import csv
+import json
+import tempfile
+
+def flatten_record(record):
+    """
+    Flatten a parsed email for tabular export
+    
+    Nested dicts become key_subkey columns and the items list becomes
+    item{i}_field columns.
+    """
+    if not isinstance(record, dict):
+        return {'value': record}
+    
+    flat_item = {}
+    
+    for key, value in record.items():
+        if isinstance(value, dict):
+            for subkey, subvalue in value.items():
+                flat_item[f"{key}_{subkey}"] = subvalue
+        elif isinstance(value, list) and key == 'items':
+            # Special handling for item lists
+            for i, subitem in enumerate(value):
+                for subkey, subvalue in subitem.items():
+                    flat_item[f"item{i+1}_{subkey}"] = subvalue
+        else:
+            flat_item[key] = value
+    
+    return flat_item
+
+def discover_columns(records):
+    """
+    Ordered union of flattened column names, in order of first appearance
+    """
+    columns = {}
+    
+    for record in records:
+        for key in flatten_record(record):
+            columns.setdefault(key, None)
+    
+    return list(columns)
+
+class JsonLinesExporter:
+    """
+    Write one JSON object per line as rows arrive
+    """
+    extension = 'jsonl'
+    
+    def __init__(self, path, columns=None):
+        self.path = path
+        self.rows_written = 0
+        self._file = open(path, 'w')
+    
+    def write(self, record):
+        self._file.write(json.dumps(record, default=str) + '\n')
+        self.rows_written += 1
+    
+    def close(self):
+        """
+        Finish the file and return its path
+        """
+        if not self._file.closed:
+            self._file.close()
+        return self.path
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class TabularExporter:
+    """
+    Base for exporters that write flattened rows under a fixed header
+    
+    When columns are passed in, rows are written straight through. Otherwise
+    rows are spooled to a temporary JSON Lines file while the column set
+    grows, and written out in one streaming pass on close.
+    """
+    extension = None
+    
+    def __init__(self, path, columns=None):
+        self.path = path
+        self.rows_written = 0
+        self.columns = list(columns) if columns else None
+        self._spool = None
+        self._seen_columns = {}
+        self._closed = False
+        
+        if self.columns is None:
+            self._spool = tempfile.TemporaryFile('w+', encoding='utf-8')
+        else:
+            self._open()
+    
+    def write(self, record):
+        row = flatten_record(record)
+        
+        if self._spool is not None:
+            for key, value in row.items():
+                self._track_column(key, value)
+            self._spool.write(json.dumps(row, default=str) + '\n')
+        else:
+            self._write_row(row)
+        
+        self.rows_written += 1
+    
+    def close(self):
+        """
+        Finish the file and return its path
+        """
+        if self._closed:
+            return self.path
+        self._closed = True
+        
+        if self._spool is not None:
+            self.columns = list(self._seen_columns)
+            self._open()
+            
+            self._spool.seek(0)
+            for line in self._spool:
+                self._write_row(json.loads(line))
+            self._spool.close()
+        
+        self._finish()
+        return self.path
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def _track_column(self, key, value):
+        self._seen_columns.setdefault(key, None)
+    
+    def _cell(self, value):
+        """
+        Render values the target format has no type for as JSON text
+        """
+        if isinstance(value, (list, dict)):
+            return json.dumps(value, default=str)
+        return value
+    
+    def _open(self):
+        raise NotImplementedError
+    
+    def _write_row(self, row):
+        raise NotImplementedError
+    
+    def _finish(self):
+        raise NotImplementedError
+
+class CsvExporter(TabularExporter):
+    extension = 'csv'
+    
+    def _open(self):
+        self._file = open(self.path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.columns)
+    
+    def _write_row(self, row):
+        self._writer.writerow([self._cell(row.get(column)) for column in self.columns])
+    
+    def _finish(self):
+        self._file.close()
+
+class ExcelExporter(TabularExporter):
+    """
+    XLSX export through openpyxl's constant-memory write-only mode
+    """
+    extension = 'xlsx'
+    
+    def _open(self):
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise Exception("Excel export requires the openpyxl package")
+        
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet()
+        self._sheet.append(self.columns)
+    
+    def _write_row(self, row):
+        self._sheet.append([self._cell(row.get(column)) for column in self.columns])
+    
+    def _finish(self):
+        self._workbook.save(self.path)
+
+class ParquetExporter(TabularExporter):
+    """
+    Parquet export through pyarrow, one row group per row_group_size rows
+    
+    Rows are always spooled first so that each column's type is known
+    before the schema is fixed.
+    """
+    extension = 'parquet'
+    row_group_size = 10000
+    
+    def __init__(self, path, columns=None):
+        self._column_types = {}
+        super().__init__(path)
+        if columns:
+            for column in columns:
+                self._seen_columns.setdefault(column, None)
+    
+    def _track_column(self, key, value):
+        self._seen_columns.setdefault(key, None)
+        if value is not None:
+            self._column_types.setdefault(key, set()).add(type(value))
+    
+    def _open(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise Exception("Parquet export requires the pyarrow package")
+        
+        self._pa = pa
+        self._schema = pa.schema([(column, self._arrow_type(column)) for column in self.columns])
+        self._writer = pq.ParquetWriter(self.path, self._schema)
+        self._buffer = []
+    
+    def _arrow_type(self, column):
+        pa = self._pa
+        types = self._column_types.get(column, set())
+        
+        if types == {bool}:
+            return pa.bool_()
+        if types and types <= {int}:
+            return pa.int64()
+        if types and types <= {int, float}:
+            return pa.float64()
+        return pa.string()
+    
+    def _write_row(self, row):
+        self._buffer.append(row)
+        if len(self._buffer) >= self.row_group_size:
+            self._flush()
+    
+    def _flush(self):
+        if not self._buffer:
+            return
+        
+        columns = {}
+        for field in self._schema:
+            values = [row.get(field.name) for row in self._buffer]
+            if field.type == self._pa.string():
+                values = [None if value is None else str(self._cell(value)) for value in values]
+            columns[field.name] = values
+        
+        self._writer.write_table(self._pa.table(columns, schema=self._schema))
+        self._buffer = []
+    
+    def _finish(self):
+        self._flush()
+        self._writer.close()
+
+EXPORTERS = {
+    'jsonl': JsonLinesExporter,
+    'csv': CsvExporter,
+    'excel': ExcelExporter,
+    'xlsx': ExcelExporter,
+    'parquet': ParquetExporter
+}
+
+def get_exporter_class(format_type):
+    """
+    Look up the streaming exporter for a format
+    """
+    if format_type not in EXPORTERS:
+        raise ValueError(f"Unsupported format: {format_type}")
+    return EXPORTERS[format_type]
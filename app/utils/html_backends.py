@@ -0,0 +1,246 @@
+import os
+from importlib.util import find_spec
+
+# Elements whose text BeautifulSoup's get_text() leaves out
+SKIPPED_TEXT_TAGS = {'script', 'style', 'template'}
+
+class ScannedTable:
+    """
+    A <table> found while scanning, with lazy access to its text and cells
+    
+    Text is stored once for the whole document; tables, rows and cells only
+    keep offsets into it, so nested tables never re-extract their text.
+    """
+    def __init__(self, scan, start):
+        self._scan = scan
+        self.start = start
+        self.end = None
+        self.row_indexes = []
+    
+    def get_text(self):
+        """
+        Concatenated text of the table, like Tag.get_text()
+        """
+        return ''.join(self._scan.strings[self.start:self.end])
+    
+    @property
+    def rows(self):
+        """
+        Rows (including those of nested tables) as lists of raw cell texts
+        """
+        strings = self._scan.strings
+        cells = self._scan.cells
+        return [
+            [''.join(strings[cells[cell][0]:cells[cell][1]]) for cell in self._scan.rows[row]]
+            for row in self.row_indexes
+        ]
+
+class HtmlScan:
+    """
+    Result of a single pass over an HTML document
+    """
+    def __init__(self):
+        self.strings = []
+        self.tables = []
+        self.rows = []
+        self.cells = []
+        self._open_tables = []
+        self._open_rows = []
+        self._open_cells = []
+    
+    @property
+    def text(self):
+        """
+        Flattened document text, like get_text(' ', strip=True)
+        """
+        return ' '.join(stripped for stripped in (string.strip() for string in self.strings) if stripped)
+    
+    def start_tag(self, name):
+        if name == 'table':
+            table = ScannedTable(self, len(self.strings))
+            self.tables.append(table)
+            self._open_tables.append(table)
+        elif name == 'tr':
+            # find_all('tr') is recursive, so a row belongs to every open table
+            self.rows.append([])
+            for table in self._open_tables:
+                table.row_indexes.append(len(self.rows) - 1)
+            self._open_rows.append(len(self.rows) - 1)
+        elif name in ('td', 'th'):
+            self.cells.append([len(self.strings), None])
+            for row in self._open_rows:
+                self.rows[row].append(len(self.cells) - 1)
+            self._open_cells.append(len(self.cells) - 1)
+    
+    def end_tag(self, name):
+        if name == 'table':
+            self._open_tables.pop().end = len(self.strings)
+        elif name == 'tr':
+            self._open_rows.pop()
+        elif name in ('td', 'th'):
+            self.cells[self._open_cells.pop()][1] = len(self.strings)
+    
+    def add_text(self, string):
+        if string:
+            self.strings.append(string)
+
+class Bs4Backend:
+    name = 'bs4'
+    
+    def scan(self, html_content):
+        """
+        Walk a BeautifulSoup tree once, collecting text and tables
+        """
+        from bs4 import BeautifulSoup
+        from bs4.element import NavigableString, CData, Tag
+        
+        scan = HtmlScan()
+        soup = BeautifulSoup(html_content, 'html.parser')
+        stack = [(soup, iter(soup.contents))]
+        
+        while stack:
+            tag, children = stack[-1]
+            child = next(children, None)
+            
+            if child is None:
+                stack.pop()
+                if tag is not soup:
+                    scan.end_tag(tag.name)
+            elif isinstance(child, Tag):
+                scan.start_tag(child.name)
+                stack.append((child, iter(child.contents)))
+            elif type(child) in (NavigableString, CData):
+                scan.add_text(str(child))
+        
+        return scan
+
+class LxmlBackend:
+    name = 'lxml'
+    
+    def __init__(self):
+        # Fail at construction time when lxml is missing, without importing it yet
+        if find_spec('lxml') is None:
+            raise ImportError("lxml is not installed")
+    
+    def scan(self, html_content):
+        """
+        Walk an lxml tree once, comments and processing instructions included
+        """
+        from lxml import etree
+        
+        scan = HtmlScan()
+        # lxml rejects str input that carries an XML encoding declaration
+        # (common in XHTML mail), so parse the UTF-8 bytes with the encoding
+        # pinned rather than taken from the document
+        parser = etree.HTMLParser(encoding='utf-8')
+        root = etree.fromstring(html_content.encode('utf-8', 'replace'), parser) if html_content.strip() else None
+        
+        if root is None:
+            return scan
+        
+        # iterwalk skips comments and processing instructions, and with them
+        # their tails (text after <!--[if mso]> blocks), so walk children directly
+        stack = [(root, iter(root))]
+        scan.start_tag(root.tag.lower())
+        scan.add_text(root.text)
+        skipped_depth = 1 if root.tag.lower() in SKIPPED_TEXT_TAGS else 0
+        
+        while stack:
+            element, children = stack[-1]
+            child = next(children, None)
+            
+            if child is None:
+                stack.pop()
+                name = element.tag.lower()
+                scan.end_tag(name)
+                if name in SKIPPED_TEXT_TAGS:
+                    skipped_depth -= 1
+                if not skipped_depth and stack:
+                    scan.add_text(element.tail)
+                continue
+            
+            # Comments and processing instructions contribute only their tail
+            if not isinstance(child.tag, str):
+                if not skipped_depth:
+                    scan.add_text(child.tail)
+                continue
+            
+            name = child.tag.lower()
+            if name in SKIPPED_TEXT_TAGS:
+                skipped_depth += 1
+            scan.start_tag(name)
+            if not skipped_depth:
+                scan.add_text(child.text)
+            stack.append((child, iter(child)))
+        
+        return scan
+
+class SelectolaxBackend:
+    name = 'selectolax'
+    
+    def __init__(self):
+        # Fail at construction time when selectolax is missing, without importing it yet
+        if find_spec('selectolax') is None:
+            raise ImportError("selectolax is not installed")
+    
+    def scan(self, html_content):
+        """
+        Walk a selectolax (lexbor) tree once using child/next links
+        """
+        from selectolax.lexbor import LexborHTMLParser
+        
+        scan = HtmlScan()
+        root = LexborHTMLParser(html_content).root
+        
+        if root is None:
+            return scan
+        
+        stack = [(root, root.child)]
+        scan.start_tag(root.tag)
+        
+        while stack:
+            node, child = stack[-1]
+            
+            if child is None:
+                stack.pop()
+                scan.end_tag(node.tag)
+                continue
+            
+            stack[-1] = (node, child.next)
+            
+            if child.tag == '-text':
+                if node.tag not in SKIPPED_TEXT_TAGS:
+                    scan.add_text(child.text_content)
+            elif child.tag and not child.tag.startswith('-'):
+                scan.start_tag(child.tag)
+                stack.append((child, child.child))
+        
+        return scan
+
+HTML_BACKENDS = {
+    'selectolax': SelectolaxBackend,
+    'lxml': LxmlBackend,
+    'bs4': Bs4Backend
+}
+
+def get_html_backend(name=None):
+    """
+    Get an HTML backend by name
+    
+    'auto' (the default, or EMAIL_PARSER_HTML_BACKEND) picks the fastest one
+    whose library is installed, falling back to BeautifulSoup.
+    """
+    name = name or os.getenv('EMAIL_PARSER_HTML_BACKEND', 'auto')
+    
+    if name != 'auto':
+        if name not in HTML_BACKENDS:
+            raise ValueError(f"Unsupported HTML backend: {name}")
+        return HTML_BACKENDS[name]()
+    
+    for backend in HTML_BACKENDS.values():
+        try:
+            return backend()
+        except ImportError:
+            continue
+    
+    return Bs4Backend()
@@ -0,0 +1,168 @@
+import re
+
+# One token of an IMAP response: parens, quoted string, trailing literal
+# marker, or an atom (which may carry a [section] and <origin> suffix)
+TOKEN_RE = re.compile(
+    rb'\s*(?:(?P<open>\()|(?P<close>\))|"(?P<quoted>(?:[^"\\]|\\.)*)"|'
+    rb'\{(?P<literal>\d+)\}\s*$|(?P<atom>[^\s()"\[]+(?:\[[^\]]*\])?(?:<\d+>)?))'
+)
+QUOTED_ESCAPE_RE = re.compile(rb'\\(.)')
+
+def parse_fetch_response(msg_data):
+    """
+    Parse the data list returned by imaplib's fetch()/uid('FETCH')
+    
+    Returns a list of (message number, attributes) pairs where attributes maps
+    upper-cased item names (e.g. 'UID', 'BODYSTRUCTURE', 'BODY[TEXT]') to
+    their values as nested lists of str, bytes (literals) and None (NIL).
+    """
+    values = _build_values(_tokenize(msg_data))
+    responses = []
+    
+    for index in range(0, len(values) - 1, 2):
+        number, items = values[index], values[index + 1]
+        if not isinstance(items, list) or not str(number).isdigit():
+            continue
+        
+        attributes = {}
+        for pos in range(0, len(items) - 1, 2):
+            attributes[str(items[pos]).upper()] = items[pos + 1]
+        
+        responses.append((int(number), attributes))
+    
+    return responses
+
+def parse_bodystructure(structure, section=''):
+    """
+    Flatten a parsed BODYSTRUCTURE into its parts in message.walk() order
+    
+    Each part is a dict with section, content_type, encoding, charset, size
+    and disposition. Multipart containers are included with size None so the
+    order matches walking the full message.
+    """
+    parts = []
+    
+    if structure and isinstance(structure[0], list):
+        children = []
+        index = 0
+        while index < len(structure) and isinstance(structure[index], list):
+            children.append(structure[index])
+            index += 1
+        
+        subtype = _lower(structure[index]) if index < len(structure) else 'mixed'
+        parts.append({
+            'section': section,
+            'content_type': f"multipart/{subtype}",
+            'encoding': None,
+            'charset': None,
+            'size': None,
+            'disposition': None
+        })
+        
+        for number, child in enumerate(children, start=1):
+            child_section = f"{section}.{number}" if section else str(number)
+            parts.extend(parse_bodystructure(child, child_section))
+        
+        return parts
+    
+    main_type = _lower(structure[0])
+    sub_type = _lower(structure[1])
+    params = _params(structure[2])
+    
+    # Extension data starts after the type-specific fields
+    if main_type == 'text':
+        extension_start = 8
+    elif main_type == 'message' and sub_type == 'rfc822':
+        extension_start = 10
+    else:
+        extension_start = 7
+    
+    disposition = None
+    if len(structure) > extension_start + 1 and isinstance(structure[extension_start + 1], list):
+        disposition = _lower(structure[extension_start + 1][0])
+    
+    parts.append({
+        'section': section or 'TEXT',
+        'content_type': f"{main_type}/{sub_type}",
+        'encoding': _lower(structure[5]) or '7bit',
+        'charset': params.get('charset'),
+        'size': _int(structure[6]),
+        'disposition': disposition
+    })
+    
+    # An attached message/rfc822 is walked into, like message.walk() does
+    if main_type == 'message' and sub_type == 'rfc822' and len(structure) > 8:
+        inner = structure[8]
+        if isinstance(inner, list) and inner:
+            prefix = section or '1'
+            if isinstance(inner[0], list):
+                parts.extend(parse_bodystructure(inner, prefix))
+            else:
+                parts.extend(parse_bodystructure(inner, f"{prefix}.1"))
+    
+    return parts
+
+def _tokenize(msg_data):
+    for part in msg_data:
+        if isinstance(part, tuple):
+            text, literal = part[0], part[1]
+        else:
+            text, literal = part, None
+        
+        if not isinstance(text, bytes):
+            continue
+        
+        pos = 0
+        while True:
+            match = TOKEN_RE.match(text, pos)
+            if not match or match.end() == pos:
+                break
+            pos = match.end()
+            
+            if match.group('open'):
+                yield ('open', None)
+            elif match.group('close'):
+                yield ('close', None)
+            elif match.group('quoted') is not None:
+                yield ('value', QUOTED_ESCAPE_RE.sub(rb'\1', match.group('quoted')).decode('utf-8', 'replace'))
+            elif match.group('literal') is not None:
+                yield ('value', literal)
+            else:
+                atom = match.group('atom').decode('utf-8', 'replace')
+                yield ('value', None if atom.upper() == 'NIL' else atom)
+
+def _build_values(tokens):
+    stack = [[]]
+    
+    for kind, value in tokens:
+        if kind == 'open':
+            stack.append([])
+        elif kind == 'close':
+            if len(stack) > 1:
+                finished = stack.pop()
+                stack[-1].append(finished)
+        else:
+            stack[-1].append(value)
+    
+    # Tolerate a truncated response by closing any open lists
+    while len(stack) > 1:
+        finished = stack.pop()
+        stack[-1].append(finished)
+    
+    return stack[0]
+
+def _params(value):
+    if not isinstance(value, list):
+        return {}
+    return {_lower(value[i]): value[i + 1] for i in range(0, len(value) - 1, 2)}
+
+def _lower(value):
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', 'replace')
+    return value.lower() if isinstance(value, str) else value
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,201 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict, deque
+
+class JobQueueFull(Exception):
+    pass
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    """
+    One background run and its progress, result and timings
+    """
+    def __init__(self, kind, function):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.function = function
+        self.status = 'queued'
+        self.processed = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_requested = threading.Event()
+    
+    def report(self, processed, total=None):
+        """
+        Progress callback for the running function
+        
+        Raises JobCancelled once cancellation was requested, so long runs
+        stop at their next progress report.
+        """
+        self.processed = processed
+        if total is not None:
+            self.total = total
+        if self._cancel_requested.is_set():
+            raise JobCancelled(f"Job {self.id} cancelled")
+    
+    @property
+    def finished(self):
+        return self.status in ('succeeded', 'failed', 'cancelled')
+    
+    def to_dict(self):
+        now = time.time()
+        started = self.started_at
+        return {
+            'job_id': self.id,
+            'type': self.kind,
+            'status': self.status,
+            'progress': {'processed': self.processed, 'total': self.total},
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'started_at': started,
+            'finished_at': self.finished_at,
+            'queued_seconds': (started or self.finished_at or now) - self.submitted_at,
+            'run_seconds': ((self.finished_at or now) - started) if started else None
+        }
+
+class JobManager:
+    """
+    Runs submitted functions on a fixed set of local worker threads
+    
+    At most max_queued jobs wait for a worker; submit raises JobQueueFull
+    beyond that; a cancelled job gives its place back at once. A job's
+    function receives the Job and should call job.report() as it makes
+    progress, which is also where cancellation of a running job takes
+    effect. Finished jobs are kept for lookup up to retention, oldest
+    dropped first.
+    """
+    def __init__(self, workers=2, max_queued=20, retention=200):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.retention = retention
+        self._queue = deque()
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._queued = threading.Condition(self._lock)
+        self._threads = []
+    
+    def submit(self, kind, function):
+        """
+        Queue function(job) and return the Job
+        """
+        job = Job(kind, function)
+        self._start_workers()
+        
+        with self._lock:
+            if len(self._queue) >= self.max_queued:
+                raise JobQueueFull(f"Job queue is full ({self.max_queued} jobs waiting)")
+            self._queue.append(job)
+            self._jobs[job.id] = job
+            self._prune()
+            self._queued.notify()
+        
+        return job
+    
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+    
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+    
+    def cancel(self, job_id):
+        """
+        Cancel a queued job at once, or ask a running job to stop
+        
+        Returns the job, or None if it is unknown.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            
+            job._cancel_requested.set()
+            if job.status == 'queued':
+                self._queue.remove(job)
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+        
+        return job
+    
+    def stats(self):
+        """
+        Job counts by status, queue depth and mean run time of finished jobs
+        """
+        with self._lock:
+            counts = {}
+            run_times = []
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+                if job.finished and job.started_at:
+                    run_times.append(job.finished_at - job.started_at)
+            
+            return {
+                'workers': self.workers,
+                'queued': len(self._queue),
+                'max_queued': self.max_queued,
+                'jobs': counts,
+                'mean_run_seconds': sum(run_times) / len(run_times) if run_times else 0.0
+            }
+    
+    def _start_workers(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"job-worker-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+    
+    def _work(self):
+        while True:
+            with self._queued:
+                while not self._queue:
+                    self._queued.wait()
+                job = self._queue.popleft()
+                job.status = 'running'
+                job.started_at = time.time()
+            
+            try:
+                result = job.function(job)
+                status, error = 'succeeded', None
+            except JobCancelled:
+                result, status, error = None, 'cancelled', None
+            except Exception as e:
+                result, status, error = None, 'failed', str(e)
+            
+            with self._lock:
+                job.result = result
+                job.error = error
+                job.status = status
+                job.finished_at = time.time()
+    
+    def _prune(self):
+        # Caller holds the lock
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self._jobs) - self.retention)]:
+            del self._jobs[job_id]
+
+_shared_manager = None
+_shared_manager_lock = threading.Lock()
+
+def get_job_manager():
+    """
+    Process-wide job manager, configured from environment variables
+    """
+    global _shared_manager
+    
+    with _shared_manager_lock:
+        if _shared_manager is None:
+            _shared_manager = JobManager(
+                workers=int(os.getenv('JOB_WORKERS', 2)),
+                max_queued=int(os.getenv('JOB_QUEUE_SIZE', 20)),
+                retention=int(os.getenv('JOB_RETENTION', 200))
+            )
+        return _shared_manager
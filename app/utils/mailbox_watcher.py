@@ -0,0 +1,178 @@
+import os
+import threading
+from utils.metrics import metrics
+
+class MailboxWatcher:
+    """
+    Long-running ingestion of new mail from one folder
+    
+    The watcher keeps its own session open and waits in IMAP IDLE until the
+    server reports new messages, re-issuing IDLE every idle_interval seconds
+    (servers drop idle sessions after about 30 minutes). Servers without
+    IDLE are polled with NOOP every poll_interval seconds. On each wake-up
+    only messages past the last seen UID are fetched and handed to
+    handler(emails), batch_size at a time.
+    
+    With a SyncStateStore the position is kept per account/folder, shared
+    with sync_emails, so a restarted watcher picks up what it missed;
+    without a stored position it starts at the newest message. A failed
+    session is dropped and reconnected after a backoff that doubles up to
+    backoff_max. on_exit(), if given, runs whenever run() returns, to
+    release what the handler holds.
+    """
+    def __init__(self, connector, handler, folder="INBOX", store=None, idle_interval=1740,
+                 poll_interval=30, batch_size=50, backoff_initial=1.0, backoff_max=300.0, on_exit=None):
+        self.connector = connector
+        self.handler = handler
+        self.folder = folder
+        self.store = store
+        self.idle_interval = idle_interval
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.on_exit = on_exit
+        
+        self.account = f"{connector.email}@{connector.server}"
+        self.checkpoint = store.get(self.account, folder) if store is not None else None
+        self.mode = None
+        self.wakeups = 0
+        self.fetched = 0
+        self.reconnects = 0
+        self.errors = 0
+        self.last_error = None
+        self._connected = False
+        self._stop = threading.Event()
+    
+    def run(self):
+        """
+        Watch until stop() is called
+        """
+        backoff = self.backoff_initial
+        
+        try:
+            while not self._stop.is_set():
+                try:
+                    if not self._connected:
+                        self._connect()
+                    self._drain()
+                    backoff = self.backoff_initial
+                    self._wait()
+                except Exception as e:
+                    self.errors += 1
+                    self.last_error = str(e)
+                    metrics.inc('watcher_errors_total', 1, "Watcher sessions that failed")
+                    self._disconnect()
+                    
+                    if self._stop.wait(backoff):
+                        break
+                    backoff = min(backoff * 2, self.backoff_max)
+        finally:
+            self._disconnect()
+            if self.on_exit is not None:
+                self.on_exit()
+    
+    def stop(self):
+        """
+        Ask run() to return; an IDLE in progress is ended within a second
+        """
+        self._stop.set()
+    
+    def stats(self):
+        return {
+            'account': self.account,
+            'folder': self.folder,
+            'mode': self.mode,
+            'connected': self._connected,
+            'last_uid': self.checkpoint['last_uid'] if self.checkpoint else None,
+            'wakeups': self.wakeups,
+            'fetched': self.fetched,
+            'reconnects': self.reconnects,
+            'errors': self.errors,
+            'last_error': self.last_error
+        }
+    
+    def _connect(self):
+        if self.mode is not None:
+            self.reconnects += 1
+            metrics.inc('watcher_reconnects_total', 1, "Watcher reconnects after a failed session")
+        
+        self.connector.connect()
+        self._connected = True
+        self.mode = 'idle' if self.connector.supports_idle() else 'poll'
+        
+        if self.checkpoint is None:
+            self.checkpoint = self._current_position()
+            self._save_checkpoint()
+    
+    def _current_position(self):
+        """
+        Checkpoint at the newest message, so only mail arriving later is fetched
+        """
+        uidvalidity, uidnext = self.connector.select_with_uid_state(self.folder)
+        if uidnext is not None:
+            return {'uidvalidity': uidvalidity, 'last_uid': uidnext - 1}
+        
+        response, messages = self.connector.connection.uid('SEARCH', None, 'ALL')
+        uids = messages[0].split()
+        return {'uidvalidity': uidvalidity, 'last_uid': int(uids[-1]) if uids else 0}
+    
+    def _drain(self):
+        """
+        Fetch and hand on everything past the checkpoint, batch_size at a time
+        """
+        while not self._stop.is_set():
+            emails, checkpoint = self.connector.fetch_new_emails(
+                self.folder, self.checkpoint, self.batch_size, self.batch_size
+            )
+            if emails:
+                self.handler(emails)
+                self.fetched += len(emails)
+            
+            # Saved after the handler, so a crash in between re-delivers rather than loses mail
+            self.checkpoint = checkpoint
+            self._save_checkpoint()
+            
+            if len(emails) < self.batch_size:
+                return
+    
+    def _wait(self):
+        """
+        Block until new mail may have arrived, the interval passes or stop()
+        """
+        if self.mode == 'idle':
+            # Also returns at the re-IDLE interval, which doubles as a keepalive
+            if not self.connector.idle(self.idle_interval, self._stop):
+                return
+        else:
+            if self._stop.wait(self.poll_interval):
+                return
+            response, _ = self.connector.connection.noop()
+            if response != 'OK':
+                raise Exception(f"NOOP failed: {response}")
+        
+        self.wakeups += 1
+        metrics.inc('watcher_wakeups_total', 1, "Watcher wake-ups that checked for new mail", mode=self.mode)
+    
+    def _save_checkpoint(self):
+        if self.store is not None:
+            self.store.save(self.account, self.folder, self.checkpoint)
+    
+    def _disconnect(self):
+        if not self._connected:
+            return
+        self._connected = False
+        try:
+            self.connector.disconnect()
+        except Exception:
+            pass
+
+def watcher_settings_from_env():
+    """
+    idle_interval, poll_interval and backoff_max from WATCH_* variables
+    """
+    return {
+        'idle_interval': float(os.getenv('WATCH_IDLE_INTERVAL', 1740)),
+        'poll_interval': float(os.getenv('WATCH_POLL_INTERVAL', 30)),
+        'backoff_max': float(os.getenv('WATCH_BACKOFF_MAX', 300))
+    }
@@ -0,0 +1,147 @@
+import os
+import time
+import threading
+from contextlib import nullcontext
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Shared do-nothing timer handed out while metrics are disabled
+_NULL_TIMER = nullcontext()
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.series = {}
+    
+    def observe(self, labels, value):
+        # Caller holds the registry lock
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        
+        counts = series[0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        series[1] += value
+        series[2] += 1
+    
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{self.name}_bucket{_labels(labels, le="+Inf")} {count}')
+            lines.append(f'{self.name}_sum{_labels(labels)} {total}')
+            lines.append(f'{self.name}_count{_labels(labels)} {count}')
+        
+        return lines
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.series = {}
+    
+    def inc(self, labels, value):
+        # Caller holds the registry lock
+        self.series[labels] = self.series.get(labels, 0) + value
+    
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.series.items()):
+            lines.append(f'{self.name}{_labels(labels)} {value}')
+        return lines
+
+class _Timer:
+    __slots__ = ('registry', 'stage', 'start')
+    
+    def __init__(self, registry, stage):
+        self.registry = registry
+        self.stage = stage
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.registry.observe(self.stage, time.perf_counter() - self.start)
+
+class MetricsRegistry:
+    """
+    Process-local stage timings and counters, rendered in Prometheus format
+    
+    Worker processes (batch_process, the scheduler) keep their own registry;
+    only work done in the web process shows up on /metrics.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.stage_seconds = Histogram('email_parser_stage_seconds', 'Time spent in each processing stage')
+        self.counters = {}
+    
+    def timer(self, stage):
+        """
+        Context manager timing one stage; a shared no-op when disabled
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+    
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.stage_seconds.observe((('stage', stage),), seconds)
+    
+    def inc(self, name, value=1, help_text='', **labels):
+        """
+        Add to a counter, creating it on first use
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            counter = self.counters.get(name)
+            if counter is None:
+                counter = self.counters[name] = Counter(name, help_text or name.replace('_', ' '))
+            counter.inc(tuple(sorted(labels.items())), value)
+    
+    def render(self):
+        """
+        All metrics in the Prometheus text exposition format
+        """
+        with self._lock:
+            lines = self.stage_seconds.render()
+            for counter in self.counters.values():
+                lines.extend(counter.render())
+        return '\n'.join(lines) + '\n'
+    
+    def reset(self):
+        with self._lock:
+            self.stage_seconds.series = {}
+            self.counters = {}
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    # Label values escape backslash, double quote and line feed
+    rendered = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in pairs
+    )
+    return '{' + rendered + '}'
+
+def metrics_enabled_from_env():
+    """
+    METRICS_ENABLED, on unless set to 0, false or no
+    """
+    return os.getenv('METRICS_ENABLED', 'true').strip().lower() not in ('0', 'false', 'no')
+
+metrics = MetricsRegistry(enabled=metrics_enabled_from_env())
@@ -0,0 +1,181 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+class ParseCache:
+    """
+    Content-addressed cache of parse results
+    
+    Keys are a hash of the parser version and the email body. Results are
+    kept as JSON text in a bounded in-memory LRU and, when db_path is set,
+    in an SQLite table that survives restarts.
+    """
+    def __init__(self, max_entries=10000, db_path=None):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self._setup()
+    
+    def _setup(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        
+        if self.db_path:
+            directory = os.path.dirname(self.db_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            
+            db = self._db()
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS parse_cache "
+                "(key TEXT PRIMARY KEY, version TEXT NOT NULL, result TEXT NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS parse_cache_version ON parse_cache (version)")
+            db.commit()
+    
+    def make_key(self, content, version):
+        """
+        Cache key for an email body under a parser version
+        """
+        digest = hashlib.sha256(version.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(content.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+    
+    def get(self, key):
+        """
+        Return a fresh copy of the cached result, or None
+        """
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(result)
+        
+        if self.db_path:
+            row = self._db().execute("SELECT result FROM parse_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self._remember(key, row[0])
+                return json.loads(row[0])
+        
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def put(self, key, version, result):
+        """
+        Store a parse result
+        """
+        serialized = json.dumps(result)
+        
+        with self._lock:
+            self._remember(key, serialized)
+        
+        if self.db_path:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO parse_cache (key, version, result) VALUES (?, ?, ?)",
+                (key, version, serialized)
+            )
+            db.commit()
+    
+    def invalidate_version(self, version):
+        """
+        Drop stored results produced by a parser version that no longer applies
+        
+        A maintenance call: the cache is shared by every parser in the
+        process, so only drop versions no parser is using any more.
+        
+        In-memory entries of that version can no longer be looked up and
+        simply age out of the LRU.
+        """
+        if self.db_path:
+            db = self._db()
+            db.execute("DELETE FROM parse_cache WHERE version = ?", (version,))
+            db.commit()
+    
+    def clear(self):
+        """
+        Empty both tiers
+        """
+        with self._lock:
+            self._entries.clear()
+        
+        if self.db_path:
+            db = self._db()
+            db.execute("DELETE FROM parse_cache")
+            db.commit()
+    
+    def stats(self):
+        """
+        Hit/miss/eviction counters and current size
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_hits': self.disk_hits,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+    
+    def _remember(self, key, serialized):
+        # Caller holds the lock
+        self._entries[key] = serialized
+        self._entries.move_to_end(key)
+        
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def _db(self):
+        # SQLite connections cannot be shared across threads, so keep one per thread
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+    
+    def __getstate__(self):
+        # Worker processes get their own memory tier and share the disk tier
+        return {'max_entries': self.max_entries, 'db_path': self.db_path}
+    
+    def __setstate__(self, state):
+        self.max_entries = state['max_entries']
+        self.db_path = state['db_path']
+        self._setup()
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_parse_cache():
+    """
+    Process-wide parse cache configured from environment variables
+    
+    Returns None when PARSE_CACHE_SIZE is 0.
+    """
+    global _shared_cache
+    
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            max_entries = int(os.getenv('PARSE_CACHE_SIZE', 10000))
+            if max_entries <= 0:
+                return None
+            _shared_cache = ParseCache(max_entries, os.getenv('PARSE_CACHE_PATH') or None)
+        return _shared_cache
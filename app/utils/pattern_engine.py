@@ -0,0 +1,166 @@
+import re
+import time
+
+# Characters that match an ASCII letter under re.IGNORECASE but do not
+# lowercase to it (or change length when lowercased)
+UNSAFE_CASE_FOLD_RE = re.compile('[İıſK]')
+
+class PatternEngine:
+    """
+    Compiled field extraction rules with a keyword prefilter
+    
+    Each rule may declare anchors: lowercase ASCII words that every match of
+    the rule starts with. The text is lowercased once and anchors are located
+    with str.find, so rules whose anchors are absent cost nothing and the
+    others are only tried at anchor positions. Rules without anchors fall
+    back to a full regex search. Results are identical to re.search.
+    """
+    def __init__(self, flags=re.IGNORECASE | re.DOTALL):
+        self.flags = flags
+        self.rules = []
+    
+    def register(self, name, pattern, anchors=None):
+        """
+        Add or replace a rule; anchors=None means the rule is always searched
+        """
+        if anchors:
+            anchors = tuple(anchor.lower() for anchor in anchors)
+            if not all(anchor.isascii() for anchor in anchors):
+                anchors = None
+        
+        rule = (name, re.compile(pattern, self.flags), anchors or None)
+        
+        for index, existing in enumerate(self.rules):
+            if existing[0] == name:
+                self.rules[index] = rule
+                return
+        self.rules.append(rule)
+    
+    def extract(self, text):
+        """
+        Apply every rule to text and return {name: first group, stripped}
+        """
+        extracted_data = {}
+        
+        lowered = text.lower()
+        # Anchor positions are only trustworthy when they map 1:1 onto text
+        use_anchors = len(lowered) == len(text) and (text.isascii() or not UNSAFE_CASE_FOLD_RE.search(text))
+        positions = {}
+        
+        for name, regex, anchors in self.rules:
+            if anchors is None or not use_anchors:
+                match = regex.search(text)
+            else:
+                match = None
+                for position in self._anchor_positions(lowered, anchors, positions):
+                    match = regex.match(text, position)
+                    if match:
+                        break
+            
+            if match:
+                extracted_data[name] = match.group(1).strip()
+        
+        return extracted_data
+    
+    def extract_bounded(self, text, window, deadline):
+        """
+        Like extract, but anchored rules only match within window characters
+        of an anchor hit and no rule starts after deadline (a perf_counter
+        time)
+        
+        Returns (extracted_data, names of rules skipped or cut short).
+        Unanchored rules still search the whole text, so the text should
+        be size-capped by the caller.
+        """
+        extracted_data = {}
+        over_budget = []
+        
+        lowered = text.lower()
+        use_anchors = len(lowered) == len(text) and (text.isascii() or not UNSAFE_CASE_FOLD_RE.search(text))
+        positions = {}
+        
+        for name, regex, anchors in self.rules:
+            if time.perf_counter() > deadline:
+                over_budget.append(name)
+                continue
+            
+            if anchors is None or not use_anchors:
+                match = regex.search(text)
+            else:
+                match = None
+                for tried, position in enumerate(self._anchor_positions(lowered, anchors, positions)):
+                    # Checked every few positions: text full of anchor words is the slow case
+                    if tried % 64 == 63 and time.perf_counter() > deadline:
+                        over_budget.append(name)
+                        break
+                    match = regex.match(text, position, position + window)
+                    if match:
+                        break
+            
+            if match:
+                extracted_data[name] = match.group(1).strip()
+        
+        return extracted_data, over_budget
+    
+    def _anchor_positions(self, lowered, anchors, cache):
+        """
+        Sorted start offsets of every occurrence of any of the anchors
+        """
+        if len(anchors) == 1:
+            return self._find_all(lowered, anchors[0], cache)
+        
+        positions = set()
+        for anchor in anchors:
+            positions.update(self._find_all(lowered, anchor, cache))
+        return sorted(positions)
+    
+    def _find_all(self, lowered, anchor, cache):
+        if anchor not in cache:
+            found = []
+            position = lowered.find(anchor)
+            while position != -1:
+                found.append(position)
+                position = lowered.find(anchor, position + 1)
+            cache[anchor] = found
+        return cache[anchor]
+
+def compare_with_legacy(texts, patterns, anchors=None, flags=re.IGNORECASE | re.DOTALL):
+    """
+    Check a PatternEngine against per-pattern re.search on a corpus
+    
+    Returns the number of emails, the ones whose results differ, and the
+    average extraction time per email for both approaches.
+    """
+    engine = PatternEngine(flags)
+    anchors = anchors or {}
+    for name, pattern in patterns.items():
+        engine.register(name, pattern, anchors.get(name))
+    
+    mismatches = []
+    legacy_time = 0.0
+    engine_time = 0.0
+    
+    for index, text in enumerate(texts):
+        start = time.perf_counter()
+        expected = {}
+        for name, pattern in patterns.items():
+            match = re.search(pattern, text, flags)
+            if match:
+                expected[name] = match.group(1).strip()
+        legacy_time += time.perf_counter() - start
+        
+        start = time.perf_counter()
+        actual = engine.extract(text)
+        engine_time += time.perf_counter() - start
+        
+        if actual != expected:
+            mismatches.append({'index': index, 'expected': expected, 'actual': actual})
+    
+    count = len(texts) or 1
+    return {
+        'emails': len(texts),
+        'mismatches': mismatches,
+        'legacy_us_per_email': legacy_time / count * 1e6,
+        'engine_us_per_email': engine_time / count * 1e6,
+        'speedup': legacy_time / engine_time if engine_time else None
+    }
@@ -0,0 +1,197 @@
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS results (
+        id INTEGER PRIMARY KEY,
+        source TEXT NOT NULL,
+        email_id TEXT NOT NULL,
+        subject TEXT,
+        sender TEXT,
+        email_date TEXT,
+        order_number TEXT,
+        tracking_number TEXT,
+        vendor TEXT,
+        total_amount TEXT,
+        data TEXT NOT NULL,
+        indexed_at TEXT NOT NULL,
+        UNIQUE (source, email_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS results_order_number ON results (order_number)",
+    "CREATE INDEX IF NOT EXISTS results_tracking_number ON results (tracking_number)",
+    "CREATE INDEX IF NOT EXISTS results_vendor ON results (vendor COLLATE NOCASE, email_date)",
+    "CREATE INDEX IF NOT EXISTS results_email_date ON results (email_date)",
+    # rowid is results.id
+    "CREATE VIRTUAL TABLE IF NOT EXISTS results_fts USING fts5(subject, sender, items)"
+)
+
+class ResultIndex:
+    """
+    Parsed results in SQLite, searchable by text and by key fields
+    
+    Subject, sender and item names are full-text indexed with FTS5; order
+    number, tracking number, vendor and date have B-tree indexes. Results
+    are keyed by (source, email_id), so indexing an email again replaces it.
+    Dates are stored as UTC ISO timestamps so ranges compare as text.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        
+        db = self._db()
+        with db:
+            for statement in SCHEMA:
+                db.execute(statement)
+    
+    def add_many(self, parsed_results, source=''):
+        """
+        Index parse results (dicts with the batch_process metadata keys)
+        
+        Returns the number of results written. All rows go in one
+        transaction.
+        """
+        db = self._db()
+        now = datetime.now().isoformat()
+        written = 0
+        
+        with db:
+            for parsed_data in parsed_results:
+                email_id = parsed_data.get('email_id')
+                if email_id is None:
+                    continue
+                email_id = str(email_id)
+                
+                existing = db.execute(
+                    "SELECT id FROM results WHERE source = ? AND email_id = ?", (source, email_id)
+                ).fetchone()
+                if existing:
+                    db.execute("DELETE FROM results_fts WHERE rowid = ?", existing)
+                    db.execute("DELETE FROM results WHERE id = ?", existing)
+                
+                cursor = db.execute(
+                    "INSERT INTO results (source, email_id, subject, sender, email_date, order_number, "
+                    "tracking_number, vendor, total_amount, data, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        source, email_id,
+                        parsed_data.get('email_subject'),
+                        parsed_data.get('email_from'),
+                        _iso_date(parsed_data.get('email_date')),
+                        _text(parsed_data.get('order_number')),
+                        _text(parsed_data.get('tracking_number')),
+                        _text(parsed_data.get('vendor_name')),
+                        _text(parsed_data.get('total_amount')),
+                        json.dumps(parsed_data, default=str),
+                        now
+                    )
+                )
+                item_names = ' '.join(
+                    str(item.get('name') or '') for item in parsed_data.get('items') or () if isinstance(item, dict)
+                )
+                db.execute(
+                    "INSERT INTO results_fts (rowid, subject, sender, items) VALUES (?, ?, ?, ?)",
+                    (cursor.lastrowid, parsed_data.get('email_subject') or '', parsed_data.get('email_from') or '', item_names)
+                )
+                written += 1
+        
+        return written
+    
+    def search(self, query=None, order_number=None, tracking_number=None, vendor=None,
+               date_from=None, date_to=None, source=None, limit=50, offset=0, relevance=False):
+        """
+        Results matching every given filter
+        
+        The words of query must all occur in the subject, sender or item
+        names. date_from and date_to are ISO dates or timestamps, both
+        inclusive. Without query, the newest emails come first; text matches
+        come most recently indexed first, or best match first with relevance
+        (which has to rank every match, so it is slower for common words).
+        """
+        clauses = []
+        parameters = []
+        tables = "results"
+        order = "results.email_date DESC, results.id DESC"
+        
+        if query:
+            terms = ' '.join('"' + term.replace('"', '""') + '"' for term in query.split())
+            if terms:
+                tables = "results_fts JOIN results ON results.id = results_fts.rowid"
+                clauses.append("results_fts MATCH ?")
+                parameters.append(terms)
+                order = "results_fts.rank" if relevance else "results_fts.rowid DESC"
+        
+        for column, value in (('order_number', order_number), ('tracking_number', tracking_number), ('source', source)):
+            if value:
+                clauses.append(f"results.{column} = ?")
+                parameters.append(value)
+        
+        if vendor:
+            clauses.append("results.vendor = ? COLLATE NOCASE")
+            parameters.append(vendor)
+        if date_from:
+            clauses.append("results.email_date >= ?")
+            parameters.append(date_from)
+        if date_to:
+            # A bare date includes that whole day
+            clauses.append("results.email_date <= ?" if len(date_to) > 10 else "results.email_date < date(?, '+1 day')")
+            parameters.append(date_to)
+        
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._db().execute(
+            f"SELECT results.source, results.email_id, results.data FROM {tables} {where} "
+            f"ORDER BY {order} LIMIT ? OFFSET ?",
+            parameters + [int(limit), int(offset)]
+        ).fetchall()
+        
+        return [{'source': source_name, 'email_id': email_id, 'parsed_data': json.loads(data)}
+                for source_name, email_id, data in rows]
+    
+    def count(self):
+        return self._db().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+    
+    def delete(self, email_id, source=''):
+        db = self._db()
+        with db:
+            existing = db.execute(
+                "SELECT id FROM results WHERE source = ? AND email_id = ?", (source, str(email_id))
+            ).fetchone()
+            if existing:
+                db.execute("DELETE FROM results_fts WHERE rowid = ?", existing)
+                db.execute("DELETE FROM results WHERE id = ?", existing)
+        return existing is not None
+    
+    def _db(self):
+        # SQLite connections cannot be shared across threads, so keep one per thread
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+def _text(value):
+    return None if value is None or value == '' else str(value)
+
+def _iso_date(value):
+    """
+    UTC ISO timestamp of a Date header, None if it cannot be parsed
+    """
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
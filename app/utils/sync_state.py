@@ -0,0 +1,70 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+class SyncStateStore:
+    def __init__(self, path):
+        self.path = path
+        
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        
+        with self._connect() as db:
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    account TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    uidvalidity INTEGER NOT NULL,
+                    last_uid INTEGER NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (account, folder)
+                )
+                """
+            )
+    
+    def get(self, account, folder):
+        """
+        Get the stored checkpoint for an account/folder, or None
+        """
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT uidvalidity, last_uid FROM checkpoints WHERE account = ? AND folder = ?",
+                (account, folder)
+            ).fetchone()
+        
+        if row is None:
+            return None
+        return {'uidvalidity': row[0], 'last_uid': row[1]}
+    
+    def save(self, account, folder, checkpoint):
+        """
+        Store the checkpoint for an account/folder
+        """
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+                (account, folder, checkpoint['uidvalidity'], checkpoint['last_uid'], datetime.now().isoformat())
+            )
+    
+    def reset(self, account, folder=None):
+        """
+        Forget checkpoints so the next sync starts from scratch
+        """
+        with self._connect() as db:
+            if folder is None:
+                db.execute("DELETE FROM checkpoints WHERE account = ?", (account,))
+            else:
+                db.execute("DELETE FROM checkpoints WHERE account = ? AND folder = ?", (account, folder))
+    
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps the store safe to share across threads
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
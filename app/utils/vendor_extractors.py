@@ -0,0 +1,206 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from email.utils import parseaddr
+from utils.pattern_engine import PatternEngine
+
+ITEM_STRATEGIES = ('auto', 'table', 'text', None)
+
+# Headers that identify a sending platform more reliably than the From address
+FINGERPRINT_HEADERS = ('List-Id', 'X-Mailer', 'Return-Path', 'Sender', 'Reply-To', 'Feedback-ID')
+
+class VendorExtractor:
+    """
+    Fixed extraction rules for one vendor's email layout
+    
+    domains are sender domains (subdomains match too) and fingerprints map
+    a header name to the exact value that identifies the vendor. patterns
+    and anchors work as in EmailParser.register_pattern. items picks how
+    line items are found: 'table', 'text', 'auto' (tables for HTML, text
+    otherwise) or None. With fallback, an email the rules extract nothing
+    from is handed to the generic parser.
+    """
+    def __init__(self, name, domains=(), fingerprints=None, patterns=None, anchors=None,
+                 items='auto', fallback=True, flags=re.IGNORECASE | re.DOTALL):
+        if items not in ITEM_STRATEGIES:
+            raise Exception(f"Unknown item strategy for {name}: {items}")
+        
+        self.name = name
+        self.domains = tuple(domain.lower().strip('.') for domain in domains)
+        self.fingerprints = dict(fingerprints or {})
+        self.patterns = dict(patterns or {})
+        self.anchors = {field: tuple(words) for field, words in (anchors or {}).items()}
+        self.items = items
+        self.fallback = fallback
+        
+        self.engine = PatternEngine(flags)
+        for field, pattern in self.patterns.items():
+            self.engine.register(field, pattern, self.anchors.get(field))
+        
+        # Part of the parse cache version of every email routed here
+        definition = [self.patterns, self.anchors, self.items, self.fallback, flags]
+        self.digest = hashlib.sha1(json.dumps(definition, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    
+    @classmethod
+    def from_dict(cls, definition):
+        return cls(
+            definition['name'],
+            domains=definition.get('domains', ()),
+            fingerprints=definition.get('fingerprints'),
+            patterns=definition.get('patterns'),
+            anchors=definition.get('anchors'),
+            items=definition.get('items', 'auto'),
+            fallback=definition.get('fallback', True)
+        )
+
+class VendorRegistry:
+    """
+    Routes emails to vendor extractors by sender domain or header fingerprint
+    
+    Lookups go through dictionaries built at registration time: the sender
+    domain and each of its parent domains are looked up in a domain index,
+    then the given headers in a fingerprint index. Hits are counted per
+    route; emails no extractor claims are counted as 'generic'.
+    """
+    def __init__(self, extractors=()):
+        self._lock = threading.Lock()
+        self.extractors = {}
+        self._domain_index = {}
+        self._fingerprint_index = {}
+        self.reset_stats()
+        
+        for extractor in extractors:
+            self.register(extractor)
+    
+    def register(self, extractor):
+        """
+        Add or replace an extractor (by name) and rebuild the indexes
+        """
+        with self._lock:
+            self.extractors[extractor.name] = extractor
+            self._build_index()
+    
+    def route(self, sender=None, headers=None):
+        """
+        Extractor for an email, or None for the generic path
+        """
+        extractor = self._lookup(sender, headers)
+        
+        with self._lock:
+            if extractor is None:
+                self.generic_hits += 1
+            else:
+                self.route_hits[extractor.name] = self.route_hits.get(extractor.name, 0) + 1
+        
+        return extractor
+    
+    def record_fallback(self, name):
+        """
+        Note that a routed email was handed on to the generic parser
+        """
+        with self._lock:
+            self.fallbacks[name] = self.fallbacks.get(name, 0) + 1
+    
+    def stats(self):
+        """
+        Hits and fallbacks per route and the share of emails routed
+        """
+        with self._lock:
+            routed = sum(self.route_hits.values())
+            lookups = routed + self.generic_hits
+            return {
+                'routes': {
+                    name: {'hits': self.route_hits.get(name, 0), 'fallbacks': self.fallbacks.get(name, 0)}
+                    for name in self.extractors
+                },
+                'generic': self.generic_hits,
+                'lookups': lookups,
+                'routed_rate': routed / lookups if lookups else 0.0
+            }
+    
+    def fingerprint_headers(self):
+        """
+        Lowercased names of the headers any extractor is fingerprinted on
+        """
+        with self._lock:
+            return tuple(self._fingerprint_index)
+    
+    def reset_stats(self):
+        with self._lock:
+            self.route_hits = {}
+            self.fallbacks = {}
+            self.generic_hits = 0
+    
+    def _lookup(self, sender, headers):
+        if sender and self._domain_index:
+            domain = parseaddr(sender)[1].rpartition('@')[2].lower().rstrip('.')
+            while domain:
+                extractor = self._domain_index.get(domain)
+                if extractor is not None:
+                    return extractor
+                domain = domain.partition('.')[2]
+        
+        if headers and self._fingerprint_index:
+            for header, value in headers.items():
+                values = self._fingerprint_index.get(header.lower())
+                if values and value is not None:
+                    extractor = values.get(str(value).strip().lower())
+                    if extractor is not None:
+                        return extractor
+        
+        return None
+    
+    def _build_index(self):
+        # Caller holds the lock
+        domain_index = {}
+        fingerprint_index = {}
+        
+        for extractor in self.extractors.values():
+            for domain in extractor.domains:
+                domain_index[domain] = extractor
+            for header, value in extractor.fingerprints.items():
+                fingerprint_index.setdefault(header.lower(), {})[str(value).strip().lower()] = extractor
+        
+        self._domain_index = domain_index
+        self._fingerprint_index = fingerprint_index
+    
+    def __getstate__(self):
+        # Worker processes route with the same extractors and count their own hits
+        return {'extractors': list(self.extractors.values())}
+    
+    def __setstate__(self, state):
+        self.__init__(state['extractors'])
+
+def load_vendor_extractors(path):
+    """
+    Read extractor definitions from a JSON file holding a list of objects
+    """
+    with open(path) as f:
+        return [VendorExtractor.from_dict(definition) for definition in json.load(f)]
+
+def fingerprint_header_names():
+    """
+    Headers email sources keep for routing: FINGERPRINT_HEADERS plus any
+    other header the shared registry matches on
+    """
+    names = {name.lower(): name for name in FINGERPRINT_HEADERS}
+    for name in get_vendor_registry().fingerprint_headers():
+        names.setdefault(name, name)
+    return tuple(names.values())
+
+_shared_registry = None
+_shared_registry_lock = threading.Lock()
+
+def get_vendor_registry():
+    """
+    Process-wide registry loaded from VENDOR_EXTRACTORS_PATH, empty when unset
+    """
+    global _shared_registry
+    
+    with _shared_registry_lock:
+        if _shared_registry is None:
+            path = os.getenv('VENDOR_EXTRACTORS_PATH')
+            _shared_registry = VendorRegistry(load_vendor_extractors(path) if path else ())
+        return _shared_registry
@@ -0,0 +1,125 @@
+import random
+from email.message import EmailMessage
+from email.utils import format_datetime
+from datetime import datetime, timedelta
+
+VENDORS = ['Acme Supplies', 'Northwind Traders', 'Globex Store', 'Initech Outlet', 'Umbrella Market']
+PRODUCTS = ['USB-C Cable', 'Wireless Mouse', 'Desk Lamp', 'Notebook A5', 'Coffee Beans 1kg',
+            'Phone Case', 'HDMI Adapter', 'Water Bottle', 'Backpack', 'Keyboard Cover']
+CHARSETS = ['utf-8', 'iso-8859-1', 'windows-1252', 'utf-8']
+NAMES = ['José Müller', 'Zoë Dupont', 'Ana Lopez', 'Chris Smith']
+KINDS = ['text', 'html', 'multipart']
+
+class CorpusGenerator:
+    """
+    Deterministic generator of realistic order confirmation emails
+    
+    The same seed always yields the same messages, so benchmark runs are
+    comparable. Messages cycle through plain text, HTML with nested item
+    tables, and multipart messages with a PDF attachment, in several charsets.
+    """
+    def __init__(self, seed=0, filler_paragraphs=6):
+        self.seed = seed
+        self.filler_paragraphs = filler_paragraphs
+    
+    def orders(self, count):
+        """
+        Order data dicts that the messages are rendered from
+        """
+        rng = random.Random(self.seed)
+        start = datetime(2024, 1, 1, 9, 0)
+        
+        for index in range(count):
+            items = []
+            for _ in range(rng.randint(1, 6)):
+                quantity = rng.randint(1, 4)
+                price = rng.randint(199, 9999) / 100
+                items.append({'name': rng.choice(PRODUCTS), 'quantity': quantity, 'unit_price': price})
+            
+            yield {
+                'index': index,
+                'kind': KINDS[index % len(KINDS)],
+                'charset': CHARSETS[index % len(CHARSETS)],
+                'vendor': rng.choice(VENDORS),
+                'customer': rng.choice(NAMES),
+                'order_number': f"ORD-{rng.randint(100000, 999999)}",
+                'tracking_number': f"1Z{rng.randint(10**9, 10**10 - 1)}",
+                'date': start + timedelta(hours=index * 7),
+                'items': items,
+                'total': sum(item['quantity'] * item['unit_price'] for item in items),
+                'filler': [self._filler(rng) for _ in range(rng.randint(1, self.filler_paragraphs))]
+            }
+    
+    def bodies(self, count, kind=None):
+        """
+        Email bodies as the parser receives them
+        """
+        for order in self.orders(count):
+            order_kind = kind or order['kind']
+            yield self.render_html(order) if order_kind != 'text' else self.render_text(order)
+    
+    def messages(self, count):
+        """
+        Raw RFC822 messages as an IMAP server would return them
+        """
+        for order in self.orders(count):
+            yield self.render_message(order)
+    
+    def render_text(self, order):
+        lines = [f"Hello {order['customer']},", '', *order['filler'], '',
+                 f"Order Number: {order['order_number']}",
+                 f"Order Date: {order['date'].strftime('%B %d, %Y')}", '']
+        for item in order['items']:
+            lines.append(f"{item['quantity']} x {item['name']}, ${item['unit_price']:.2f}")
+        lines += ['', f"Order Total: ${order['total']:.2f}", '',
+                  'Shipping Address: 12 Main Street', 'Springfield', '',
+                  f"Tracking Number: {order['tracking_number']}", '',
+                  f"From: {order['vendor']}", '']
+        return '\n'.join(lines)
+    
+    def render_html(self, order):
+        rows = ''.join(
+            f"<tr><td><table><tr><td><b>{item['name']}</b></td></tr><tr><td>SKU {index}</td></tr></table></td>"
+            f"<td>{item['quantity']}</td><td>${item['unit_price']:.2f}</td>"
+            f"<td>${item['quantity'] * item['unit_price']:.2f}</td></tr>"
+            for index, item in enumerate(order['items'])
+        )
+        filler = ''.join(f"<p>{paragraph}</p>" for paragraph in order['filler'])
+        return (
+            "<html><head><style>td { padding: 4px; }</style></head><body>"
+            f"<table width='100%'><tr><td><h1>{order['vendor']}</h1></td></tr><tr><td>"
+            f"<p>Hello {order['customer']},</p>{filler}"
+            f"<p>Order Number: {order['order_number']}</p>"
+            f"<p>Order Date: {order['date'].strftime('%B %d, %Y')}</p>"
+            "<table><tr><th>Item</th><th>Qty</th><th>Price</th><th>Subtotal</th></tr>"
+            f"{rows}</table>"
+            f"<p>Order Total: ${order['total']:.2f}</p>"
+            f"<p>Tracking Number: {order['tracking_number']}</p>"
+            "</td></tr></table></body></html>"
+        )
+    
+    def render_message(self, order):
+        message = EmailMessage()
+        message['Subject'] = f"Your {order['vendor']} order {order['order_number']}"
+        message['From'] = f"{order['vendor']} <orders@{order['vendor'].split()[0].lower()}.example>"
+        message['To'] = 'customer@example.com'
+        message['Date'] = format_datetime(order['date'])
+        
+        if order['kind'] == 'text':
+            message.set_content(self.render_text(order), charset=order['charset'])
+        else:
+            message.set_content(self.render_text(order), charset=order['charset'])
+            message.add_alternative(self.render_html(order), subtype='html', charset=order['charset'])
+        
+        if order['kind'] == 'multipart':
+            rng = random.Random(self.seed * 1000003 + order['index'])
+            invoice = rng.randbytes(rng.randint(20_000, 200_000))
+            message.add_attachment(invoice, maintype='application', subtype='pdf',
+                                   filename=f"invoice-{order['order_number']}.pdf")
+        
+        return message.as_bytes()
+    
+    def _filler(self, rng):
+        words = ['thank', 'you', 'for', 'shopping', 'with', 'us', 'your', 'package', 'will', 'arrive',
+                 'soon', 'café', 'naïve', 'offers', 'newsletter', 'unsubscribe', 'privacy', 'policy']
+        return ' '.join(rng.choice(words) for _ in range(rng.randint(20, 60))).capitalize() + '.'
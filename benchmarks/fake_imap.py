@@ -0,0 +1,182 @@
+import time
+import threading
+
+class FakeIMAPServer:
+    """
+    In-process stand-in for an IMAP mailbox
+    
+    Holds messages per folder and hands out FakeIMAPConnection objects that
+    mimic the parts of imaplib.IMAP4 the connector uses. Every command
+    sleeps for latency seconds to model a network round trip, and the server
+    counts commands so benchmarks can report round trips.
+    """
+    def __init__(self, latency=0.0, uidvalidity=1):
+        self.latency = latency
+        self.uidvalidity = uidvalidity
+        self.folders = {'INBOX': []}
+        self.commands = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+    
+    def add_messages(self, raw_messages, folder='INBOX'):
+        """
+        Append raw RFC822 messages, assigning increasing UIDs
+        """
+        messages = self.folders.setdefault(folder, [])
+        next_uid = messages[-1][0] + 1 if messages else 1
+        
+        for raw_message in raw_messages:
+            messages.append((next_uid, raw_message))
+            next_uid += 1
+    
+    def connection(self):
+        return FakeIMAPConnection(self)
+    
+    def attach(self, connector):
+        """
+        Point an EmailConnector at this server instead of a real one
+        """
+        connector.connection = self.connection()
+        return connector
+    
+    def _round_trip(self):
+        with self._lock:
+            self.commands += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+class FakeIMAPConnection:
+    def __init__(self, server):
+        self.server = server
+        self.selected = None
+        self.capabilities = ('IMAP4REV1', 'IDLE', 'UIDPLUS')
+        self._untagged = {}
+    
+    def login(self, user, password):
+        self.server._round_trip()
+        return 'OK', [b'LOGIN completed']
+    
+    def logout(self):
+        self.server._round_trip()
+        return 'BYE', [b'Logging out']
+    
+    def noop(self):
+        self.server._round_trip()
+        return 'OK', [b'NOOP completed']
+    
+    def list(self):
+        self.server._round_trip()
+        return 'OK', [f'(\\HasNoChildren) "/" "{name}"'.encode() for name in self.server.folders]
+    
+    def select(self, mailbox='INBOX', readonly=False):
+        self.server._round_trip()
+        mailbox = mailbox.strip('"')
+        if mailbox not in self.server.folders:
+            return 'NO', [b'Mailbox does not exist']
+        
+        self.selected = mailbox
+        messages = self.server.folders[mailbox]
+        self._untagged = {
+            'UIDVALIDITY': [str(self.server.uidvalidity).encode()],
+            'UIDNEXT': [str(messages[-1][0] + 1 if messages else 1).encode()]
+        }
+        return 'OK', [str(len(messages)).encode()]
+    
+    def response(self, code):
+        return code, self._untagged.pop(code, [None])
+    
+    def status(self, mailbox, names):
+        self.server._round_trip()
+        messages = self.server.folders.get(mailbox.strip('"'), [])
+        uidnext = messages[-1][0] + 1 if messages else 1
+        return 'OK', [f'{mailbox} (UIDVALIDITY {self.server.uidvalidity} UIDNEXT {uidnext})'.encode()]
+    
+    def search(self, charset, *criteria):
+        self.server._round_trip()
+        return 'OK', [b' '.join(str(number).encode() for number, _ in self._match(criteria, use_uid=False))]
+    
+    def fetch(self, message_set, message_parts):
+        self.server._round_trip()
+        return 'OK', self._fetch(self._expand(message_set, use_uid=False), message_parts, use_uid=False)
+    
+    def uid(self, command, *args):
+        self.server._round_trip()
+        command = command.upper()
+        
+        if command == 'SEARCH':
+            criteria = [arg for arg in args if arg is not None]
+            return 'OK', [b' '.join(str(uid).encode() for _, uid in self._match(criteria, use_uid=True))]
+        if command == 'FETCH':
+            return 'OK', self._fetch(self._expand(args[0], use_uid=True), args[1], use_uid=True)
+        
+        return 'BAD', [f'Unsupported UID command {command}'.encode()]
+    
+    def _messages(self):
+        return self.server.folders.get(self.selected, [])
+    
+    def _match(self, criteria, use_uid):
+        """
+        (sequence number, uid) pairs matching ALL or UID n:m criteria
+        """
+        text = ' '.join(criteria).strip().upper()
+        messages = self._messages()
+        
+        if text.startswith('UID '):
+            wanted = set(self._expand(text[4:], use_uid=True))
+            return [(index + 1, uid) for index, (uid, _) in enumerate(messages) if index + 1 in wanted]
+        
+        return [(index + 1, uid) for index, (uid, _) in enumerate(messages)]
+    
+    def _expand(self, message_set, use_uid):
+        """
+        Sequence numbers addressed by an IMAP message set
+        """
+        if isinstance(message_set, bytes):
+            message_set = message_set.decode()
+        
+        messages = self._messages()
+        if not messages:
+            return []
+        
+        if use_uid:
+            uids = [uid for uid, _ in messages]
+            highest = uids[-1]
+            position = {uid: index + 1 for index, uid in enumerate(uids)}
+        else:
+            highest = len(messages)
+        
+        numbers = []
+        for part in message_set.split(','):
+            low, _, high = part.partition(':')
+            low = highest if low == '*' else int(low)
+            high = low if not high else (highest if high == '*' else int(high))
+            low, high = min(low, high), max(low, high)
+            
+            if use_uid:
+                # "n:*" always includes the last message, as on real servers
+                numbers.extend(position[uid] for uid in uids if low <= uid <= high)
+                if part.endswith('*') and position[highest] not in numbers:
+                    numbers.append(position[highest])
+            else:
+                numbers.extend(range(low, min(high, highest) + 1))
+        
+        return numbers
+    
+    def _fetch(self, numbers, message_parts, use_uid):
+        parts = message_parts.upper()
+        if 'RFC822' not in parts and 'BODY[]' not in parts and 'BODY.PEEK[]' not in parts:
+            raise Exception(f"FakeIMAPConnection only serves full messages, not {message_parts}")
+        
+        messages = self._messages()
+        data = []
+        
+        for number in numbers:
+            uid, raw_message = messages[number - 1]
+            uid_item = f'UID {uid} ' if use_uid or 'UID' in parts else ''
+            data.append((f'{number} ({uid_item}RFC822 {{{len(raw_message)}}}'.encode(), raw_message))
+            data.append(b')')
+        
+        with self.server._lock:
+            self.server.bytes_sent += sum(len(messages[number - 1][1]) for number in numbers)
+        
+        return data
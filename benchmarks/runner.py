@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+sys.path.insert(0, ROOT)
+
+from utils.email_connector import EmailConnector
+from utils.email_parser import EmailParser, DEFAULT_PATTERNS, DEFAULT_PATTERN_ANCHORS
+from utils.html_backends import get_html_backend
+from utils.pattern_engine import compare_with_legacy
+from controllers.email_controller import EmailController
+from benchmarks.corpus import CorpusGenerator
+from benchmarks.fake_imap import FakeIMAPServer
+
+class StageResult:
+    def __init__(self, name, latencies, items, peak_memory):
+        self.name = name
+        self.latencies = sorted(latencies)
+        self.items = items
+        self.peak_memory = peak_memory
+    
+    def to_dict(self):
+        total = sum(self.latencies)
+        return {
+            'ops': len(self.latencies),
+            'items_per_second': self.items / total if total else 0.0,
+            'p50_ms': self._percentile(50) * 1000,
+            'p99_ms': self._percentile(99) * 1000,
+            'peak_memory_kb': self.peak_memory / 1024
+        }
+    
+    def _percentile(self, percent):
+        if not self.latencies:
+            return 0.0
+        index = min(len(self.latencies) - 1, int(round(percent / 100 * (len(self.latencies) - 1))))
+        return self.latencies[index]
+
+def measure(name, operations, items_per_op=1):
+    """
+    Time each zero-argument callable, then run them again under tracemalloc
+    
+    Memory is traced in a separate pass because tracing slows every
+    allocation and would distort the latencies.
+    """
+    latencies = []
+    
+    for operation in operations:
+        start = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - start)
+    
+    tracemalloc.start()
+    for operation in operations:
+        operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return StageResult(name, latencies, len(latencies) * items_per_op, peak)
+
+def run_benchmarks(count=200, seed=0, latency=0.002, batch_size=50):
+    """
+    Run every stage and return {stage: metrics}
+    """
+    generator = CorpusGenerator(seed)
+    html_bodies = list(generator.bodies(count, kind='html'))
+    text_bodies = list(generator.bodies(count, kind='text'))
+    parser = EmailParser()
+    results = {}
+    
+    results['parse_html'] = measure('parse_html', [lambda body=body: parser.parse_html(body) for body in html_bodies])
+    results['parse_text'] = measure('parse_text', [lambda body=body: parser.parse_text(body) for body in text_bodies])
+    
+    tables = [table for body in html_bodies for table in get_html_backend().scan(body).tables]
+    results['extract_items_from_table'] = measure(
+        'extract_items_from_table', [lambda table=table: parser._extract_items_from_table(table) for table in tables]
+    )
+    
+    server = FakeIMAPServer(latency=latency)
+    server.add_messages(generator.messages(count))
+    connector = server.attach(EmailConnector('bench.invalid', 993, 'bench@example.com', 'secret'))
+    
+    results['fetch_emails'] = measure(
+        'fetch_emails', [lambda: connector.fetch_emails(limit=count)], items_per_op=count
+    )
+    results['fetch_emails_batched'] = measure(
+        'fetch_emails_batched', [lambda: connector.fetch_emails(limit=count, batch_size=batch_size)], items_per_op=count
+    )
+    
+    parsed = [parser.parse(body) for body in html_bodies + text_bodies]
+    with tempfile.TemporaryDirectory() as directory:
+        controller = EmailController(export_directory=directory)
+        results['export_data_csv'] = measure(
+            'export_data_csv', [lambda: controller.export_data(parsed, 'csv')], items_per_op=len(parsed)
+        )
+    
+    return {name: result.to_dict() for name, result in results.items()}
+
+def check_pattern_engine(count=200, seed=0):
+    """
+    Run the default patterns through the PatternEngine and through plain
+    re.search over the corpus; any difference is a bug in the prefilter
+    """
+    generator = CorpusGenerator(seed)
+    texts = list(generator.bodies(count, kind='html')) + list(generator.bodies(count, kind='text'))
+    return compare_with_legacy(texts, DEFAULT_PATTERNS, DEFAULT_PATTERN_ANCHORS)
+
+def compare(results, baseline, threshold=0.10):
+    """
+    Stages whose throughput dropped or p99 latency rose by more than threshold
+    """
+    regressions = []
+    
+    for stage, metrics in results.items():
+        previous = baseline.get(stage)
+        if not previous:
+            continue
+        
+        if previous['items_per_second'] and metrics['items_per_second'] < previous['items_per_second'] * (1 - threshold):
+            regressions.append(f"{stage}: throughput {previous['items_per_second']:.1f} -> {metrics['items_per_second']:.1f}/s")
+        if previous['p99_ms'] and metrics['p99_ms'] > previous['p99_ms'] * (1 + threshold):
+            regressions.append(f"{stage}: p99 {previous['p99_ms']:.2f} -> {metrics['p99_ms']:.2f} ms")
+    
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the email parsing pipeline")
+    parser.add_argument('--count', type=int, default=200, help="emails per stage")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.002, help="fake IMAP round trip in seconds")
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--baseline', help="JSON file with results to compare against")
+    parser.add_argument('--save-baseline', help="write these results to a JSON file")
+    parser.add_argument('--threshold', type=float, default=0.10, help="allowed relative slowdown")
+    args = parser.parse_args(argv)
+    
+    results = run_benchmarks(args.count, args.seed, args.latency, args.batch_size)
+    
+    print(f"{'stage':<26}{'items/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'peak KB':>12}")
+    for stage, metrics in results.items():
+        print(f"{stage:<26}{metrics['items_per_second']:>12.1f}{metrics['p50_ms']:>10.2f}"
+              f"{metrics['p99_ms']:>10.2f}{metrics['peak_memory_kb']:>12.0f}")
+    
+    equivalence = check_pattern_engine(args.count, args.seed)
+    print(f"pattern engine: {equivalence['emails']} emails, {len(equivalence['mismatches'])} mismatches, "
+          f"{equivalence['engine_us_per_email']:.1f} vs {equivalence['legacy_us_per_email']:.1f} us/email with re.search")
+    for mismatch in equivalence['mismatches'][:5]:
+        print(f"MISMATCH email {mismatch['index']}: expected {mismatch['expected']}, got {mismatch['actual']}")
+    if equivalence['mismatches']:
+        return 1
+    
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=4)
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
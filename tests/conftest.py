@@ -0,0 +1,22 @@
+import os
+import sys
+import importlib.util
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """
+    Flask test client for app/app.py, working in a scratch directory
+    """
+    # app/app.py shares its name with the app/ directory, so load it by path
+    spec = importlib.util.spec_from_file_location('email_app', os.path.join(ROOT, 'app', 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    
+    monkeypatch.chdir(tmp_path)
+    module.app.config['TESTING'] = True
+    return module.app.test_client()
@@ -0,0 +1,125 @@
+import os
+import time
+import pytest
+from utils.account_scheduler import AccountScheduler, AccountState
+
+# Stub tasks run in worker processes; an account's 'mode' picks the behaviour
+
+def stub_task(account, checkpoint):
+    mode = account.get('mode', 'ok')
+    slice_number = (checkpoint or {}).get('last_uid', 0) + 1
+    
+    if mode == 'hang':
+        time.sleep(60)
+    if mode == 'fail':
+        raise Exception('LOGIN failed')
+    if mode == 'crash':
+        os._exit(3)
+    if mode == 'flaky' and not os.path.exists(account['marker']):
+        open(account['marker'], 'w').close()
+        raise Exception('connection reset')
+    
+    started = time.time()
+    time.sleep(account.get('seconds', 0))
+    results = [{'slice': slice_number, 'started': started, 'ended': time.time()}]
+    return results, {'uidvalidity': 1, 'last_uid': slice_number}, slice_number >= account.get('slices', 1)
+
+def account(name, server='imap.example.com', **settings):
+    return AccountState(dict(
+        {'name': name, 'server': server, 'port': 993, 'email': f'{name}@example.com', 'password': 'secret'},
+        **settings
+    ))
+
+def run(states, **settings):
+    received = {}
+    checkpoints = []
+    
+    def sink(name, results):
+        received.setdefault(name, []).extend(results)
+    
+    def save_checkpoint(state):
+        checkpoints.append((state.name, state.checkpoint['last_uid']))
+    
+    options = {'workers': 4, 'per_server': 2, 'task_timeout': 30, 'max_failures': 3, 'backoff': 0.01}
+    options.update(settings)
+    scheduler = AccountScheduler(stub_task, sink, on_checkpoint=save_checkpoint, **options)
+    return scheduler.run(states), received, checkpoints
+
+def most_at_once(slices):
+    """
+    Largest number of slices whose run times overlap
+    """
+    edges = sorted([(result['started'], 1) for result in slices] + [(result['ended'], -1) for result in slices])
+    running = peak = 0
+    for _, change in edges:
+        running += change
+        peak = max(peak, running)
+    return peak
+
+def test_every_slice_is_delivered_before_its_checkpoint():
+    stats, received, checkpoints = run([account('a', slices=3), account('b', slices=2)])
+    
+    assert [result['slice'] for result in received['a']] == [1, 2, 3]
+    assert [result['slice'] for result in received['b']] == [1, 2]
+    assert [uid for name, uid in checkpoints if name == 'a'] == [1, 2, 3]
+    assert stats['emails'] == 5
+    assert stats['accounts']['a']['status'] == 'done'
+    assert stats['accounts']['a']['last_uid'] == 3
+    assert stats['failed'] == []
+
+def test_per_server_limit():
+    states = [account(name, seconds=0.3) for name in ('a', 'b', 'c')] + [account('d', server='IMAP.other.example', seconds=0.3)]
+    
+    stats, received, _ = run(states, workers=4, per_server=1)
+    
+    same_server = [result for name in ('a', 'b', 'c') for result in received[name]]
+    assert most_at_once(same_server) == 1
+    # The other server's account still ran alongside
+    assert most_at_once([result for results in received.values() for result in results]) == 2
+    assert stats['emails'] == 4
+
+def test_hanging_slice_times_out():
+    started = time.monotonic()
+    
+    stats, received, _ = run([account('stuck', mode='hang'), account('ok')], task_timeout=0.5, max_failures=2)
+    
+    assert time.monotonic() - started < 15
+    assert stats['accounts']['stuck']['status'] == 'failed'
+    assert stats['accounts']['stuck']['errors'] == 2
+    assert stats['accounts']['stuck']['last_error'] == 'Timed out after 0.5 s'
+    assert stats['accounts']['ok']['status'] == 'done'
+    assert stats['failed'] == ['stuck']
+
+@pytest.mark.parametrize('mode, error', [('fail', 'LOGIN failed'), ('crash', 'Worker exited with code 3')])
+def test_max_failures(mode, error):
+    stats, received, checkpoints = run([account('broken', mode=mode), account('ok', slices=2)], max_failures=3)
+    
+    assert stats['accounts']['broken']['status'] == 'failed'
+    assert stats['accounts']['broken']['errors'] == 3
+    assert stats['accounts']['broken']['last_error'] == error
+    assert 'broken' not in received
+    assert all(name == 'ok' for name, _ in checkpoints)
+    assert stats['accounts']['ok']['emails'] == 2
+
+def test_failure_is_retried_after_backoff(tmp_path):
+    stats, received, _ = run([account('flaky', mode='flaky', marker=str(tmp_path / 'failed-once'), slices=2)], max_failures=2)
+    
+    assert stats['accounts']['flaky']['status'] == 'done'
+    assert stats['accounts']['flaky']['errors'] == 1
+    assert [result['slice'] for result in received['flaky']] == [1, 2]
+
+def test_sink_failure_keeps_the_checkpoint():
+    state = account('a', slices=2)
+    
+    def sink(name, results):
+        raise Exception('disk full')
+    
+    stats = AccountScheduler(stub_task, sink, max_failures=2, backoff=0.01).run([state])
+    
+    assert stats['accounts']['a']['status'] == 'failed'
+    assert stats['accounts']['a']['last_error'] == 'Sink failed: disk full'
+    assert state.checkpoint is None
+
+def test_account_needs_credentials():
+    with pytest.raises(Exception, match='missing password'):
+        AccountState({'server': 'imap.example.com', 'port': 993, 'email': 'a@example.com'})
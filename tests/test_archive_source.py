@@ -0,0 +1,104 @@
+import pytest
+from benchmarks.fake_imap import FakeIMAPServer
+from utils.archive_source import ArchiveSource
+from utils.email_connector import EmailConnector
+
+def message(number, body=None):
+    body = body or f'Order {number} shipped.\n'
+    return f'Subject: Order {number}\nFrom: shop@example.com\n\n{body}'.encode()
+
+def mbox(messages, newline=b'\n'):
+    """
+    mboxrd file: each message after a From line, body From lines quoted
+    """
+    chunks = []
+    for raw_message in messages:
+        quoted = b'\n'.join(
+            b'>' + line if line.lstrip(b'>').startswith(b'From ') else line
+            for line in raw_message.split(b'\n')
+        )
+        chunks.append(b'From shop@example.com Mon Jan  1 10:00:00 2024\n' + quoted + b'\n')
+    return b''.join(chunks).replace(b'\n', newline)
+
+def write_mbox(tmp_path, messages, newline=b'\n'):
+    path = tmp_path / 'orders.mbox'
+    path.write_bytes(mbox(messages, newline))
+    return str(path)
+
+def bodies(emails):
+    return [email_data['body'] for email_data in emails]
+
+def test_mbox_messages_split_on_from_lines(tmp_path):
+    source = ArchiveSource(write_mbox(tmp_path, [message(number) for number in range(1, 4)]))
+    
+    emails = source.fetch_emails()
+    
+    assert source.kind == 'mbox'
+    assert source.count() == 3
+    assert [email_data['id'] for email_data in emails] == ['1', '2', '3']
+    assert [email_data['subject'] for email_data in emails] == ['Order 1', 'Order 2', 'Order 3']
+    # The blank separator line is not part of the message
+    assert bodies(emails) == ['Order 1 shipped.\n', 'Order 2 shipped.\n', 'Order 3 shipped.\n']
+
+def test_quoted_from_lines_are_unquoted(tmp_path):
+    body = 'Hello,\nFrom now on orders ship daily.\n>From the archive\n  From is not at the line start\n'
+    path = write_mbox(tmp_path, [message(1, body), message(2)])
+    
+    emails = ArchiveSource(path).fetch_emails()
+    
+    # Only separator lines split messages; the quoted body lines come back as sent
+    assert len(emails) == 2
+    assert emails[0]['body'] == body
+    assert emails[1]['subject'] == 'Order 2'
+
+def test_crlf_mbox(tmp_path):
+    path = write_mbox(tmp_path, [message(1), message(2)], newline=b'\r\n')
+    
+    emails = ArchiveSource(path).fetch_emails()
+    
+    assert [email_data['subject'] for email_data in emails] == ['Order 1', 'Order 2']
+    assert bodies(emails) == ['Order 1 shipped.\r\n', 'Order 2 shipped.\r\n']
+
+@pytest.mark.parametrize('limit, expected', [(None, ['1', '2', '3', '4', '5']), (2, ['4', '5']), (9, ['1', '2', '3', '4', '5'])])
+def test_limit_keeps_the_newest(tmp_path, limit, expected):
+    path = write_mbox(tmp_path, [message(number) for number in range(1, 6)])
+    (tmp_path / 'eml').mkdir()
+    for number in range(1, 6):
+        (tmp_path / 'eml' / f'{number:02d}.eml').write_bytes(message(number))
+    
+    for source in (ArchiveSource(path), ArchiveSource(str(tmp_path / 'eml'))):
+        assert [email_data['id'] for email_data in source.iter_emails(limit)] == expected
+
+def test_empty_mbox(tmp_path):
+    path = tmp_path / 'empty.mbox'
+    path.write_bytes(b'')
+    
+    assert ArchiveSource(str(path)).fetch_emails() == []
+    assert ArchiveSource(str(path)).count() == 0
+
+def test_maildir_in_delivery_order(tmp_path):
+    for subdirectory in ('cur', 'new', 'tmp'):
+        (tmp_path / subdirectory).mkdir()
+    (tmp_path / 'new' / '1700000002.M2.host').write_bytes(message(2))
+    (tmp_path / 'cur' / '1700000001.M1.host:2,S').write_bytes(message(1))
+    (tmp_path / 'tmp' / '1700000003.M3.host').write_bytes(message(3))
+    
+    source = ArchiveSource(str(tmp_path))
+    
+    assert source.kind == 'maildir'
+    assert [email_data['subject'] for email_data in source.fetch_emails()] == ['Order 1', 'Order 2']
+
+def test_archive_and_imap_yield_the_same_dicts(tmp_path):
+    messages = [message(number) for number in range(1, 4)]
+    server = FakeIMAPServer()
+    server.add_messages([raw_message.replace(b'\n', b'\r\n') for raw_message in messages])
+    connector = server.attach(EmailConnector('imap.example.com', 993, 'user@example.com', 'secret'))
+    
+    fetched = connector.fetch_emails(limit=3, batch_size=3)
+    archived = ArchiveSource(write_mbox(tmp_path, messages, newline=b'\r\n')).fetch_emails()
+    
+    assert archived == fetched
+
+def test_unknown_archive(tmp_path):
+    with pytest.raises(Exception, match='Archive not found'):
+        ArchiveSource(str(tmp_path / 'missing.mbox'))
@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from benchmarks.fake_imap import FakeIMAPServer, FakeIMAPConnection
+from utils.async_email_connector import AsyncEmailConnector
+
+class RecordingConnection(FakeIMAPConnection):
+    """
+    Remembers the UIDs this session fetched
+    """
+    def __init__(self, server):
+        super().__init__(server)
+        self.fetched = []
+    
+    def _fetch(self, numbers, message_parts, use_uid):
+        data = super()._fetch(numbers, message_parts, use_uid)
+        self.fetched.extend(self._messages()[number - 1][0] for number in numbers)
+        return data
+
+def messages(count):
+    return [f'Subject: Order {number}\r\n\r\nOrder {number} shipped.\r\n'.encode() for number in range(count)]
+
+def connect(server, sessions):
+    connector = AsyncEmailConnector('imap.example.com', 993, 'user@example.com', 'secret', sessions=sessions)
+    for session in connector.connectors:
+        session.connection = RecordingConnection(server)
+    return connector
+
+@pytest.fixture
+def server():
+    server = FakeIMAPServer(latency=0.001)
+    server.add_messages(messages(40))
+    # Expunged messages leave gaps in the UIDs
+    server.folders['INBOX'] = [entry for entry in server.folders['INBOX'] if entry[0] % 7]
+    return server
+
+@pytest.mark.parametrize('sessions', [1, 3, 4, 50])
+def test_every_message_fetched_once_across_sessions(server, sessions):
+    connector = connect(server, sessions)
+    uids = [uid for uid, _ in server.folders['INBOX']]
+    
+    emails = asyncio.run(connector.fetch_emails(limit=None, batch_size=4))
+    
+    fetched = [session.connection.fetched for session in connector.connectors]
+    assert sorted(uid for part in fetched for uid in part) == uids
+    assert [int(email_data['id']) for email_data in emails] == uids
+    # Each busy session got one contiguous slice of the UIDs
+    busy = [part for part in fetched if part]
+    assert len(busy) == min(sessions, len(uids))
+    assert [uid for part in busy for uid in part] == uids
+
+def test_limit_keeps_the_newest(server):
+    connector = connect(server, 3)
+    uids = [uid for uid, _ in server.folders['INBOX']]
+    
+    emails = asyncio.run(connector.fetch_emails(limit=10, batch_size=4))
+    
+    assert [int(email_data['id']) for email_data in emails] == uids[-10:]
+    assert sorted(uid for session in connector.connectors for uid in session.connection.fetched) == uids[-10:]
+
+def test_partition_is_contiguous_and_balanced():
+    connector = AsyncEmailConnector('imap.example.com', 993, 'user@example.com', 'secret')
+    
+    assert connector._partition(list(range(10)), 4) == [[0, 1, 2], [3, 4, 5], [6, 7], [8, 9]]
+    assert connector._partition([1, 2], 4) == [[1], [2]]
+    assert connector._partition([], 4) == []
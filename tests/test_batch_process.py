@@ -0,0 +1,49 @@
+import pytest
+from controllers.email_controller import EmailController
+from models.parsed_email import ParsedEmail, ParsedBatch
+
+def order_emails(count):
+    return [
+        {'id': str(number), 'subject': f'Order {number}', 'from': 'shop@example.com', 'date': '',
+         'body': f"Order Number: W{number}\nTotal: ${number}.00"}
+        for number in range(count)
+    ]
+
+@pytest.fixture
+def controller(tmp_path):
+    return EmailController(export_directory=str(tmp_path / 'exports'))
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 50])
+def test_workers_keep_input_order(controller, chunk_size):
+    emails = order_emails(25)
+    
+    results = controller.batch_process(emails, workers=2, chunk_size=chunk_size)
+    
+    assert [parsed_data['email_id'] for parsed_data in results] == [email['id'] for email in emails]
+    assert [parsed_data['order_number'] for parsed_data in results] == [f'W{number}' for number in range(25)]
+    assert results == controller.batch_process(emails)
+
+def test_malformed_email_gets_an_error_row_under_workers(controller):
+    emails = order_emails(6)
+    # No body at all, and a body that is not text
+    del emails[2]['body']
+    emails[4]['body'] = 12345
+    
+    results = controller.batch_process(emails, workers=2, chunk_size=2)
+    
+    assert len(results) == 6
+    assert [index for index, parsed_data in enumerate(results) if 'error' in parsed_data] == [2, 4]
+    assert results[2]['email_id'] == '2'
+    assert results[2]['email_subject'] == 'Order 2'
+    assert results[5]['order_number'] == 'W5'
+
+def test_workers_return_models_and_batches(controller):
+    emails = order_emails(7)
+    
+    models = controller.batch_process(emails, workers=2, chunk_size=2, as_models=True)
+    batch = controller.batch_process(emails, workers=2, chunk_size=2, packed=True)
+    
+    assert all(isinstance(model, ParsedEmail) for model in models)
+    assert [model.email_id for model in models] == [email['id'] for email in emails]
+    assert isinstance(batch, ParsedBatch)
+    assert [parsed_data['email_id'] for parsed_data in batch.to_dicts()] == [email['id'] for email in emails]
@@ -0,0 +1,110 @@
+import pytest
+from benchmarks.fake_imap import FakeIMAPServer, FakeIMAPConnection
+from utils.email_connector import EmailConnector
+
+def message(number):
+    return f'Subject: Order {number}\r\nFrom: shop@example.com\r\n\r\nOrder {number} shipped.\r\n'.encode()
+
+class ReorderingConnection(FakeIMAPConnection):
+    """
+    Answers FETCH with the messages in reverse and an unsolicited FLAGS
+    update between them, as servers may
+    """
+    def _fetch(self, numbers, message_parts, use_uid):
+        data = super()._fetch(numbers, message_parts, use_uid)
+        responses = [data[index:index + 2] for index in range(0, len(data), 2)]
+        reordered = []
+        
+        for response in reversed(responses):
+            reordered.extend(response)
+            reordered.append(b'1 (FLAGS (\\Seen))')
+        
+        return reordered
+
+def connector_for(server, connection_class=FakeIMAPConnection):
+    connector = EmailConnector('imap.example.com', 993, 'user@example.com', 'secret')
+    connector.connection = connection_class(server)
+    return connector
+
+@pytest.fixture
+def server():
+    server = FakeIMAPServer()
+    server.add_messages([message(number) for number in range(1, 8)])
+    return server
+
+@pytest.mark.parametrize('email_ids, message_set', [
+    ([b'1', b'2', b'3', b'4', b'5', b'7'], '1:5,7'),
+    ([b'4'], '4'),
+    ([b'2', b'4', b'6'], '2,4,6'),
+    ([b'9', b'10', b'11', b'3'], '9:11,3'),
+    ([], '')
+])
+def test_message_set(email_ids, message_set):
+    connector = EmailConnector('imap.example.com', 993, 'user@example.com', 'secret')
+    
+    assert connector._build_message_set(email_ids) == message_set
+
+def test_one_fetch_per_chunk_in_search_order(server):
+    connector = connector_for(server)
+    
+    emails = connector.fetch_emails(limit=7, batch_size=3)
+    
+    # SELECT and SEARCH, then chunks 1:3, 4:6 and 7
+    assert server.commands == 5
+    assert [email_data['id'] for email_data in emails] == [str(number) for number in range(1, 8)]
+    assert [email_data['subject'] for email_data in emails] == [f'Order {number}' for number in range(1, 8)]
+
+def test_batched_fetch_matches_one_by_one(server):
+    batched = connector_for(server).fetch_emails(limit=7, batch_size=4, use_uid=True)
+    single = connector_for(server).fetch_emails(limit=7, use_uid=True)
+    
+    assert batched == single
+
+@pytest.mark.parametrize('use_uid', [False, True])
+def test_out_of_order_and_interleaved_responses(server, use_uid):
+    connector = connector_for(server, ReorderingConnection)
+    
+    emails = connector.fetch_emails(limit=7, batch_size=7, use_uid=use_uid)
+    
+    assert [email_data['subject'] for email_data in emails] == [f'Order {number}' for number in range(1, 8)]
+
+def test_uid_after_the_literal():
+    connector = EmailConnector('imap.example.com', 993, 'user@example.com', 'secret')
+    msg_data = [
+        (b'3 (RFC822 {%d}' % len(message(3)), message(3)),
+        b' UID 30)',
+        (b'2 (UID 20 RFC822 {%d}' % len(message(2)), message(2)),
+        b')'
+    ]
+    
+    assert connector._demultiplex_fetch(msg_data, use_uid=True) == {'30': message(3), '20': message(2)}
+
+def test_literal_that_looks_like_a_response():
+    connector = EmailConnector('imap.example.com', 993, 'user@example.com', 'secret')
+    quoted = b'Subject: Re: logs\r\n\r\n* 9 FETCH (UID 99 RFC822 {12}\r\n'
+    msg_data = [
+        (b'4 (UID 40 RFC822 {%d}' % len(quoted), quoted),
+        b')',
+        (b'5 (UID 50 RFC822 {%d}' % len(message(5)), message(5)),
+        b')'
+    ]
+    
+    assert connector._demultiplex_fetch(msg_data) == {'4': quoted, '5': message(5)}
+    assert connector._demultiplex_fetch(msg_data, use_uid=True) == {'40': quoted, '50': message(5)}
+
+def test_expunged_messages_are_skipped(server):
+    connector = connector_for(server)
+    connector._search('INBOX', 'ALL')
+    
+    # 8 and 9 were expunged between SEARCH and FETCH; the server answers for the rest
+    emails = connector._fetch_batched([b'6', b'7', b'8', b'9'], 10)
+    
+    assert [email_data['id'] for email_data in emails] == ['6', '7']
+
+def test_progress_after_every_chunk(server):
+    connector = connector_for(server)
+    reports = []
+    
+    connector.fetch_emails(limit=7, batch_size=3, progress=lambda fetched, total: reports.append((fetched, total)))
+    
+    assert reports == [(3, 7), (6, 7), (7, 7)]
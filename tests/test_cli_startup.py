@@ -0,0 +1,41 @@
+import os
+import sys
+import json
+import subprocess
+
+APP_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+
+def check_startup(*args, env=None):
+    return subprocess.run(
+        [sys.executable, os.path.join(APP_DIRECTORY, 'cli.py'), 'check-startup', *args],
+        capture_output=True, text=True, env=env, timeout=60
+    )
+
+def test_startup_imports_no_heavy_modules():
+    import cli
+    
+    # Generous budget: this checks the imports, not the machine's speed
+    result = check_startup('--budget-ms', '5000')
+    assert result.returncode == 0, result.stderr
+    assert 'Heavy modules' not in result.stderr
+    
+    probe = subprocess.run(
+        [sys.executable, '-c', cli.STARTUP_PROBE], cwd=APP_DIRECTORY, capture_output=True, text=True, timeout=60
+    )
+    modules = json.loads(probe.stdout)['modules']
+    assert [name for name in cli.HEAVY_MODULES if name in modules] == []
+
+def test_heavy_import_fails_the_check(tmp_path):
+    # sitecustomize runs before the probe, as an eager import in the CLI would
+    (tmp_path / 'sitecustomize.py').write_text('import bs4\n')
+    env = dict(os.environ, PYTHONPATH=str(tmp_path))
+    
+    result = check_startup('--budget-ms', '5000', env=env)
+    
+    assert result.returncode == 1
+    assert 'Heavy modules loaded at startup: bs4' in result.stderr
+
+def test_slow_startup_fails_the_check():
+    result = check_startup('--budget-ms', '0.001')
+    
+    assert result.returncode == 1
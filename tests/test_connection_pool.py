@@ -0,0 +1,149 @@
+import imaplib
+import pytest
+from benchmarks.fake_imap import FakeIMAPServer
+from utils import connection_pool
+from utils.connection_pool import ConnectionPool
+from utils.email_connector import EmailConnector
+
+ACCOUNT = ('imap.example.com', 993, 'user@example.com', 'secret')
+
+@pytest.fixture
+def server(monkeypatch):
+    """
+    Fake mailbox that every connector the pool opens is attached to
+    """
+    server = FakeIMAPServer()
+    opened = []
+    
+    class FakeConnector(EmailConnector):
+        def connect(self):
+            server.attach(self)
+            opened.append(self)
+            return f"Successfully connected to {self.email}"
+    
+    monkeypatch.setattr(connection_pool, 'EmailConnector', FakeConnector)
+    server.opened = opened
+    return server
+
+def dead(*args):
+    raise imaplib.IMAP4.abort('socket error: EOF')
+
+def test_idle_session_is_reused(server):
+    pool = ConnectionPool()
+    
+    first = pool.acquire(*ACCOUNT)
+    pool.release(first)
+    second = pool.acquire(*ACCOUNT)
+    
+    assert second is first
+    assert len(server.opened) == 1
+
+def test_max_size_is_per_account(server):
+    pool = ConnectionPool(max_size=1, checkout_timeout=0.05)
+    
+    held = pool.acquire(*ACCOUNT)
+    with pytest.raises(Exception, match='Timed out waiting'):
+        pool.acquire(*ACCOUNT)
+    
+    # Another account is not held up by the first one's limit
+    other = pool.acquire('imap.example.com', 993, 'other@example.com', 'secret')
+    assert other is not held
+    
+    pool.release(held)
+    assert pool.acquire(*ACCOUNT) is held
+    assert pool.stats()['user@example.com@imap.example.com:993'] == {'idle': 0, 'in_use': 1}
+
+def test_failed_checkout_frees_its_slot(server, monkeypatch):
+    pool = ConnectionPool(max_size=1, checkout_timeout=0.05)
+    
+    def refuse(self):
+        raise Exception('Connection failed: refused')
+    
+    with monkeypatch.context() as patch:
+        patch.setattr(connection_pool.EmailConnector, 'connect', refuse)
+        with pytest.raises(Exception, match='refused'):
+            pool.acquire(*ACCOUNT)
+    
+    pool.acquire(*ACCOUNT)
+
+def test_idle_sessions_expire(server):
+    pool = ConnectionPool(idle_timeout=0)
+    
+    first = pool.acquire(*ACCOUNT)
+    pool.release(first)
+    second = pool.acquire(*ACCOUNT)
+    
+    assert second is not first
+    assert first.connection is None
+    assert len(server.opened) == 2
+
+def test_health_check_skipped_for_recent_sessions(server):
+    pool = ConnectionPool(health_check_interval=60)
+    
+    first = pool.acquire(*ACCOUNT)
+    pool.release(first)
+    commands = server.commands
+    
+    assert pool.acquire(*ACCOUNT) is first
+    assert server.commands == commands
+
+def test_dead_session_is_replaced_at_checkout(server):
+    pool = ConnectionPool(health_check_interval=0)
+    
+    first = pool.acquire(*ACCOUNT)
+    pool.release(first)
+    first.connection.noop = dead
+    second = pool.acquire(*ACCOUNT)
+    
+    assert second is not first
+    assert second.check_connection()
+    assert len(server.opened) == 2
+
+def test_session_that_raised_is_discarded(server):
+    pool = ConnectionPool()
+    
+    with pytest.raises(ValueError):
+        with pool.connection(*ACCOUNT):
+            raise ValueError('bad input')
+    
+    assert pool.stats()['user@example.com@imap.example.com:993'] == {'idle': 0, 'in_use': 0}
+
+def test_run_does_not_repeat_work_by_default(server):
+    pool = ConnectionPool()
+    calls = []
+    
+    def operation(connector):
+        calls.append(connector)
+        dead()
+    
+    with pytest.raises(imaplib.IMAP4.abort):
+        pool.run(*ACCOUNT, operation)
+    
+    assert len(calls) == 1
+
+def test_run_with_retry_reconnects_once(server):
+    pool = ConnectionPool()
+    calls = []
+    
+    def operation(connector):
+        calls.append(connector)
+        if len(calls) == 1:
+            dead()
+        return 'done'
+    
+    assert pool.run(*ACCOUNT, operation, retry=True) == 'done'
+    assert calls[0] is not calls[1]
+    assert len(server.opened) == 2
+
+def test_run_with_retry_leaves_other_errors_alone(server):
+    pool = ConnectionPool()
+    calls = []
+    
+    def operation(connector):
+        calls.append(connector)
+        raise Exception('Search failed: NO')
+    
+    with pytest.raises(Exception, match='Search failed'):
+        pool.run(*ACCOUNT, operation, retry=True)
+    
+    assert len(calls) == 1
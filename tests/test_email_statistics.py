@@ -0,0 +1,40 @@
+import json
+from models.parsed_email import ParsedBatch
+from utils.email_statistics import RunningStatistics, StatisticsStore, compute_statistics, normalize_amounts
+
+EMAILS = [
+    {'email_from': 'a@shop.com', 'vendor_name': 'Shop', 'total_amount': '$10.00', 'email_date': 'Mon, 02 Jan 2023 10:00:00 +0000'},
+    {'email_from': 'a@shop.com', 'vendor_name': 'Shop', 'total_amount': '$30.00', 'email_date': 'Mon, 02 Jan 2023 12:00:00 +0000'},
+    {'email_from': 'b@laden.de', 'vendor_name': 'Laden', 'total_amount': '€1.000,00', 'email_date': 'Mon, 02 Jan 2023 14:00:00 +0000'},
+    {'email_from': 'c@store.uk', 'vendor_name': 'Store', 'total_amount': '£5', 'email_date': 'Tue, 03 Jan 2023 09:00:00 +0000'},
+    {'email_from': 'c@store.uk', 'vendor_name': 'Store', 'total_amount': 'n/a', 'email_date': 'Tue, 03 Jan 2023 10:00:00 +0000'}
+]
+
+def test_unparseable_amounts_have_no_currency():
+    amounts, currencies = normalize_amounts(['$12.50', 'n/a', '12 pcs', '12,50 EUR', None])
+    
+    assert currencies.tolist() == ['USD', None, None, 'EUR', None]
+    assert amounts.isna().tolist() == [False, True, False, False, True]
+
+def test_amounts_are_not_added_across_currencies():
+    for emails in (EMAILS, ParsedBatch.from_dicts(EMAILS)):
+        statistics = compute_statistics(emails)
+        
+        assert statistics['currency'] == 'USD'
+        assert statistics['average_order_total'] == 20.0
+        assert statistics['order_total_percentiles']['p50'] == 20.0
+        assert set(statistics['totals_by_vendor']) == {'Shop'}
+        assert statistics['daily']['2023-01-02'] == {'emails': 3, 'total': 40.0}
+        assert statistics['by_currency']['EUR']['totals_by_vendor']['Laden']['total'] == 1000.0
+        assert statistics['by_currency']['GBP']['daily'] == {'2023-01-03': {'orders': 1, 'total': 5.0}}
+
+def test_merged_aggregates_stay_per_currency(tmp_path):
+    store = StatisticsStore(str(tmp_path / 'statistics.db'))
+    store.update(EMAILS[:2])
+    store.update(EMAILS[2:])
+    
+    stored = store.get().summary()
+    whole = RunningStatistics.from_emails(EMAILS).summary()
+    assert json.loads(json.dumps(stored)) == json.loads(json.dumps(whole))
+    assert stored['by_currency']['USD']['orders'] == 2
+    assert stored['by_currency']['EUR']['average_order_total'] == 1000.0
@@ -0,0 +1,103 @@
+import csv
+import json
+import pytest
+from utils.exporters import discover_columns, flatten_record, get_exporter_class
+
+RECORDS = [
+    {
+        'order_number': 'W1', 'total': 12.5, 'paid': True, 'email_id': '1',
+        'shipping': {'method': 'DHL', 'days': 2},
+        'items': [{'name': 'Desk Lamp', 'quantity': 1}, {'name': 'Phone Case', 'quantity': 2}],
+        'tracking_numbers': ['1Z999', '1Z998']
+    },
+    {'order_number': 'W2', 'total': 7, 'paid': False, 'email_id': '2', 'items': [{'name': 'Backpack', 'quantity': 1}]},
+    # A failed parse only has the error and the metadata
+    {'error': 'no body', 'email_id': '3'}
+]
+
+COLUMNS = [
+    'order_number', 'total', 'paid', 'email_id', 'shipping_method', 'shipping_days',
+    'item1_name', 'item1_quantity', 'item2_name', 'item2_quantity', 'tracking_numbers', 'error'
+]
+
+def export(tmp_path, format_type, records=RECORDS, columns=None):
+    exporter_class = get_exporter_class(format_type)
+    path = str(tmp_path / f'export.{exporter_class.extension}')
+    
+    with exporter_class(path, columns) as exporter:
+        for record in records:
+            exporter.write(record)
+    
+    assert exporter.rows_written == len(records)
+    return path
+
+def test_flatten_record():
+    assert flatten_record(RECORDS[0])['shipping_days'] == 2
+    assert flatten_record(RECORDS[0])['item2_name'] == 'Phone Case'
+    assert flatten_record('not a dict') == {'value': 'not a dict'}
+
+def test_discover_columns_in_order_of_first_appearance():
+    assert discover_columns(RECORDS) == COLUMNS
+    assert discover_columns([]) == []
+
+@pytest.mark.parametrize('columns', [None, COLUMNS])
+def test_csv_round_trip(tmp_path, columns):
+    with open(export(tmp_path, 'csv', columns=columns), newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    
+    assert list(rows[0]) == COLUMNS
+    assert rows[0]['item2_quantity'] == '2'
+    assert rows[0]['paid'] == 'True'
+    assert json.loads(rows[0]['tracking_numbers']) == ['1Z999', '1Z998']
+    assert rows[1]['item2_name'] == ''
+    assert (rows[2]['email_id'], rows[2]['error'], rows[2]['order_number']) == ('3', 'no body', '')
+
+def test_jsonl_round_trip(tmp_path):
+    with open(export(tmp_path, 'jsonl')) as f:
+        assert [json.loads(line) for line in f] == RECORDS
+
+@pytest.mark.parametrize('format_type', ['excel', 'xlsx'])
+def test_xlsx_round_trip(tmp_path, format_type):
+    openpyxl = pytest.importorskip('openpyxl')
+    
+    sheet = openpyxl.load_workbook(export(tmp_path, format_type)).active
+    header, *rows = [list(row) for row in sheet.iter_rows(values_only=True)]
+    
+    assert header == COLUMNS
+    assert len(rows) == 3
+    assert rows[0][:4] == ['W1', 12.5, True, '1']
+    assert rows[0][COLUMNS.index('shipping_days')] == 2
+    assert json.loads(rows[0][COLUMNS.index('tracking_numbers')]) == ['1Z999', '1Z998']
+    assert rows[2][COLUMNS.index('error')] == 'no body'
+    assert rows[2][0] is None
+
+@pytest.mark.parametrize('columns', [None, COLUMNS])
+def test_parquet_round_trip(tmp_path, columns):
+    pq = pytest.importorskip('pyarrow.parquet')
+    
+    table = pq.read_table(export(tmp_path, 'parquet', columns=columns))
+    rows = table.to_pylist()
+    
+    assert table.column_names == COLUMNS
+    assert str(table.schema.field('paid').type) == 'bool'
+    assert str(table.schema.field('shipping_days').type) == 'int64'
+    # 12.5 and 7 widen to one float column
+    assert str(table.schema.field('total').type) == 'double'
+    assert [row['total'] for row in rows] == [12.5, 7.0, None]
+    assert json.loads(rows[0]['tracking_numbers']) == ['1Z999', '1Z998']
+    assert rows[2]['error'] == 'no body'
+
+def test_parquet_row_groups(tmp_path, monkeypatch):
+    pq = pytest.importorskip('pyarrow.parquet')
+    exporter_class = get_exporter_class('parquet')
+    monkeypatch.setattr(exporter_class, 'row_group_size', 4)
+    records = [{'email_id': str(number), 'total': number} for number in range(10)]
+    
+    parquet_file = pq.ParquetFile(export(tmp_path, 'parquet', records))
+    
+    assert parquet_file.metadata.num_row_groups == 3
+    assert parquet_file.read().to_pylist() == records
+
+def test_unknown_format():
+    with pytest.raises(ValueError, match='Unsupported format'):
+        get_exporter_class('pdf')
@@ -0,0 +1,50 @@
+import re
+from utils import email_parser
+from utils.email_parser import BOUNDED_ITEM_MATCH_MAX, BOUNDED_ITEM_PATTERN, EmailParser, ExtractionLimits
+from utils.parse_cache import ParseCache
+
+ORDER = 'Order Number: A-1\n' + ''.join(f'{number} x Widget {number}, $1.0{number}\n' for number in range(1, 6)) + 'Total: $9.99'
+
+def test_match_max_covers_the_longest_item_match():
+    # re._parser is the stdlib's own pattern parser; getwidth() is (min, max) match length
+    assert BOUNDED_ITEM_MATCH_MAX >= re._parser.parse(BOUNDED_ITEM_PATTERN.pattern).getwidth()[1]
+
+def test_item_line_across_a_chunk_boundary(monkeypatch):
+    monkeypatch.setattr(email_parser, 'ITEM_SCAN_CHUNK', 1000)
+    longest = '9' * 9 + ' ' * 20 + 'x' + ' ' * 20 + 'N' * 200 + ' ' * 20 + 'EUR' + '1' * 30
+    assert len(longest) == BOUNDED_ITEM_MATCH_MAX
+    
+    for start in (999 - BOUNDED_ITEM_MATCH_MAX, 990, 999):
+        text = '.' * start + longest + '\nend'
+        items = EmailParser(limits=ExtractionLimits())._extract_items_from_text(text, email_parser._ExtractionReport(ExtractionLimits()))
+        
+        assert items == [{'name': 'N' * 200, 'quantity': 999999999, 'unit_price': '1' * 30}], start
+
+def test_input_cap_is_reported():
+    parsed = EmailParser(limits=ExtractionLimits(max_input_chars=20)).parse(ORDER)
+    
+    assert parsed['order_number'] == 'A-1'
+    assert 'total_amount' not in parsed
+    assert parsed['extraction_limits'] == {'truncated': {'content': {'chars': len(ORDER), 'kept': 20}}}
+
+def test_fields_only_match_near_their_anchor():
+    text = 'Order Number:' + ' ' * 500 + 'LATE-1'
+    
+    assert EmailParser().parse(text) == {'order_number': 'LATE-1'}
+    assert EmailParser(limits=ExtractionLimits(field_window=100)).parse(text) == {}
+
+def test_item_cap():
+    parsed = EmailParser(limits=ExtractionLimits(max_items=3)).parse(ORDER)
+    
+    assert [item['name'] for item in parsed['items']] == ['Widget 1', 'Widget 2', 'Widget 3']
+    assert parsed['total_amount'] == '9.99'
+
+def test_spent_budget_is_reported_and_not_cached():
+    cache = ParseCache(max_entries=10)
+    parsed = EmailParser(cache=cache, limits=ExtractionLimits(time_budget=0)).parse(ORDER)
+    
+    assert parsed == {'extraction_limits': {'over_budget': [
+        'order_number', 'order_date', 'total_amount', 'shipping_address', 'tracking_number',
+        'vendor_name', 'email_from', 'items'
+    ]}}
+    assert EmailParser(cache=cache, limits=ExtractionLimits()).parse(ORDER)['order_number'] == 'A-1'
@@ -0,0 +1,62 @@
+import pytest
+from utils.email_parser import EmailParser
+from utils.html_backends import HTML_BACKENDS, get_html_backend
+from benchmarks.corpus import CorpusGenerator
+
+XHTML_ORDER = """<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
+<html xmlns="http://www.w3.org/1999/xhtml"><head><title>Your order</title></head>
+<body>
+<p>Order Number: XH-1001</p>
+<table>
+<tr><th>Item</th><th>Quantity</th><th>Price</th><th>Total</th></tr>
+<tr><td>Café Mug</td><td>2</td><td>€9,50</td><td>€19,00</td></tr>
+</table>
+<p>Order Total: €19,00</p>
+</body></html>"""
+
+# Outlook conditional blocks are comments; the text after them still counts
+MSO_ORDER = """<html><body><p>Thanks for your order</p><!-- header -->Order Number: MSO-77
+<!--[if mso]><table><tr><td>fallback</td></tr></table><![endif]-->
+<p>Shipped</p><?xml-stylesheet href="x"?>Order Total: $5.00</body></html>"""
+
+def available_backends():
+    backends = []
+    for name in HTML_BACKENDS:
+        try:
+            get_html_backend(name)
+        except ImportError:
+            continue
+        backends.append(name)
+    return backends
+
+BACKENDS = available_backends()
+
+def html_bodies():
+    bodies = [body for body in CorpusGenerator(6).bodies(120) if '<html' in body.lower()]
+    return bodies + [XHTML_ORDER, MSO_ORDER]
+
+@pytest.mark.parametrize('name', [name for name in BACKENDS if name != 'bs4'])
+def test_backend_matches_bs4(name):
+    reference = get_html_backend('bs4')
+    backend = get_html_backend(name)
+    
+    for body in html_bodies():
+        expected = reference.scan(body)
+        actual = backend.scan(body)
+        assert actual.text == expected.text
+        assert [table.rows for table in actual.tables] == [table.rows for table in expected.tables]
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_xhtml_with_encoding_declaration(name):
+    parsed = EmailParser(html_backend=name).parse(XHTML_ORDER)
+    
+    assert parsed['order_number'] == 'XH-1001'
+    assert parsed['items'] == [{'name': 'Café Mug', 'quantity': 2, 'unit_price': '9,50', 'total_price': '19,00'}]
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_text_after_comments(name):
+    parsed = EmailParser(html_backend=name).parse(MSO_ORDER)
+    
+    assert parsed['order_number'] == 'MSO-77'
+    assert parsed['total_amount'] == '5.00'
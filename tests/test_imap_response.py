@@ -0,0 +1,74 @@
+from utils.email_connector import EmailConnector
+from utils.imap_response import parse_bodystructure, parse_fetch_response
+
+ATTACHMENT_NAME = 'résumé.pdf'.encode('utf-8')
+HEADERS = b'Subject: Your order\r\nList-Id: <orders.shop.example>\r\n\r\n'
+
+# imaplib's fetch() data for two messages, as sent by Gmail: a mixed message
+# holding an alternative, a PDF whose name went out as a literal and a
+# forwarded message, then a single text part with NIL parameters
+FETCH_DATA = [
+    (b'12 (UID 4821 BODYSTRUCTURE ((("text" "plain" ("charset" "utf-8") NIL NIL "quoted-printable" 1204 31 NIL NIL NIL NIL)'
+     b'("text" "html" ("charset" "utf-8") NIL NIL "quoted-printable" 8830 177 NIL NIL NIL NIL) "alternative" '
+     b'("boundary" "000000000000a1b2") NIL NIL NIL)("application" "pdf" ("name" {%d}' % len(ATTACHMENT_NAME),
+     ATTACHMENT_NAME),
+    b') NIL NIL "base64" 48212 NIL ("attachment" ("filename" "invoice.pdf")) NIL NIL)'
+    b'("message" "rfc822" NIL NIL NIL "7bit" 2210 ("Mon, 1 Jan 2024 10:00:00 +0000" "Fwd: order" NIL NIL NIL NIL NIL NIL NIL "<a@b>") '
+    b'("text" "plain" NIL NIL NIL "7bit" 310 8 NIL NIL NIL NIL) 52 NIL ("attachment" NIL) NIL NIL) "mixed" '
+    b'("boundary" "000000000000c3d4") NIL NIL NIL))',
+    (b'13 (UID 4822 BODYSTRUCTURE ("TEXT" "PLAIN" NIL NIL NIL NIL 42 2 NIL NIL NIL NIL) '
+     b'BODY[HEADER.FIELDS (SUBJECT LIST-ID)] {%d}' % len(HEADERS), HEADERS),
+    b')'
+]
+
+def test_fetch_response_with_literals():
+    (first_number, first), (second_number, second) = parse_fetch_response(FETCH_DATA)
+    
+    assert (first_number, first['UID']) == (12, '4821')
+    assert first['BODYSTRUCTURE'][1][2] == ['name', ATTACHMENT_NAME]
+    assert (second_number, second['UID']) == (13, '4822')
+    assert second['BODY[HEADER.FIELDS (SUBJECT LIST-ID)]'] == HEADERS
+
+def test_nested_multipart_in_walk_order():
+    structure = parse_fetch_response(FETCH_DATA)[0][1]['BODYSTRUCTURE']
+    parts = [(part['section'], part['content_type'], part['size'], part['disposition'])
+             for part in parse_bodystructure(structure)]
+    
+    assert parts == [
+        ('', 'multipart/mixed', None, None),
+        ('1', 'multipart/alternative', None, None),
+        ('1.1', 'text/plain', 1204, None),
+        ('1.2', 'text/html', 8830, None),
+        ('2', 'application/pdf', 48212, 'attachment'),
+        ('3', 'message/rfc822', 2210, 'attachment'),
+        ('3.1', 'text/plain', 310, None)
+    ]
+
+def test_nil_parameters():
+    structure = parse_fetch_response(FETCH_DATA)[1][1]['BODYSTRUCTURE']
+    
+    assert structure[2] is None
+    assert parse_bodystructure(structure) == [{
+        'section': 'TEXT',
+        'content_type': 'text/plain',
+        'encoding': '7bit',
+        'charset': None,
+        'size': 42,
+        'disposition': None
+    }]
+
+def test_skipped_forwarded_message_counts_once():
+    structure = parse_fetch_response(FETCH_DATA)[0][1]['BODYSTRUCTURE']
+    body_part, skipped = EmailConnector('imap.example.com', 993, 'user', 'password')._select_body_part(structure)
+    
+    assert body_part['section'] == '1.1'
+    assert [(part['section'], part['size']) for part in skipped] == [('1.2', 8830), ('2', 48212), ('3', 2210)]
+
+def test_body_inside_a_forwarded_message():
+    structure = parse_fetch_response(FETCH_DATA)[0][1]['BODYSTRUCTURE']
+    # Only the attachment and the forwarded message, so the body is the latter's text
+    forwarded_only = structure[1:]
+    body_part, skipped = EmailConnector('imap.example.com', 993, 'user', 'password')._select_body_part(forwarded_only)
+    
+    assert body_part['section'] == '2.1'
+    assert [(part['section'], part['size']) for part in skipped] == [('1', 48212)]
@@ -0,0 +1,66 @@
+import threading
+import pytest
+from benchmarks.corpus import CorpusGenerator
+from benchmarks.fake_imap import FakeIMAPServer
+from controllers.email_controller import EmailController
+from utils.email_connector import EmailConnector
+from utils.job_queue import JobManager, JobQueueFull
+
+def wait_for(job):
+    for _ in range(500):
+        if job.finished:
+            return job
+        threading.Event().wait(0.01)
+    raise AssertionError(f"Job {job.id} did not finish: {job.status}")
+
+def test_cancelled_queued_job_frees_its_slot():
+    release = threading.Event()
+    manager = JobManager(workers=1, max_queued=2)
+    running = manager.submit('block', lambda job: release.wait(5))
+    
+    while running.status != 'running':
+        threading.Event().wait(0.01)
+    
+    first = manager.submit('noop', lambda job: 1)
+    manager.submit('noop', lambda job: 2)
+    with pytest.raises(JobQueueFull):
+        manager.submit('noop', lambda job: 3)
+    
+    manager.cancel(first.id)
+    assert first.status == 'cancelled'
+    assert manager.stats()['queued'] == 1
+    last = manager.submit('noop', lambda job: 4)
+    
+    release.set()
+    assert wait_for(last).result == 4
+    assert first.started_at is None
+
+def fetch_controller(tmp_path, count):
+    server = FakeIMAPServer()
+    server.add_messages(list(CorpusGenerator(3).messages(count)))
+    controller = EmailController(export_directory=str(tmp_path / 'exports'))
+    controller.connector = server.attach(EmailConnector('imap.example.com', 993, 'user', 'password'))
+    return controller
+
+def test_fetch_reports_and_stops_per_batch(tmp_path):
+    manager = JobManager(workers=1)
+    reports = []
+    
+    def fetch(job):
+        def progress(processed, total):
+            reports.append((processed, total))
+            job.report(processed, total)
+        
+        return fetch_controller(tmp_path, 25).fetch_emails(limit=25, batch_size=10, progress=progress)
+    
+    job = wait_for(manager.submit('fetch', fetch))
+    assert reports == [(10, 25), (20, 25), (25, 25)]
+    assert len(job.result) == 25
+    
+    def cancelled_fetch(job):
+        job._cancel_requested.set()
+        return fetch_controller(tmp_path, 25).fetch_emails(limit=25, batch_size=10, progress=job.report)
+    
+    job = wait_for(manager.submit('fetch', cancelled_fetch))
+    assert job.status == 'cancelled'
+    assert job.to_dict()['progress'] == {'processed': 10, 'total': 25}
@@ -0,0 +1,165 @@
+import socket
+import imaplib
+import threading
+import pytest
+from controllers import email_controller
+from controllers.email_controller import EmailController, WATCH_PARALLEL_MIN
+from utils.email_connector import EmailConnector
+
+class PairedIMAP(imaplib.IMAP4):
+    """
+    imaplib client on one end of a socket pair; the other end is a
+    ScriptedServer
+    """
+    def __init__(self, sock):
+        self.paired_sock = sock
+        super().__init__('imap.example.com')
+    
+    def open(self, host='', port=imaplib.IMAP4_PORT, timeout=None):
+        self.host = host
+        self.port = port
+        self.sock = self.paired_sock
+        self.file = self.sock.makefile('rb')
+
+class ScriptedServer:
+    """
+    Plays an IMAP server from a script of (command, replies) steps
+    
+    Each step waits for a client line whose command (after the tag) starts
+    with command, then sends the replies with {tag} filled in, all in one
+    write so they can land in imaplib's read-ahead buffer together.
+    """
+    def __init__(self, script):
+        client, self.sock = socket.socketpair()
+        # A script that goes wrong fails the test instead of hanging it
+        client.settimeout(10)
+        self.received = []
+        self.sock.sendall(b'* OK Dovecot ready.\r\n')
+        self.thread = threading.Thread(target=self._serve, args=(script,), daemon=True)
+        self.thread.start()
+        self.connection = PairedIMAP(client)
+    
+    def _serve(self, script):
+        reader = self.sock.makefile('rb')
+        
+        # imaplib asks for the capabilities while connecting
+        tag, _, line = reader.readline().partition(b' ')
+        self.sock.sendall(b'* CAPABILITY IMAP4rev1 IDLE\r\n' + tag + b' OK Capability completed.\r\n')
+        
+        for command, replies in script:
+            line = reader.readline()
+            if not line.startswith(b'DONE'):
+                tag, _, line = line.partition(b' ')
+            self.received.append(line.strip())
+            assert line.startswith(command), line
+            self.sock.sendall(b''.join(replies).replace(b'{tag}', tag))
+    
+    def close(self):
+        self.thread.join(5)
+        self.connection.sock.close()
+        self.sock.close()
+
+def idle(script, timeout, before=None):
+    server = ScriptedServer(script)
+    connector = EmailConnector('imap.example.com', 993, 'user', 'password')
+    connector.connection = server.connection
+    connector.connection.state = 'AUTH'
+    try:
+        if before is not None:
+            before(connector)
+        return connector.idle(timeout), server.received, dict(connector.connection.tagged_commands)
+    finally:
+        server.close()
+
+def test_exists_while_idling():
+    new_mail, received, tagged = idle([
+        (b'IDLE', [b'+ idling\r\n', b'* 23 EXISTS\r\n']),
+        (b'DONE', [b'{tag} OK IDLE terminated (Success)\r\n'])
+    ], timeout=5)
+    
+    assert new_mail
+    assert received == [b'IDLE', b'DONE']
+    assert tagged == {}
+
+def test_exists_arriving_during_done():
+    # Dovecot flushes mail that arrived after the timeout before the tagged OK
+    new_mail, _, tagged = idle([
+        (b'IDLE', [b'+ idling\r\n']),
+        (b'DONE', [b'* 24 EXISTS\r\n* 1 RECENT\r\n{tag} OK Idle completed (0.001 + 0.2 + 0.2 secs).\r\n'])
+    ], timeout=0.2)
+    
+    assert new_mail
+    assert tagged == {}
+
+def test_timeout_without_mail():
+    new_mail, _, tagged = idle([
+        (b'IDLE', [b'+ idling\r\n', b'* OK Still here\r\n']),
+        (b'DONE', [b'{tag} OK IDLE terminated (Success)\r\n'])
+    ], timeout=0.2)
+    
+    assert not new_mail
+    assert tagged == {}
+
+def test_exists_read_ahead_by_an_earlier_command():
+    # The EXISTS shares a packet with the NOOP's tagged OK, so imaplib has
+    # already buffered it; IDLE is not needed at all
+    new_mail, received, _ = idle([
+        (b'NOOP', [b'{tag} OK NOOP completed.\r\n* 25 EXISTS\r\n'])
+    ], timeout=5, before=lambda connector: connector.connection.noop())
+    
+    assert new_mail
+    assert received == [b'NOOP']
+
+def test_mailbox_size_from_select_is_not_new_mail():
+    new_mail, received, _ = idle([
+        (b'SELECT', [b'* 3 EXISTS\r\n* 0 RECENT\r\n* OK [UIDVALIDITY 7] UIDs valid\r\n',
+                     b'* OK [UIDNEXT 4] Predicted next UID\r\n{tag} OK [READ-WRITE] Select completed.\r\n']),
+        (b'IDLE', [b'+ idling\r\n']),
+        (b'DONE', [b'{tag} OK IDLE terminated (Success)\r\n'])
+    ], timeout=0.2, before=lambda connector: connector.select_with_uid_state('INBOX'))
+    
+    assert not new_mail
+    assert received == [b'SELECT INBOX', b'IDLE', b'DONE']
+
+def test_bye_while_idling():
+    with pytest.raises(imaplib.IMAP4.abort):
+        idle([
+            (b'IDLE', [b'+ idling\r\n', b'* BYE Server shutting down\r\n'])
+        ], timeout=5)
+
+def order_emails(count, start=0):
+    return [
+        {'id': str(number), 'subject': 'Order', 'from': 'shop@example.com', 'date': '', 'body': f"Order Number: W{number}\nTotal: $5.00"}
+        for number in range(start, start + count)
+    ]
+
+def test_watcher_keeps_one_process_pool(tmp_path, monkeypatch):
+    started = []
+    
+    class CountingPool(email_controller.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            started.append(self)
+    
+    monkeypatch.setattr(email_controller, 'ProcessPoolExecutor', CountingPool)
+    monkeypatch.setenv('SYNC_STATE_PATH', str(tmp_path / 'sync_state.db'))
+    for name, value in (('EMAIL_SERVER', 'imap.example.com'), ('EMAIL_PORT', '993'),
+                        ('EMAIL_USER', 'user'), ('EMAIL_PASSWORD', 'password')):
+        monkeypatch.setenv(name, value)
+    
+    results = []
+    controller = EmailController(export_directory=str(tmp_path / 'exports'))
+    watcher = controller.create_watcher(results.append, workers=2)
+    
+    watcher.handler(order_emails(3))
+    assert not started
+    
+    watcher.handler(order_emails(WATCH_PARALLEL_MIN, 3))
+    watcher.handler(order_emails(WATCH_PARALLEL_MIN + 5, 100))
+    assert len(started) == 1
+    
+    watcher.on_exit()
+    with pytest.raises(RuntimeError):
+        started[0].submit(len, ())
+    assert [parsed_data['order_number'] for parsed_data in results[:5]] == ['W0', 'W1', 'W2', 'W3', 'W4']
+    assert len(results) == 3 + 2 * WATCH_PARALLEL_MIN + 5
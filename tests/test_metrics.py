@@ -0,0 +1,8 @@
+from utils.metrics import MetricsRegistry
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    
+    registry.inc('parse_errors_total', 2, 'Emails that failed to parse', reason='bad "quote"\nC:\\mail')
+    
+    assert 'parse_errors_total{reason="bad \\"quote\\"\\nC:\\\\mail"} 2' in registry.render().splitlines()
@@ -0,0 +1,71 @@
+import json
+
+ORDER = "Order Number: W123\nTotal: $5.00"
+
+def parse_batch(client, lines):
+    body = b''.join(line if isinstance(line, bytes) else line.encode() for line in lines)
+    response = client.post('/parse-batch', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    return [json.loads(line) for line in response.data.decode().splitlines()]
+
+def test_objects_and_fetched_emails(client):
+    results = parse_batch(client, [
+        json.dumps({'id': 'a', 'email_content': ORDER}) + '\n',
+        json.dumps({'id': 'b', 'body': ORDER, 'from': 'shop@example.com'}) + '\n'
+    ])
+    
+    assert [(result['line'], result['id'], result['status']) for result in results] == [(1, 'a', 'success'), (2, 'b', 'success')]
+    assert results[0]['parsed_data']['order_number'] == 'W123'
+
+def test_bare_json_string(client):
+    results = parse_batch(client, [json.dumps(ORDER) + '\n'])
+    
+    assert results[0]['status'] == 'success'
+    assert results[0]['id'] is None
+    assert results[0]['parsed_data']['order_number'] == 'W123'
+
+def test_invalid_lines_get_error_rows(client):
+    results = parse_batch(client, [
+        '{"email_content": \n',
+        json.dumps({'id': 'c'}) + '\n',
+        json.dumps(42) + '\n',
+        json.dumps({'id': 'd', 'email_content': ORDER}) + '\n'
+    ])
+    
+    assert [result['status'] for result in results] == ['error', 'error', 'error', 'success']
+    assert results[1]['message'] == 'Missing email_content'
+    assert results[3]['line'] == 4
+
+def test_blank_lines_are_skipped_but_counted(client):
+    results = parse_batch(client, [
+        '\n',
+        json.dumps({'id': 'a', 'email_content': ORDER}) + '\n',
+        '   \r\n',
+        json.dumps({'id': 'b', 'email_content': ORDER})
+    ])
+    
+    # No row for blank lines; line numbers still match the input
+    assert [(result['line'], result['id']) for result in results] == [(2, 'a'), (4, 'b')]
+
+def test_oversized_line(client, monkeypatch):
+    monkeypatch.setenv('PARSE_BATCH_MAX_LINE_BYTES', '64')
+    oversized = json.dumps({'id': 'big', 'email_content': 'x' * 500}) + '\n'
+    fits = json.dumps({'id': 'a', 'email_content': 'Order Number: W1'}) + '\n'
+    
+    results = parse_batch(client, [fits, oversized, fits, oversized.rstrip('\n')])
+    
+    assert [(result['line'], result['status']) for result in results] == [
+        (1, 'success'), (2, 'error'), (3, 'success'), (4, 'error')
+    ]
+    assert results[1]['message'] == 'Line exceeds 64 bytes'
+    # The rest of the oversized line is skipped, not parsed as a line of its own
+    assert results[2]['id'] == 'a'
+
+def test_line_exactly_at_the_limit(client, monkeypatch):
+    line = json.dumps({'email_content': 'Order Number: W1'}) + '\n'
+    monkeypatch.setenv('PARSE_BATCH_MAX_LINE_BYTES', str(len(line)))
+    
+    results = parse_batch(client, [line, line.rstrip('\n')])
+    
+    assert [result['status'] for result in results] == ['success', 'success']
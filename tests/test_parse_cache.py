@@ -0,0 +1,35 @@
+import sqlite3
+from utils.email_parser import EmailParser
+from utils.parse_cache import ParseCache
+
+def disk_rows(path):
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM parse_cache").fetchone()[0]
+
+def test_changing_rules_keeps_other_parsers_results(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = ParseCache(max_entries=100, db_path=path)
+    shared = EmailParser(cache=cache)
+    
+    for number in range(20):
+        shared.parse(f"Order Number: A{number}\nTotal: $5.00")
+    assert disk_rows(path) == 20
+    
+    custom = EmailParser(cache=cache)
+    custom.parse("Order Number: B1")
+    custom.register_pattern('invoice', r'Invoice[:\s]*(\w+)', anchors=('invoice',))
+    custom.parse("Invoice: 77")
+    
+    assert disk_rows(path) == 22
+    assert cache.get(cache.make_key("Order Number: A3\nTotal: $5.00", shared.version)) == {
+        'order_number': 'A3', 'total_amount': '5.00'
+    }
+
+def test_rule_change_does_not_serve_stale_results():
+    cache = ParseCache(max_entries=100)
+    parser = EmailParser(cache=cache)
+    body = "Invoice: 77"
+    
+    assert parser.parse(body) == {}
+    parser.register_pattern('invoice', r'Invoice[:\s]*(\w+)')
+    assert parser.parse(body) == {'invoice': '77'}
@@ -0,0 +1,30 @@
+from models.parsed_email import ParsedBatch, ParsedEmail
+from utils.amounts import parse_amount
+from utils.email_statistics import normalize_amounts
+
+AMOUNTS = ['$1,234.56', '€1.234,56', '£12', '12,50 EUR', '99.90', 'USD 7', 'TBD', 'EUR n/a', '', None]
+
+def test_scalar_and_column_parsing_agree():
+    amounts, currencies = normalize_amounts(AMOUNTS)
+    
+    for value, amount, currency in zip(AMOUNTS, amounts, currencies):
+        expected_amount, expected_currency = parse_amount(value)
+        assert currency == expected_currency, value
+        assert (amount != amount and expected_amount is None) or amount == expected_amount, value
+
+def test_round_trip_keeps_currency_and_unparsed_amounts():
+    records = [
+        {'email_id': '1', 'total_amount': '€1.234,56', 'order_number': 'A1', 'items': [{'name': 'Lamp', 'quantity': 2}]},
+        {'email_id': '2', 'total_amount': 'TBD', 'gift_card': 'G-7'},
+        {'email_id': '3'}
+    ]
+    
+    for record in records:
+        once = ParsedEmail.from_dict(record).to_dict()
+        assert ParsedEmail.from_dict(once).to_dict() == once
+    
+    first, second, third = (ParsedEmail.from_dict(record).to_dict() for record in records)
+    assert (first['total_amount'], first['currency']) == (1234.56, 'EUR')
+    assert second['total_amount'] == 'TBD' and second['gift_card'] == 'G-7'
+    assert 'total_amount' not in third and 'currency' not in third
+    assert list(ParsedBatch.from_dicts(records).to_dicts())[0] == first
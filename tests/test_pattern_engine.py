@@ -0,0 +1,21 @@
+from benchmarks.corpus import CorpusGenerator
+from utils.email_parser import DEFAULT_PATTERNS, DEFAULT_PATTERN_ANCHORS
+from utils.pattern_engine import compare_with_legacy
+
+# Anchors that only some alternatives start with, and text where lowercasing
+# shifts offsets or folds non-ASCII letters onto anchors
+EDGE_TEXTS = [
+    "Order Number: A-1\nSubtotal: $9.00\nTotal: $9.99\nDelivery Address: 2 Side St\n\n",
+    "İstanbul Order Number: IST-1\nTotal: $12.00",
+    "ORDER K Number: K-1\nTRACK Your Package: 1Z999",
+    "Shipping Address: 1 Main St\n\nFrom: Shop Inc.\n"
+]
+
+def test_engine_matches_re_search_on_corpus():
+    generator = CorpusGenerator(7)
+    texts = list(generator.bodies(150)) + list(generator.bodies(50, kind='text')) + EDGE_TEXTS
+    
+    result = compare_with_legacy(texts, DEFAULT_PATTERNS, DEFAULT_PATTERN_ANCHORS)
+    
+    assert result['emails'] == len(texts)
+    assert result['mismatches'] == []
@@ -0,0 +1,81 @@
+import json
+import pytest
+from benchmarks.fake_imap import FakeIMAPServer
+from controllers.email_controller import EmailController
+from utils.email_connector import EmailConnector
+
+def order_emails(count):
+    for number in range(count):
+        yield {'id': str(number), 'subject': 'Order', 'from': 'shop@example.com', 'date': '',
+               'body': f"Order Number: W{number}\nTotal: $5.00"}
+
+def raw_orders(count):
+    return [f'Subject: Order {number}\r\n\r\nOrder Number: W{number}\r\nTotal: $5.00\r\n'.encode() for number in range(count)]
+
+@pytest.fixture
+def controller(tmp_path):
+    return EmailController(export_directory=str(tmp_path / 'exports'))
+
+@pytest.mark.parametrize('chunk_size, window', [(5, 20), (5, 3), (8, 20)])
+def test_window_bounds_how_far_the_source_runs_ahead(controller, chunk_size, window):
+    pulled = []
+    
+    def source():
+        for email in order_emails(100):
+            pulled.append(email['id'])
+            yield email
+    
+    ahead = []
+    results = []
+    for parsed_data in controller.stream_emails(source(), workers=2, chunk_size=chunk_size, window=window):
+        results.append(parsed_data['email_id'])
+        ahead.append(len(pulled) - len(results))
+    
+    assert results == [str(number) for number in range(100)]
+    # At most window // chunk_size chunks (at least one) are queued, plus the one being filled
+    assert max(ahead) <= max(window, chunk_size) + chunk_size
+
+def test_stream_is_lazy(controller):
+    pulled = []
+    
+    def source():
+        for email in order_emails(1000):
+            pulled.append(email['id'])
+            yield email
+    
+    stream = controller.stream_emails(source(), workers=2, chunk_size=10, window=40)
+    first = next(stream)
+    stream.close()
+    
+    assert first['email_id'] == '0'
+    assert len(pulled) <= 50
+
+def test_pipeline_writes_every_row(controller):
+    server = FakeIMAPServer()
+    server.add_messages(raw_orders(23))
+    controller.connector = server.attach(EmailConnector('imap.example.com', 993, 'user@example.com', 'secret'))
+    progress = []
+    
+    result = controller.run_pipeline(batch_size=5, workers=2, window=10, progress=progress.append)
+    
+    with open(result['export_path']) as f:
+        rows = [json.loads(line) for line in f]
+    
+    assert result['processed'] == 23
+    assert result['errors'] == 0
+    assert progress == list(range(1, 24))
+    assert [row['email_id'] for row in rows] == [str(number) for number in range(1, 24)]
+    assert [row['order_number'] for row in rows] == [f'W{number}' for number in range(23)]
+
+def test_pipeline_with_limit_in_process(controller):
+    server = FakeIMAPServer()
+    server.add_messages(raw_orders(12))
+    controller.connector = server.attach(EmailConnector('imap.example.com', 993, 'user@example.com', 'secret'))
+    
+    result = controller.run_pipeline(limit=7, batch_size=3)
+    
+    with open(result['export_path']) as f:
+        rows = [json.loads(line) for line in f]
+    
+    assert result['processed'] == len(rows) == 7
+    assert [row['email_id'] for row in rows] == [str(number) for number in range(6, 13)]
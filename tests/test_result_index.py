@@ -0,0 +1,104 @@
+import pytest
+from utils.result_index import ResultIndex
+
+RESULTS = [
+    {'email_id': '1', 'email_subject': 'Your Acme order', 'email_from': 'orders@acme.example',
+     'email_date': 'Mon, 01 Jan 2024 10:00:00 +0000', 'order_number': 'A-1', 'tracking_number': '1Z001',
+     'vendor_name': 'Acme Supplies', 'items': [{'name': 'Desk Lamp'}, {'name': 'USB-C Cable'}]},
+    {'email_id': '2', 'email_subject': 'Lamp shipped', 'email_from': 'ship@globex.example',
+     'email_date': 'Tue, 02 Jan 2024 23:30:00 -0500', 'order_number': 'G-2', 'tracking_number': '1Z002',
+     'vendor_name': 'Globex Store', 'items': [{'name': 'Desk Lamp'}]},
+    {'email_id': '3', 'email_subject': 'Lamp lamp lamp: lamp deals', 'email_from': 'news@acme.example',
+     'email_date': 'Fri, 05 Jan 2024 08:00:00 +0000', 'order_number': 'A-3',
+     'vendor_name': 'acme supplies', 'items': [{'name': 'Desk Lamp'}, {'name': 'Lamp Shade'}]},
+    {'email_id': '4', 'email_subject': 'Invoice', 'email_from': 'billing@initech.example',
+     'email_date': 'not a date', 'vendor_name': 'Initech Outlet', 'items': []}
+]
+
+def ids(results):
+    return [result['email_id'] for result in results]
+
+@pytest.fixture
+def index(tmp_path):
+    index = ResultIndex(str(tmp_path / 'data' / 'results.db'))
+    index.add_many(RESULTS, 'user@example.com/INBOX')
+    return index
+
+def test_newest_first_without_query(index):
+    # An unparseable date sorts last
+    assert ids(index.search()) == ['3', '2', '1', '4']
+    assert index.search()[0]['parsed_data']['items'][1] == {'name': 'Lamp Shade'}
+
+def test_full_text_query(index):
+    assert sorted(ids(index.search(query='lamp'))) == ['1', '2', '3']
+    # Every word has to match, in any of subject, sender and items
+    assert ids(index.search(query='acme cable')) == ['1']
+    assert ids(index.search(query='initech')) == ['4']
+    assert ids(index.search(query='lamp nothing')) == []
+
+def test_query_is_not_fts_syntax(index):
+    assert ids(index.search(query='"lamp" OR NEAR(')) == []
+    assert sorted(ids(index.search(query='usb-c'))) == ['1']
+
+def test_relevance_ordering(index):
+    # The message that mentions lamp most often ranks first
+    assert ids(index.search(query='lamp', relevance=True))[0] == '3'
+    # Without relevance, most recently indexed first
+    assert ids(index.search(query='lamp')) == ['3', '2', '1']
+
+def test_key_field_filters(index):
+    assert ids(index.search(order_number='G-2')) == ['2']
+    assert ids(index.search(tracking_number='1Z001')) == ['1']
+    # Vendor names compare case-insensitively
+    assert ids(index.search(vendor='ACME SUPPLIES')) == ['3', '1']
+    assert ids(index.search(source='other/INBOX')) == []
+
+def test_filter_combinations(index):
+    assert ids(index.search(query='lamp', vendor='acme supplies')) == ['3', '1']
+    assert ids(index.search(query='lamp', vendor='acme supplies', date_to='2024-01-04')) == ['1']
+    assert ids(index.search(vendor='Globex Store', order_number='A-1')) == []
+
+def test_date_ranges(index):
+    # 23:30 -05:00 on the 2nd is the 3rd in UTC
+    assert ids(index.search(date_from='2024-01-03')) == ['3', '2']
+    assert ids(index.search(date_to='2024-01-02')) == ['1']
+    # A bare date_to covers the whole day, a timestamp is exact
+    assert ids(index.search(date_from='2024-01-03', date_to='2024-01-03')) == ['2']
+    assert ids(index.search(date_to='2024-01-03T04:00:00')) == ['1']
+    assert ids(index.search(date_to='2024-01-03T04:30:00')) == ['2', '1']
+
+def test_limit_and_offset(index):
+    assert ids(index.search(limit=2)) == ['3', '2']
+    assert ids(index.search(limit=2, offset=2)) == ['1', '4']
+
+def test_reindexing_replaces(index):
+    index.add_many([dict(RESULTS[0], email_subject='Your Acme refund', items=[])], 'user@example.com/INBOX')
+    
+    assert index.count() == 4
+    assert ids(index.search(query='cable')) == []
+    assert ids(index.search(query='refund')) == ['1']
+    
+    assert index.delete('1', 'user@example.com/INBOX')
+    assert ids(index.search(query='refund')) == []
+    assert index.count() == 3
+
+@pytest.fixture
+def search(client, tmp_path, monkeypatch):
+    monkeypatch.setenv('RESULT_INDEX_PATH', str(tmp_path / 'results.db'))
+    ResultIndex(str(tmp_path / 'results.db')).add_many(RESULTS, 'user@example.com/INBOX')
+    return lambda query: client.get(f'/search?{query}')
+
+@pytest.mark.parametrize('query', ['limit=abc', 'offset=1.5', 'limit=-1', 'offset=-5'])
+def test_search_rejects_bad_paging(search, query):
+    response = search(query)
+    
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
+
+def test_search_endpoint(search):
+    response = search('q=lamp&vendor=acme%20supplies&limit=1&offset=1')
+    
+    assert response.status_code == 200
+    assert ids(response.get_json()['results']) == ['1']
+    assert ids(search('q=lamp&relevance=true').get_json()['results'])[0] == '3'
+    assert ids(search('limit=5000').get_json()['results']) == ['3', '2', '1', '4']
@@ -0,0 +1,88 @@
+import pytest
+from benchmarks.fake_imap import FakeIMAPServer
+from controllers.email_controller import EmailController
+from utils.email_connector import EmailConnector
+from utils.sync_state import SyncStateStore
+
+def messages(start, count):
+    return [f'Subject: Order {number}\r\n\r\nOrder {number} shipped.\r\n'.encode() for number in range(start, start + count)]
+
+def subjects(emails):
+    return [email_data['subject'] for email_data in emails]
+
+@pytest.fixture
+def server():
+    server = FakeIMAPServer(uidvalidity=7)
+    server.add_messages(messages(1, 3))
+    return server
+
+@pytest.fixture
+def controller(server, tmp_path, monkeypatch):
+    monkeypatch.setenv('SYNC_STATE_PATH', str(tmp_path / 'sync_state.db'))
+    controller = EmailController(export_directory=str(tmp_path / 'exports'))
+    controller.connector = server.attach(EmailConnector('imap.example.com', 993, 'user@example.com', 'secret'))
+    return controller
+
+def test_sync_fetches_only_new_mail(server, controller):
+    emails, checkpoint = controller.sync_emails()
+    assert subjects(emails) == ['Order 1', 'Order 2', 'Order 3']
+    assert checkpoint == {'uidvalidity': 7, 'last_uid': 3}
+    
+    server.add_messages(messages(4, 2))
+    emails, checkpoint = controller.sync_emails()
+    assert subjects(emails) == ['Order 4', 'Order 5']
+    assert checkpoint == {'uidvalidity': 7, 'last_uid': 5}
+
+def test_nothing_new_costs_one_select(server, controller):
+    controller.sync_emails()
+    commands = server.commands
+    
+    emails, checkpoint = controller.sync_emails()
+    
+    assert emails == []
+    assert checkpoint == {'uidvalidity': 7, 'last_uid': 3}
+    assert server.commands == commands + 1
+
+def test_changed_uidvalidity_resyncs_everything(server, controller):
+    controller.sync_emails()
+    server.add_messages(messages(4, 1))
+    server.uidvalidity = 8
+    
+    emails, checkpoint = controller.sync_emails()
+    
+    assert subjects(emails) == ['Order 1', 'Order 2', 'Order 3', 'Order 4']
+    assert checkpoint == {'uidvalidity': 8, 'last_uid': 4}
+    assert controller.sync_store.get('user@example.com@imap.example.com', 'INBOX') == checkpoint
+
+def test_limit_pages_through_a_backlog(server, controller):
+    server.add_messages(messages(4, 2))
+    
+    pages = [subjects(controller.sync_emails(limit=2)[0]) for _ in range(4)]
+    
+    assert pages == [['Order 1', 'Order 2'], ['Order 3', 'Order 4'], ['Order 5'], []]
+
+def test_checkpoints_are_per_folder(server, controller):
+    server.add_messages(messages(10, 2), folder='Receipts')
+    
+    controller.sync_emails()
+    emails, checkpoint = controller.sync_emails(folder='Receipts')
+    
+    assert subjects(emails) == ['Order 10', 'Order 11']
+    assert checkpoint == {'uidvalidity': 7, 'last_uid': 2}
+
+def test_store_round_trip(tmp_path):
+    store = SyncStateStore(str(tmp_path / 'state' / 'sync_state.db'))
+    
+    assert store.get('user@example.com', 'INBOX') is None
+    
+    store.save('user@example.com', 'INBOX', {'uidvalidity': 7, 'last_uid': 3})
+    store.save('user@example.com', 'INBOX', {'uidvalidity': 7, 'last_uid': 9})
+    store.save('user@example.com', 'Receipts', {'uidvalidity': 1, 'last_uid': 2})
+    assert store.get('user@example.com', 'INBOX') == {'uidvalidity': 7, 'last_uid': 9}
+    
+    store.reset('user@example.com', 'INBOX')
+    assert store.get('user@example.com', 'INBOX') is None
+    assert store.get('user@example.com', 'Receipts') == {'uidvalidity': 1, 'last_uid': 2}
+    
+    store.reset('user@example.com')
+    assert store.get('user@example.com', 'Receipts') is None
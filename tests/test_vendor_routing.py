@@ -0,0 +1,118 @@
+from email.message import EmailMessage
+import pytest
+from benchmarks.fake_imap import FakeIMAPServer
+from utils import email_connector, email_message
+from utils.archive_source import ArchiveSource
+from utils.email_connector import EmailConnector
+from utils.email_message import build_email_data
+from utils.email_parser import EmailParser
+from utils.vendor_extractors import VendorExtractor, VendorRegistry
+from controllers.email_controller import _process_email
+
+def raw_message(list_id=None):
+    message = EmailMessage()
+    message['Subject'] = 'Your order'
+    message['From'] = 'Shop <no-reply@mailer.example>'
+    message['Date'] = 'Mon, 01 Jan 2024 10:00:00 +0000'
+    if list_id:
+        message['List-Id'] = list_id
+    message.set_content('Reference: SHOP-42\nOrder Number: GEN-1\n')
+    return message.as_bytes()
+
+def shop_parser():
+    registry = VendorRegistry([
+        VendorExtractor('shop', fingerprints={'List-Id': '<orders.shop.example>'},
+                        patterns={'order_number': r'Reference[:\s]*([A-Z0-9\-]+)'}, anchors={'order_number': ('reference',)})
+    ])
+    return EmailParser(vendor_registry=registry), registry
+
+def test_email_dicts_carry_fingerprint_headers():
+    email_data = build_email_data('1', raw_message('<orders.shop.example>'))
+    
+    assert email_data['headers'] == {'List-Id': '<orders.shop.example>'}
+
+def test_header_fingerprint_routes_fetched_emails():
+    parser, registry = shop_parser()
+    
+    routed = _process_email(parser, build_email_data('1', raw_message('<orders.shop.example>')))
+    generic = _process_email(parser, build_email_data('2', raw_message()))
+    
+    assert routed['order_number'] == 'SHOP-42'
+    assert generic['order_number'] == 'GEN-1'
+    assert registry.stats()['routes']['shop']['hits'] == 1
+
+def test_archive_emails_carry_fingerprint_headers(tmp_path):
+    (tmp_path / 'order.eml').write_bytes(raw_message('<orders.shop.example>'))
+    parser, registry = shop_parser()
+    
+    emails = ArchiveSource(str(tmp_path)).fetch_emails()
+    
+    assert emails[0]['headers'] == {'List-Id': '<orders.shop.example>'}
+    assert _process_email(parser, emails[0])['order_number'] == 'SHOP-42'
+
+def test_partial_fetch_captures_fingerprint_headers():
+    connector = EmailConnector('imap.example.com', 993, 'user', 'password')
+    header = b'Subject: Your order\r\nFrom: Shop <no-reply@mailer.example>\r\nList-Id: <orders.shop.example>\r\n\r\n'
+    attributes = {'BODY[HEADER.FIELDS (SUBJECT FROM DATE LIST-ID)]': header}
+    
+    email_data = connector._build_partial_email_data('1', attributes, None, [], None)
+    
+    assert email_data['headers'] == {'List-Id': '<orders.shop.example>'}
+
+@pytest.fixture
+def header_lookups(monkeypatch):
+    """
+    Counts registry lookups by the connector; any lookup per message fails
+    """
+    lookups = []
+    
+    def header_names():
+        lookups.append(1)
+        return ('List-Id',)
+    
+    def per_message(*args):
+        raise AssertionError("registry looked up per message")
+    
+    monkeypatch.setattr(email_connector, 'fingerprint_header_names', header_names)
+    monkeypatch.setattr(email_message, 'fingerprint_header_names', per_message)
+    return lookups
+
+@pytest.mark.parametrize('batch_size', [None, 3])
+def test_header_names_looked_up_once_per_fetch(header_lookups, batch_size):
+    server = FakeIMAPServer()
+    server.add_messages([raw_message('<orders.shop.example>') for _ in range(7)])
+    connector = server.attach(EmailConnector('imap.example.com', 993, 'user', 'password'))
+    
+    emails = connector.fetch_emails(limit=7, batch_size=batch_size)
+    
+    assert len(header_lookups) == 1
+    assert [email_data['headers'] for email_data in emails] == [{'List-Id': '<orders.shop.example>'}] * 7
+
+def test_partial_fetch_looks_up_header_names_once(header_lookups):
+    connector = EmailConnector('imap.example.com', 993, 'user', 'password')
+    header = b'Subject: Your order\r\nList-Id: <orders.shop.example>\r\n\r\n'
+    commands = []
+    
+    def fetch(message_set, message_parts, use_uid=False):
+        commands.append(message_parts)
+        low, _, high = message_set.partition(':')
+        numbers = range(int(low), int(high or low) + 1)
+        msg_data = []
+        for number in numbers:
+            if 'BODYSTRUCTURE' in message_parts:
+                msg_data.append((
+                    b'%d (UID %d BODYSTRUCTURE ("TEXT" "PLAIN" NIL NIL NIL "7BIT" 5 1 NIL NIL NIL NIL) '
+                    b'BODY[HEADER.FIELDS (SUBJECT FROM DATE LIST-ID)] {%d}' % (number, number, len(header)), header
+                ))
+            else:
+                msg_data.append((b'%d (UID %d BODY[TEXT] {5}' % (number, number), b'Hello'))
+            msg_data.append(b')')
+        return 'OK', msg_data
+    
+    connector._fetch = fetch
+    emails = connector._fetch_partial([str(number).encode() for number in range(1, 8)], 3)
+    
+    assert len(header_lookups) == 1
+    assert commands.count("(UID BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS (SUBJECT FROM DATE LIST-ID)])") == 3
+    assert [email_data['body'] for email_data in emails] == ['Hello'] * 7
+    assert [email_data['headers'] for email_data in emails] == [{'List-Id': '<orders.shop.example>'}] * 7